@@ -0,0 +1,384 @@
+"""Benchmark suite for ssh_menu.py
+
+Generates synthetic inventories, drives the real menu through a
+pseudo-terminal with scripted keystrokes and records startup, render and
+input-latency numbers as JSON, so runs from different versions can be
+compared:
+
+    python bench_ssh_menu.py                          # 10 .. 100k hosts
+    python bench_ssh_menu.py --sizes 1000 50000 -o new.json
+    python bench_ssh_menu.py --compare old.json new.json
+
+POSIX only (pty, termios).
+"""
+import os
+import sys
+import json
+import time
+import random
+import select
+import signal
+import struct
+import platform
+import statistics
+import subprocess
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MENU = os.path.join(HERE, "ssh_menu.py")
+PACKAGE = os.path.join(HERE, "sshmenu")
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+ROWS, COLUMNS = 40, 120
+FRAME_QUIET = 0.05        # Seconds without output that end a frame
+FRAME_TIMEOUT = 2.0       # Seconds to wait for a frame, keys that change nothing count as missed
+SETTLE_QUIET = 0.5        # Startup repaints (probe results) must stop for this long
+SETTLE_TIMEOUT = 30.0
+REGRESSION_THRESHOLD = 0.20   # --compare flags metrics that got 20% worse...
+NOISE_FLOOR = 5.0             # ...and by more than this many ms, bytes or MB
+
+KEYS = {
+    "down": b"\x1b[B",
+    "pgdn": b"\x1b[6~",
+    "end": b"\x1b[F",
+    "home": b"\x1b[H",
+    "enter": b"\r",
+    "esc": b"\x1b",
+}
+
+USERS = ["root", "admin", "deploy", "ubuntu", "ec2-user", "postgres", "ansible"]
+COLORS = ["RED", "GREEN", "CYAN", "YELLOW", "BLUE", "MAGENTA", "WHITE", "ORANGE", "PURPLE"]
+REGIONS = ["eu-west", "eu-central", "us-east", "us-west", "ap-south"]
+ROLES = ["web", "db", "cache", "queue", "batch"]
+
+# Synthetic inventories
+def make_inventory(count, seed=0):
+    """count VMs shaped like a real fleet: a few users each, tags, some custom ports
+
+    Addresses are on the loopback network so the menu's reachability
+    probes are refused at once instead of waiting for timeouts.
+    """
+    rng = random.Random(seed)
+    inventory = {}
+    for i in range(count):
+        vm = {
+            "ip": f"127.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255 or 1}",
+            "users": rng.sample(USERS, rng.randint(1, 3)),
+            "color": rng.choice(COLORS),
+            "tags": [rng.choice(ROLES), f"region/{rng.choice(REGIONS)}"],
+        }
+        if rng.random() < 0.1:
+            vm["port"] = rng.choice([2222, 2200, 22022])
+        inventory[f"{rng.choice(ROLES)}-{i:06d}"] = vm
+    return inventory
+
+# Import, load and save, measured inside a fresh interpreter
+LOAD_PROBE = r"""
+import gc, json, os, resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from sshmenu import core
+imported = time.perf_counter()
+with open(os.devnull, "w") as quiet:
+    stdout, sys.stdout = sys.stdout, quiet
+    vms = core.load_config()
+    cold_ms = core.load_stats["ms"]
+    vms = core.load_config()
+    warm_ms = core.load_stats["ms"]
+    warm_source = core.load_stats["source"]
+    start_index = time.perf_counter()
+    core.SearchIndex.from_inventory(vms)
+    core.TagIndex.from_inventory(vms)
+    index_ms = (time.perf_counter() - start_index) * 1000
+    start_save = time.perf_counter()
+    saved = core.save_config(vms)
+    save_ms = (time.perf_counter() - start_save) * 1000
+    sys.stdout = stdout
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "load_cold_ms": cold_ms,
+    "load_warm_ms": warm_ms,
+    "load_warm_source": warm_source,
+    "index_ms": index_ms,
+    "save_ms": save_ms if saved else None,
+    "load_peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+def measure_load(workdir):
+    cache = os.path.join(workdir, "vms.json.cache")
+    if os.path.exists(cache):
+        os.remove(cache)   # The first load must be a cold one
+    done = subprocess.run([sys.executable, "-c", LOAD_PROBE, HERE], cwd=workdir,
+                          capture_output=True, text=True, env=bench_env(), check=True)
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+def bench_env():
+    env = dict(os.environ)
+    env.update(
+        SSH_MENU_SSH="/bin/false",      # Nothing the benchmark does may reach a real host
+        SSH_MENU_LAUNCHER="child",
+        SSH_MENU_BACKEND="json",
+        SSH_MENU_TIMING="1",
+        TERM=env.get("TERM", "xterm-256color"),
+    )
+    return env
+
+# Driving the menu through a pty
+class MenuSession:
+    """The real ssh_menu.py entry point running on a pseudo-terminal"""
+
+    def __init__(self, workdir):
+        import pty
+        self.started = time.perf_counter()
+        self.pid, self.fd = pty.fork()
+        if self.pid == 0:
+            try:
+                import fcntl
+                import termios
+                fcntl.ioctl(sys.stdout.fileno(), termios.TIOCSWINSZ, struct.pack("HHHH", ROWS, COLUMNS, 0, 0))
+                os.chdir(workdir)
+                os.execve(sys.executable, [sys.executable, MENU], bench_env())
+            finally:
+                os._exit(127)
+        self.transcript = bytearray()
+
+    def read(self, timeout):
+        """Bytes that arrive within timeout, b"" when none do and None once the menu has exited"""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        if not ready:
+            return b""
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError:
+            return None
+        if not data:
+            return None
+        self.transcript += data
+        return data
+
+    def frame(self, since, quiet=FRAME_QUIET, timeout=FRAME_TIMEOUT):
+        """Read one repaint: returns (ms to first byte, ms to last byte, bytes), measured from since"""
+        first = last = None
+        size = 0
+        deadline = time.perf_counter() + timeout
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            data = self.read(quiet if first is not None else deadline - now)
+            if not data:
+                if data is None or first is not None:
+                    break
+                continue
+            last = time.perf_counter()
+            first = first or last
+            size += len(data)
+        if first is None:
+            return None, None, 0
+        return (first - since) * 1000, (last - since) * 1000, size
+
+    def wait_for(self, marker, timeout=SETTLE_TIMEOUT):
+        """ms since launch until marker appears in the output"""
+        deadline = time.perf_counter() + timeout
+        while marker not in self.transcript:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or self.read(remaining) is None:
+                raise RuntimeError(f"menu never showed {marker!r}")
+        return (time.perf_counter() - self.started) * 1000
+
+    def settle(self):
+        """Wait until background repaints (probe results) stop arriving"""
+        deadline = time.perf_counter() + SETTLE_TIMEOUT
+        while time.perf_counter() < deadline:
+            if not self.read(SETTLE_QUIET):
+                return
+
+    def press(self, key):
+        sent = time.perf_counter()
+        os.write(self.fd, KEYS.get(key, key.encode("utf-8") if isinstance(key, str) else key))
+        return self.frame(sent)
+
+    def finish(self, timeout=10.0):
+        """Drain the output until the menu exits, returns peak RSS of the menu process in MB"""
+        deadline = time.perf_counter() + timeout
+        while self.read(0.2) is not None:
+            if time.perf_counter() >= deadline:
+                os.kill(self.pid, signal.SIGKILL)
+                break
+        _, _, usage = os.wait4(self.pid, 0)
+        os.close(self.fd)
+        # ru_maxrss is in KB on Linux and bytes on macOS
+        return usage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def key_stats(samples):
+    """Summary of (first ms, last ms, bytes) samples for one kind of key"""
+    latencies = [last for _, last, _ in samples if last is not None]
+    sizes = [size for _, last, size in samples if last is not None]
+    if not latencies:
+        return {"count": len(samples), "missed": len(samples)}
+    ordered = sorted(latencies)
+    return {
+        "count": len(samples),
+        "missed": len(samples) - len(latencies),
+        "median_ms": statistics.median(latencies),
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max_ms": ordered[-1],
+        "first_byte_median_ms": statistics.median(first for first, _, _ in samples if first is not None),
+        "bytes_median": statistics.median(sizes),
+        "bytes_max": max(sizes),
+    }
+
+def measure_menu(workdir, inventory, presses):
+    session = MenuSession(workdir)
+    try:
+        first_paint_ms = session.wait_for("Controls".encode("utf-8"))
+        first_frame_bytes = len(session.transcript)
+        session.settle()
+        samples = {}
+        for key in ["down"] * presses + ["home"] + ["pgdn"] * max(3, presses // 4) + ["end"]:
+            samples.setdefault(key, []).append(session.press(key))
+        # Type-to-filter: open the search, type part of a name one key at a time, cancel it
+        query = "-" + next(iter(inventory)).rpartition("-")[2][:4]
+        samples["search"] = [session.press("/")] + [session.press(char) for char in query]
+        samples["search_cancel"] = [session.press("esc")]
+        session.press("home")
+        os.write(session.fd, KEYS["enter"])   # "Exit" is the first option
+    except BaseException:
+        os.kill(session.pid, signal.SIGKILL)
+        raise
+    peak_rss_mb = session.finish()
+    text = session.transcript.decode("utf-8", errors="replace")
+    internal = None
+    marker = "worst keypress-to-paint "
+    if marker in text:
+        internal = float(text.split(marker, 1)[1].split(" ", 1)[0])
+    return {
+        "first_paint_ms": first_paint_ms,
+        "first_frame_bytes": first_frame_bytes,
+        "keys": {key: key_stats(values) for key, values in samples.items()},
+        "internal_worst_latency_ms": internal,
+        "tui_peak_rss_mb": peak_rss_mb,
+    }
+
+def run_size(count, presses, seed):
+    with tempfile.TemporaryDirectory(prefix="ssh-menu-bench-") as workdir:
+        inventory = make_inventory(count, seed)
+        path = os.path.join(workdir, "vms.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(inventory, f, indent=4)
+        result = {"hosts": count, "json_bytes": os.path.getsize(path)}
+        result.update(measure_load(workdir))
+        result.update(measure_menu(workdir, inventory, presses))
+        return result
+
+def source_version():
+    """git describe of the tree being measured, or a hash of its sources outside a checkout"""
+    try:
+        done = subprocess.run(["git", "describe", "--always", "--dirty", "--tags"], cwd=HERE,
+                              capture_output=True, text=True, timeout=10)
+        if done.returncode == 0:
+            return done.stdout.strip()
+    except (OSError, subprocess.TimeoutExpired):
+        pass
+    import hashlib
+    digest = hashlib.sha1()
+    for path in [MENU] + sorted(os.path.join(PACKAGE, name) for name in os.listdir(PACKAGE) if name.endswith(".py")):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return "sha1:" + digest.hexdigest()[:12]
+
+# Reporting
+def flatten(result):
+    """Comparable metrics of one size as {name: value}, lower is better for all of them"""
+    metrics = {name: result[name] for name in (
+        "import_ms", "load_cold_ms", "load_warm_ms", "index_ms", "save_ms", "first_paint_ms",
+        "first_frame_bytes", "load_peak_rss_mb", "tui_peak_rss_mb") if result.get(name) is not None}
+    for key, stats in result["keys"].items():
+        for name in ("median_ms", "p95_ms", "bytes_median"):
+            if name in stats:
+                metrics[f"{key}.{name}"] = stats[name]
+    return metrics
+
+def format_result(result):
+    keys = result["keys"]
+    lines = [
+        f"{result['hosts']:>7} hosts  json {result['json_bytes'] / 1024:.0f} KB",
+        f"  import {result['import_ms']:.1f} ms, load cold {result['load_cold_ms']:.1f} ms / "
+        f"warm {result['load_warm_ms']:.1f} ms ({result['load_warm_source']}), indexes {result['index_ms']:.1f} ms, "
+        f"save {result['save_ms'] or 0:.1f} ms",
+        f"  first paint {result['first_paint_ms']:.0f} ms ({result['first_frame_bytes']} bytes), "
+        f"peak RSS {result['tui_peak_rss_mb'] or 0:.1f} MB (menu) / {result['load_peak_rss_mb']:.1f} MB (load)",
+    ]
+    for key, stats in keys.items():
+        if "median_ms" not in stats:
+            lines.append(f"  {key:<14} no repaint seen")
+            continue
+        lines.append(f"  {key:<14} median {stats['median_ms']:6.1f} ms  p95 {stats['p95_ms']:6.1f} ms  "
+                     f"max {stats['max_ms']:6.1f} ms  {stats['bytes_median']:>6.0f} bytes/frame")
+    if result["internal_worst_latency_ms"] is not None:
+        lines.append(f"  menu's own worst keypress-to-paint: {result['internal_worst_latency_ms']:.1f} ms")
+    return "\n".join(lines)
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """Print metric deltas between two result files, returns the number of regressions"""
+    print(f"{old['version']} -> {new['version']}")
+    old_sizes = {result["hosts"]: flatten(result) for result in old["results"]}
+    regressions = 0
+    for result in new["results"]:
+        before = old_sizes.get(result["hosts"])
+        if before is None:
+            continue
+        print(f"\n{result['hosts']} hosts")
+        for name, value in flatten(result).items():
+            previous = before.get(name)
+            if previous is None:
+                continue
+            change = (value - previous) / previous if previous else 0.0
+            # Run-to-run jitter on tiny numbers is not a regression
+            worse = change > threshold and value - previous > NOISE_FLOOR
+            regressions += worse
+            print(f"  {name:<28} {previous:>10.1f} -> {value:>10.1f}  {change * 100:+6.1f}%{'  REGRESSION' if worse else ''}")
+    return regressions
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="inventory sizes to measure")
+    parser.add_argument("--presses", type=int, default=20, help="arrow presses per size (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the synthetic inventories")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="compare two result files instead of running, exits 1 on regressions")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding="utf-8") as f:
+            new = json.load(f)
+        return 1 if compare(old, new) else 0
+    if os.name == 'nt':
+        print("bench_ssh_menu.py needs a POSIX pseudo-terminal", file=sys.stderr)
+        return 2
+
+    report = {
+        "version": source_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "terminal": [ROWS, COLUMNS],
+        "results": [],
+    }
+    for count in args.sizes:
+        print(f"Measuring {count} hosts...", file=sys.stderr)
+        result = run_size(count, args.presses, args.seed)
+        report["results"].append(result)
+        print(format_result(result))
+        # Written after every size, so a long run still leaves usable numbers
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+    print(f"\nResults written to {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
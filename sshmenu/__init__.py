@@ -0,0 +1,6 @@
+"""SSH manager behind ssh_menu.py
+
+core holds what every start needs: the inventory, launchers, the menu loop and
+the command line. The other modules hold subsystems only some menus and
+commands use, and are imported when one of those runs.
+"""
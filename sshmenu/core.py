@@ -0,0 +1,3950 @@
+"""Inventory, storage, launchers, the menu loop and the command line, everything a start needs"""
+import os
+import sys
+import gc
+import time
+import atexit
+import contextlib
+import collections
+import itertools
+import hashlib
+import marshal
+import struct
+import threading
+import bisect
+import functools
+if os.name == 'nt':
+    import msvcrt  # For Windows keyboard input
+
+# ANSI Colors
+RED = "\033[38;5;196m"        # Bright red
+GREEN = "\033[38;5;46m"       # Bright green  
+CYAN = "\033[38;5;51m"        # Bright cyan
+YELLOW = "\033[38;5;226m"     # Bright yellow
+BLUE = "\033[38;5;39m"        # Bright blue
+MAGENTA = "\033[38;5;201m"    # Bright magenta
+WHITE = "\033[38;5;15m"       # Bright white
+GRAY = "\033[38;5;244m"       # Gray
+ORANGE = "\033[38;5;208m"     # Orange
+PURPLE = "\033[38;5;141m"     # Purple
+RESET = "\033[0m"
+HIGHLIGHT = "\033[48;5;24m\033[38;5;15m"  # Blue background with white text
+BORDER = "\033[38;5;39m"      # Blue for borders
+
+CONFIG_FILE = "vms.json"
+SNAPSHOT_FORMAT = 6
+
+# How the last load_config() call went, for the startup timing report
+load_stats = {"source": None, "ms": None, "cold_ms": None, "entries": 0}
+
+def snapshot_path():
+    """Derived binary cache that lives next to the JSON config"""
+    return f"{CONFIG_FILE}.cache"
+
+def snapshot_key(stat, digest):
+    # marshal is only guaranteed stable within one Python version
+    return (SNAPSHOT_FORMAT, sys.version_info[:2], stat.st_mtime_ns, stat.st_size, digest)
+
+def read_snapshot(stat, digest):
+    """Return (vms, cold_ms) if the snapshot matches the source file exactly"""
+    try:
+        with open(snapshot_path(), "rb") as f:
+            key, cold_ms, vms_data = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if tuple(key) != snapshot_key(stat, digest) or not isinstance(vms_data, dict):
+        return None
+    return {vm_name: VM.from_state(vm_name, state) for vm_name, state in vms_data.items()}, cold_ms
+
+def write_snapshot(stat, digest, vms_data, cold_ms):
+    """Best effort: the snapshot is only a cache and is rebuilt whenever it is stale"""
+    path = snapshot_path()
+    states = {vm_name: vm_info.state() for vm_name, vm_info in vms_data.items()}
+    try:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            marshal.dump((snapshot_key(stat, digest), cold_ms, states), f)
+        os.replace(tmp_path, path)
+    except (OSError, ValueError):
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+def timing_report():
+    """One-line cold/warm load summary, printed when SSH_MENU_TIMING is set"""
+    source = load_stats["source"]
+    if source is None:
+        return ""
+    line = f"{CYAN}ℹ Loaded {load_stats['entries']} VM(s) from {source} in {load_stats['ms']:.1f} ms{RESET}"
+    if source == "snapshot" and load_stats["cold_ms"] is not None:
+        line += f" {GRAY}(cold JSON load: {load_stats['cold_ms']:.1f} ms){RESET}"
+    return line
+
+# Opt-in instrumentation
+METRICS_FILE = "vms_metrics.json"
+PROFILE_FILE = "vms_profile.prof"
+HISTOGRAM_BOUNDS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)  # ms
+
+class Histogram:
+    """Latency distribution in fixed buckets, O(log buckets) per sample"""
+
+    __slots__ = ("buckets", "count", "total", "low", "high", "last")
+
+    def __init__(self):
+        self.buckets = [0] * (len(HISTOGRAM_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.low = None
+        self.high = 0.0
+        self.last = None
+
+    def add(self, ms):
+        self.buckets[bisect.bisect_left(HISTOGRAM_BOUNDS, ms)] += 1
+        self.count += 1
+        self.total += ms
+        self.low = ms if self.low is None else min(self.low, ms)
+        self.high = max(self.high, ms)
+        self.last = ms
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket the given fraction of samples falls in (capped at the maximum)"""
+        if not self.count:
+            return None
+        wanted = fraction * self.count
+        seen = 0
+        for bound, hits in zip(HISTOGRAM_BOUNDS, self.buckets):
+            seen += hits
+            if seen >= wanted:
+                return min(bound, self.high)
+        return self.high
+
+    def to_dict(self):
+        labels = [f"<={bound}" for bound in HISTOGRAM_BOUNDS] + [f">{HISTOGRAM_BOUNDS[-1]}"]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 3) if self.count else None,
+            "min_ms": None if self.low is None else round(self.low, 3),
+            "max_ms": round(self.high, 3),
+            "p50_ms": round(self.percentile(0.5), 3) if self.count else None,
+            "p95_ms": round(self.percentile(0.95), 3) if self.count else None,
+            "p99_ms": round(self.percentile(0.99), 3) if self.count else None,
+            "buckets": {label: hits for label, hits in zip(labels, self.buckets) if hits},
+        }
+
+class Metrics:
+    """Counters and latency histograms for the hot paths, off unless asked for
+
+    Enabled with SSH_MENU_METRICS / --metrics (JSON dump on exit) and
+    SSH_MENU_PROFILE / --profile (cProfile stats of the whole session).
+    While disabled every hook is a single attribute check. Subprocess
+    spawns are counted from audit events, so every ssh, scp and probe
+    counts no matter which code path started it.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.profile_path = None
+        self.profiler = None
+        self.started = None
+        self.counters = {}
+        self.histograms = {}
+        self.overlay = False     # F12 debug overlay in the menus
+
+    def enable(self, path=None, profile_path=None):
+        if path:
+            self.path = path
+        if not self.enabled:
+            self.enabled = True
+            self.started = time.time()
+            sys.addaudithook(self.audit)   # Cannot be removed again, which is fine for a debug switch
+            atexit.register(self.dump)
+        if profile_path and self.profiler is None:
+            import cProfile
+            self.profile_path = profile_path
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def audit(self, event, args):
+        if event == "subprocess.Popen":
+            program = args[0] or (args[1][0] if isinstance(args[1], (list, tuple)) and args[1] else args[1])
+            self.count("subprocess_spawns")
+            self.count(f"spawn:{os.path.basename(os.fsdecode(program))}")
+        elif event in ("os.exec", "os.posix_spawn", "os.system"):
+            self.count("subprocess_spawns")
+            self.count(f"spawn:{event}")
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, ms):
+        if self.enabled:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(ms)
+
+    def snapshot(self):
+        return {
+            "pid": os.getpid(),
+            "argv": sys.argv[1:],
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+            "duration_s": round(time.time() - self.started, 3),
+            "inventory": {"source": load_stats["source"], "entries": load_stats["entries"]},
+            "counters": dict(sorted(self.counters.items())),
+            "histograms": {name: histogram.to_dict() for name, histogram in sorted(self.histograms.items())},
+            "profile": self.profile_path,
+        }
+
+    def dump(self):
+        """Write the metrics JSON and profile stats, runs at exit and right before an exec launch"""
+        if not self.enabled:
+            return
+        import json
+        if self.profiler is not None:
+            self.profiler.disable()
+            try:
+                self.profiler.dump_stats(self.profile_path)
+            except OSError as e:
+                print(f"ssh_menu.py: cannot write {self.profile_path}: {e}", file=sys.stderr)
+            self.profiler.enable()
+        if self.path:
+            try:
+                with open(self.path, "w", encoding="utf-8") as f:
+                    json.dump(self.snapshot(), f, indent=2)
+                    f.write("\n")
+            except OSError as e:
+                print(f"ssh_menu.py: cannot write {self.path}: {e}", file=sys.stderr)
+
+    def overlay_lines(self):
+        """Live numbers for the debug overlay, F12 toggles it in any menu"""
+        def latency(name):
+            histogram = self.histograms.get(name)
+            if histogram is None or not histogram.count:
+                return f"{GRAY}-{RESET}"
+            return (f"{WHITE}{histogram.last:.1f}{GRAY}/p95 {WHITE}{histogram.percentile(0.95):.1f}"
+                    f"{GRAY}/max {WHITE}{histogram.high:.1f}{GRAY} ms")
+        frames = self.counters.get("frames", 0)
+        written = self.counters.get("terminal_bytes", 0)
+        return [
+            f"{ORANGE}┄ debug ┄{GRAY} key→paint {latency('keypress_to_paint')}  render {latency('render')}{RESET}",
+            f"{ORANGE}┄{GRAY} frames {WHITE}{frames}{GRAY}  bytes {WHITE}{written}{GRAY} "
+            f"({written // frames if frames else 0}/frame)  spawns {WHITE}{self.counters.get('subprocess_spawns', 0)}"
+            f"{GRAY}  save {latency('save_config')}{RESET}",
+        ]
+
+metrics = Metrics()
+
+def timed(name):
+    """Record every call of the decorated function in the named histogram while metrics are on"""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.observe(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorate
+
+def metrics_options(argv):
+    """Enable instrumentation from the environment or leading --metrics/--profile FILE options
+
+    Returns argv with those options removed. A value of 1 picks the
+    default file name.
+    """
+    argv = list(argv)
+    chosen = {"--metrics": os.environ.get("SSH_MENU_METRICS"), "--profile": os.environ.get("SSH_MENU_PROFILE")}
+    while argv and argv[0].partition("=")[0] in chosen:
+        option, _, value = argv.pop(0).partition("=")
+        if not value:
+            if not argv:
+                raise LookupError(f"{option} needs a file name")
+            value = argv.pop(0)
+        chosen[option] = value
+    path, profile_path = chosen["--metrics"], chosen["--profile"]
+    if path or profile_path:
+        metrics.enable(METRICS_FILE if path == "1" else path, PROFILE_FILE if profile_path == "1" else profile_path)
+    return argv
+
+# Inventory records
+class VM:
+    """One inventory entry, validated once when the inventory is loaded
+
+    Large fleets repeat the same few colors and user names thousands of
+    times, so those strings are interned and users and tags are tuples.
+    Tags are '/'-separated paths (prod, region/eu-west) shown as a tree.
+    identity_file and ssh_args are passed to ssh for every session, and
+    forwards holds port forward specs ("L 8080:localhost:3000").
+    The pre-colored menu line is built on first use and dropped only when
+    the record is edited through set_ip()/set_color()/add_user()/remove_user().
+    """
+
+    __slots__ = ("name", "ip", "users", "color", "port", "tags", "identity_file", "ssh_args",
+                 "forwards", "extra", "_line", "_user_lines")
+
+    def __init__(self, name, ip, users=(), color="CYAN", port=22, extra=None, tags=(),
+                 identity_file=None, ssh_args=(), forwards=()):
+        self.name = name
+        self.ip = ip
+        self.users = tuple(sys.intern(user) for user in users)
+        self.color = sys.intern(color)
+        self.port = port
+        self.tags = normalize_tags(tags)
+        self.identity_file = identity_file or None
+        self.ssh_args = tuple(ssh_args)
+        self.forwards = tuple(forwards)
+        self.extra = extra or None   # Fields this version doesn't know, kept for round-trips
+        self._line = None
+        self._user_lines = None
+
+    @classmethod
+    def from_dict(cls, name, data):
+        """Validate a vms.json entry, filling in what older files lack"""
+        users = data.get("users", data.get("usuarios", []))  # Legacy "usuarios" field
+        if not isinstance(users, list):
+            users = []
+        port = data.get("port", 22)
+        if port != 22:
+            port = parse_port(port) or 22
+        tags = data.get("tags", [])
+        if not isinstance(tags, list):
+            tags = []
+        ssh_args = data.get("ssh_args", [])
+        if isinstance(ssh_args, str):
+            ssh_args = split_ssh_args(ssh_args)
+        elif not isinstance(ssh_args, list):
+            ssh_args = []
+        identity_file = data.get("identity_file")
+        forwards = data.get("forwards", [])
+        if not isinstance(forwards, list):
+            forwards = []
+        extra = {key: value for key, value in data.items()
+                 if key not in VM_FIELDS}
+        return cls(name, str(data.get("ip", "127.0.0.1")),  # Default fallback IP
+                   [str(user) for user in users], str(data.get("color", "CYAN")), port, extra,
+                   [str(tag) for tag in tags], str(identity_file) if identity_file else None,
+                   [str(arg) for arg in ssh_args], [str(spec) for spec in forwards])
+
+    def to_dict(self):
+        data = {"ip": self.ip, "users": list(self.users), "color": self.color}
+        if self.port != 22:
+            data["port"] = self.port
+        if self.tags:
+            data["tags"] = list(self.tags)
+        if self.identity_file:
+            data["identity_file"] = self.identity_file
+        if self.ssh_args:
+            data["ssh_args"] = list(self.ssh_args)
+        if self.forwards:
+            data["forwards"] = list(self.forwards)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def state(self):
+        """Plain tuple form used by the marshal snapshot"""
+        return (self.ip, self.users, self.color, self.port, self.extra, self.tags,
+                self.identity_file, self.ssh_args, self.forwards)
+
+    @classmethod
+    def from_state(cls, name, state):
+        # Snapshot data was validated (and its strings interned) when it was written
+        vm = cls.__new__(cls)
+        vm.name = name
+        (vm.ip, vm.users, vm.color, vm.port, vm.extra, vm.tags,
+         vm.identity_file, vm.ssh_args, vm.forwards) = state
+        vm._line = vm._user_lines = None
+        return vm
+
+    def copy(self):
+        return VM(self.name, self.ip, self.users, self.color, self.port, dict(self.extra or {}), self.tags,
+                  self.identity_file, self.ssh_args, self.forwards)
+
+    def __eq__(self, other):
+        if not isinstance(other, VM):
+            return NotImplemented
+        return (self.ip == other.ip and self.users == other.users and self.color == other.color
+                and self.port == other.port and self.extra == other.extra and self.tags == other.tags
+                and self.identity_file == other.identity_file and self.ssh_args == other.ssh_args
+                and self.forwards == other.forwards)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"VM({self.name!r}, {self.ip!r}, {self.users!r})"
+
+    @property
+    def color_code(self):
+        return COLORS.get(self.color, RESET)
+
+    def line(self):
+        """Pre-colored 'name (ip)' menu line, cached until the record is edited"""
+        if self._line is None:
+            self._line = f"{self.color_code}{self.name}{RESET} ({self.ip})"
+        return self._line
+
+    def user_lines(self):
+        """'Connect as <user>' options for the user menu, cached until users change"""
+        if self._user_lines is None:
+            self._user_lines = tuple(f"Connect as {user}" for user in self.users)
+        return self._user_lines
+
+    def set_ip(self, ip):
+        self.ip = ip
+        self._line = None
+
+    def add_user(self, user):
+        self.users += (sys.intern(user),)
+        self._user_lines = None
+
+    def remove_user(self, user):
+        self.users = tuple(existing for existing in self.users if existing != user)
+        self._user_lines = None
+
+    def set_tags(self, tags):
+        self.tags = normalize_tags(tags)
+
+    def set_color(self, color):
+        self.color = sys.intern(color)
+        self._line = None
+
+    def has_tag(self, tag):
+        """True when tagged with tag or anything below it (prod matches prod/web)"""
+        return any(own == tag or own.startswith(tag + "/") for own in self.tags)
+
+VM_FIELDS = ("ip", "users", "usuarios", "color", "port", "tags", "identity_file", "ssh_args", "forwards")
+
+def split_ssh_args(text):
+    """'-o ServerAliveInterval=30 -A' -> ['-o', 'ServerAliveInterval=30', '-A'], quoting allowed"""
+    import shlex
+    return shlex.split(text, posix=(os.name != 'nt'))
+
+def normalize_tag(tag):
+    """' prod//eu-west ' -> 'prod/eu-west'"""
+    return "/".join(part.strip() for part in tag.split("/") if part.strip())
+
+def normalize_tags(tags):
+    """Clean tag paths, dropping empty ones and duplicates"""
+    cleaned = (normalize_tag(tag) for tag in tags)
+    return tuple(dict.fromkeys(sys.intern(tag) for tag in cleaned if tag))
+
+def parse_port(value):
+    """A port from vms.json as an int in 1-65535, None when it is not one"""
+    if isinstance(value, str) and value.strip().isdigit():
+        value = int(value)
+    if isinstance(value, int) and not isinstance(value, bool) and 1 <= value <= 65535:
+        return value
+    return None
+
+def records(data):
+    """Build VM records from a {name: dict} inventory"""
+    return {vm_name: VM.from_dict(vm_name, vm_info) for vm_name, vm_info in data.items()}
+
+# Load configuration from JSON or create initial setup
+@timed("load_config")
+def load_config():
+    # Building tens of thousands of small dicts triggers repeated, useless
+    # cyclic GC passes, so collection is paused while the inventory loads
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return read_config()
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def parse_inventory(raw):
+    """Decode and validate vms.json
+
+    Returns ({name: VM}, names of skipped entries, [(name, bad port)] for
+    ports that were replaced with 22).
+
+    Raises ValueError for invalid JSON and TypeError when the top level
+    is not a mapping of VMs.
+    """
+    import json
+    data = json.loads(raw.decode("utf-8"))
+    # Handle both old format (direct dict) and new format (with "vms" key)
+    if isinstance(data, dict) and "vms" in data:
+        vms_data = data["vms"]
+    else:
+        vms_data = data
+
+    # Validate that vms_data is a dictionary
+    if not isinstance(vms_data, dict):
+        raise TypeError("inventory is not a mapping of VMs")
+
+    # Every VM becomes a validated record with the required fields filled in
+    skipped = [vm_name for vm_name, vm_info in vms_data.items() if not isinstance(vm_info, dict)]
+    for vm_name in skipped:
+        del vms_data[vm_name]
+    bad_ports = [(vm_name, vm_info["port"]) for vm_name, vm_info in vms_data.items()
+                 if "port" in vm_info and parse_port(vm_info["port"]) is None]
+    return records(vms_data), skipped, bad_ports
+
+def read_config():
+    start = time.perf_counter()
+    load_stats.update(source="defaults", ms=None, cold_ms=None, entries=0)
+    try:
+        if os.path.exists(CONFIG_FILE):
+            with open(CONFIG_FILE, "rb") as f:
+                raw = f.read()
+                stat = os.fstat(f.fileno())
+
+                # Warm start: reuse the validated snapshot if the JSON is unchanged
+                digest = hashlib.blake2b(raw, digest_size=16).hexdigest()
+                cached = read_snapshot(stat, digest)
+                if cached is not None:
+                    vms_data, cold_ms = cached
+                    load_stats.update(source="snapshot", ms=(time.perf_counter() - start) * 1000,
+                                      cold_ms=cold_ms, entries=len(vms_data))
+                    return vms_data
+
+                import json  # Only a stale snapshot needs the JSON parser
+                try:
+                    vms_data, skipped, bad_ports = parse_inventory(raw)
+                except TypeError:
+                    print(f"{YELLOW}⚠ Warning: Invalid configuration format in {CONFIG_FILE}. Using defaults.{RESET}")
+                    return get_default_config()
+                except json.JSONDecodeError as e:
+                    print(f"{RED}✗ Error: Invalid JSON in {CONFIG_FILE}. Line {e.lineno}: {e.msg}{RESET}")
+                    print(f"{YELLOW}ℹ Using default configuration. Your original file will be backed up.{RESET}")
+
+                    # Backup corrupted file
+                    backup_file = f"{CONFIG_FILE}.backup"
+                    try:
+                        import shutil
+                        shutil.copy2(CONFIG_FILE, backup_file)
+                        print(f"{CYAN}ℹ Corrupted file backed up as '{backup_file}'{RESET}")
+                    except Exception:
+                        pass
+
+                    return get_default_config()
+                for vm_name in skipped:
+                    print(f"{YELLOW}⚠ Warning: Invalid VM configuration for '{vm_name}'. Skipping.{RESET}")
+                for vm_name, port in bad_ports:
+                    print(f"{YELLOW}⚠ Warning: Invalid port {port!r} for '{vm_name}'. Using 22.{RESET}")
+
+                cold_ms = (time.perf_counter() - start) * 1000
+                load_stats.update(source="JSON", ms=cold_ms, cold_ms=cold_ms, entries=len(vms_data))
+                write_snapshot(stat, digest, vms_data, cold_ms)
+                return vms_data
+        else:
+            # File doesn't exist, create with default configuration
+            print(f"{CYAN}ℹ Configuration file '{CONFIG_FILE}' not found. Creating with default settings.{RESET}")
+            return get_default_config()
+    except PermissionError:
+        print(f"{RED}✗ Error: Permission denied accessing {CONFIG_FILE}{RESET}")
+        print(f"{YELLOW}ℹ Using default configuration (changes won't be saved){RESET}")
+        return get_default_config()
+    except Exception as e:
+        print(f"{RED}✗ Error loading configuration: {str(e)}{RESET}")
+        print(f"{YELLOW}ℹ Using default configuration{RESET}")
+        return get_default_config()
+
+def get_default_config():
+    """Return default VM configuration"""
+    return records({
+        "Production Server": {
+            "ip": "192.168.1.100",  # Default production-like IP
+            "users": ["root", "admin", "deploy"],
+            "color": "BLUE"
+        },
+        "Development Server": {
+            "ip": "192.168.1.101",  # Default dev-like IP
+            "users": ["dev", "root"],
+            "color": "GREEN"
+        }
+    })
+
+# Save configuration
+@timed("save_config")
+def write_config(vms, path=None):
+    """Atomically replace the config file (temp file + fsync + rename)
+
+    Readers see either the old or the new file, never a half-written one.
+    """
+    import json
+    import tempfile  # Only needed when saving, keeps CLI startup lean
+    path = path or CONFIG_FILE
+    data = json.dumps(vms, indent=4, ensure_ascii=False, default=VM.to_dict).encode("utf-8")
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".vms-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            stat = os.fstat(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+    if os.name != 'nt':
+        # Persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+    if path == CONFIG_FILE:
+        # Keep the next start warm, the rename preserves mtime and size
+        write_snapshot(stat, hashlib.blake2b(data, digest_size=16).hexdigest(), vms, load_stats["cold_ms"])
+        # What we just wrote is the new common base for merging outside edits
+        if config_watcher.active:
+            config_watcher.remember(vms)
+
+def save_config(vms):
+    """Save VMs configuration to JSON file with error handling"""
+    try:
+        write_config(vms)
+        return True
+    except PermissionError:
+        print(f"{RED}✗ Error: Permission denied writing to {CONFIG_FILE}{RESET}")
+        print(f"{YELLOW}ℹ Changes cannot be saved. Check file permissions.{RESET}")
+        return False
+    except OSError as e:
+        print(f"{RED}✗ Error: Cannot write to {CONFIG_FILE}. {str(e)}{RESET}")
+        print(f"{YELLOW}ℹ Changes cannot be saved.{RESET}")
+        return False
+    except Exception as e:
+        print(f"{RED}✗ Unexpected error saving configuration: {str(e)}{RESET}")
+        return False
+
+# Write-behind persistence
+SAVE_DEBOUNCE = 1.5   # Seconds of quiet before pending edits are flushed
+
+class ConfigWriter:
+    """Coalesce inventory edits into one debounced, atomic flush
+
+    Edits only mark the inventory dirty. The menu loop flushes once the
+    debounce expires, and the exit path (and atexit) flushes whatever is
+    left, so a burst of edits costs a single serialization.
+    """
+
+    def __init__(self, debounce=SAVE_DEBOUNCE):
+        self.debounce = debounce
+        self.dirty = False
+        self.due = 0.0
+        self.pending_edits = 0
+        self.flushes = 0
+        self.last_flush_ms = None
+        self.last_error = None
+
+    def mark_dirty(self):
+        self.dirty = True
+        self.pending_edits += 1
+        self.due = time.monotonic() + self.debounce
+
+    def flush_if_due(self):
+        if self.dirty and time.monotonic() >= self.due:
+            self.flush()
+
+    def flush(self, verbose=False):
+        """Write pending edits now, returns True when nothing is left unsaved"""
+        if not self.dirty:
+            return True
+        # Someone else saved since we last looked: merge their edits instead of clobbering them
+        if config_watcher.changed(force=True):
+            merge_config_changes()
+        start = time.perf_counter()
+        if verbose:
+            saved = save_config(vms)
+            self.last_error = None if saved else "save failed"
+        else:
+            # Background flushes must not print over the menu, keep the error for later
+            try:
+                write_config(vms)
+                saved = True
+                self.last_error = None
+            except Exception as e:
+                saved = False
+                self.last_error = str(e)
+        if saved:
+            self.last_flush_ms = (time.perf_counter() - start) * 1000
+            self.flushes += 1
+            self.dirty = False
+            self.pending_edits = 0
+        else:
+            self.due = time.monotonic() + self.debounce  # Retry later
+        return saved
+
+    def summary(self):
+        if self.last_error:
+            return f"{RED}✗ unsaved changes: {self.last_error}{RESET}"
+        if self.dirty:
+            return f"{YELLOW}● {self.pending_edits} unsaved edit(s){RESET}"
+        if self.last_flush_ms is not None:
+            return f"{GRAY}last save {self.last_flush_ms:.1f} ms{RESET}"
+        return ""
+
+config_writer = ConfigWriter()
+atexit.register(config_writer.flush, True)
+
+# Hot reload of outside edits to vms.json
+WATCH_POLL_INTERVAL = 1.0   # Seconds between stat() checks when inotify is unavailable
+MISSING = object()
+
+class InotifyWatch:
+    """Non-blocking inotify watch on a directory (Linux only)
+
+    The directory is watched rather than the file because atomic saves
+    (ours and most editors') replace the file, which ends a watch on it.
+    """
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    EVENT = struct.Struct("iIII")   # wd, mask, cookie, name length
+
+    def __init__(self, directory):
+        import ctypes
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def names(self):
+        """Drain queued events, returns the names of the files they touched"""
+        names = set()
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return names
+            offset = 0
+            while offset + self.EVENT.size <= len(buf):
+                length = self.EVENT.unpack_from(buf, offset)[3]
+                offset += self.EVENT.size
+                # Queue overflows arrive without a name, which reads as "anything changed"
+                names.add(buf[offset:offset + length].rstrip(b"\0").decode("utf-8", "replace"))
+                offset += length
+
+MERGED_LIST_FIELDS = ("users", "tags")   # Sets of names; other lists (ssh_args) are argv and merge as a whole
+
+def merge_lists(base, ours, theirs):
+    """Merge two edited lists: an item removed on either side is gone, additions from both are kept"""
+    base = base if isinstance(base, list) else []
+    removed = [item for item in base if item not in ours or item not in theirs]
+    merged = [item for item in ours if item not in removed]
+    merged += [item for item in theirs if item not in removed and item not in merged]
+    return merged
+
+def merge_fields(vm_name, base, ours_vm, theirs_vm, conflicts):
+    """Merge a VM edited on both sides field by field, returns the merged VM or None if ours stands"""
+    b = VM.from_state(vm_name, base).to_dict() if base is not None else {}
+    o, t = ours_vm.to_dict(), theirs_vm.to_dict()
+    edited = False
+    for field in dict.fromkeys([*t, *o, *b]):
+        bv, ov, tv = b.get(field, MISSING), o.get(field, MISSING), t.get(field, MISSING)
+        if ov == tv or tv == bv:
+            continue
+        if ov == bv:
+            if tv is MISSING:
+                del o[field]
+            else:
+                o[field] = tv
+        elif field in MERGED_LIST_FIELDS and isinstance(ov, list) and isinstance(tv, list):
+            o[field] = merge_lists(bv, ov, tv)
+        else:
+            conflicts.append(f"{vm_name}: {field} changed on both sides, kept ours")
+            continue
+        edited = True
+    return VM.from_dict(vm_name, o) if edited else None
+
+def merge_inventory(base, ours, theirs):
+    """Three-way merge of the inventory on disk into ours, in place
+
+    base holds the state() of every VM as we last loaded or saved it.
+    Changes made only on disk are applied, changes made only here are
+    kept, and when both sides changed the same field our value wins and
+    the field is reported as a conflict. User and tag lists are merged item by
+    item, so nobody's new user is lost; other lists such as ssh_args are
+    argument vectors and follow the same rule as any other field.
+    Returns (changed VM names, conflicts, VMs added/removed).
+    """
+    changed = set()
+    conflicts = []
+    structural = False
+    for vm_name in dict.fromkeys([*theirs, *ours, *base]):
+        ours_vm, theirs_vm = ours.get(vm_name), theirs.get(vm_name)
+        b = base.get(vm_name)
+        o = ours_vm.state() if ours_vm is not None else None
+        t = theirs_vm.state() if theirs_vm is not None else None
+        if o == t or t == b:
+            continue  # Nothing new on disk for this VM
+        if o == b or o is None or t is None:
+            if o == b and t is None:
+                del ours[vm_name]                   # Deleted on disk
+                structural = True
+            elif o is None:
+                ours[vm_name] = theirs_vm.copy()    # Added on disk, or edited there after we deleted it
+                structural = True
+                if b is not None:
+                    conflicts.append(f"{vm_name}: deleted here, edited on disk")
+            elif t is None:
+                conflicts.append(f"{vm_name}: deleted on disk, edited here")
+                continue
+            else:
+                ours[vm_name] = theirs_vm.copy()
+            changed.add(vm_name)
+            continue
+
+        # Both sides edited this VM, merge field by field
+        try:
+            merged = merge_fields(vm_name, b, ours_vm, theirs_vm, conflicts)
+        except (TypeError, ValueError, AttributeError) as e:
+            # One odd record must not stop the merge (and the housekeeping task running it)
+            conflicts.append(f"{vm_name}: could not merge ({e}), kept ours")
+            continue
+        if merged is not None:
+            ours[vm_name] = merged
+            changed.add(vm_name)
+    return changed, conflicts, structural
+
+class ConfigWatcher:
+    """Notice when vms.json is changed by someone else and merge it in
+
+    Uses inotify where available and falls back to polling mtime/size.
+    Either way a change only counts when the file's signature differs from
+    the one we last loaded or wrote ourselves, so our own saves never
+    trigger a reload.
+    """
+
+    def __init__(self, path=CONFIG_FILE, interval=WATCH_POLL_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.inotify = None
+        self.active = False
+        self.known = None     # (mtime_ns, size, inode) of the file we last read or wrote
+        self.base = {}        # VM states as of that file, the common ancestor for merges
+        self.next_poll = 0.0
+        self.version = 0      # Bumped whenever a reload changed the inventory
+        self.changes = []     # (version, changed VM names, VMs added/removed)
+        self.reloads = 0
+        self.conflicts = []
+        self.last_error = None
+
+    def signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def start(self, inventory):
+        self.remember(inventory)
+        if sys.platform.startswith("linux"):
+            try:
+                self.inotify = InotifyWatch(os.path.dirname(os.path.abspath(self.path)))
+            except (OSError, AttributeError):
+                self.inotify = None  # Polling still works
+        self.active = True
+
+    def remember(self, inventory):
+        """Record inventory as matching the file on disk right now"""
+        self.base = {vm_name: vm_info.state() for vm_name, vm_info in inventory.items()}
+        self.known = self.signature()
+
+    def matches(self, inventory):
+        """True when inventory holds exactly what the file on disk holds"""
+        return len(inventory) == len(self.base) and all(
+            self.base.get(vm_name) == vm_info.state() for vm_name, vm_info in inventory.items())
+
+    def changed(self, force=False):
+        """Cheap check, True when the file on disk is not the one we know"""
+        if not self.active:
+            return False
+        if not force:
+            if self.inotify is not None:
+                names = self.inotify.names()
+                if os.path.basename(self.path) not in names and "" not in names:
+                    return False
+            else:
+                now = time.monotonic()
+                if now < self.next_poll:
+                    return False
+                self.next_poll = now + self.interval
+        return self.signature() != self.known
+
+    def reload(self, inventory):
+        """Merge the file on disk into inventory, returns the changed VM names"""
+        signature = self.signature()
+        try:
+            with open(self.path, "rb") as f:
+                theirs = parse_inventory(f.read())[0]
+        except (OSError, ValueError, TypeError) as e:
+            # Probably caught mid-write by a non-atomic editor, the next event retries
+            self.last_error = str(e)
+            return set()
+        changed, conflicts, structural = merge_inventory(self.base, inventory, theirs)
+        self.base = {vm_name: vm_info.state() for vm_name, vm_info in theirs.items()}
+        self.known = signature
+        self.last_error = None
+        self.reloads += 1
+        self.conflicts = conflicts
+        if changed:
+            self.version += 1
+            self.changes.append((self.version, changed, structural))
+            del self.changes[:-32]
+        return changed
+
+    def changes_since(self, version):
+        """VM names changed by reloads after version, and whether any added or removed VMs"""
+        names = set()
+        structural = False
+        for change_version, changed, added_removed in self.changes:
+            if change_version > version:
+                names |= changed
+                structural = structural or added_removed
+        return names, structural
+
+    def summary(self):
+        if self.conflicts:
+            return f"{YELLOW}⚠ {len(self.conflicts)} conflict(s) on reload, kept local values{RESET}"
+        if self.last_error:
+            return f"{RED}✗ reload failed: {self.last_error}{RESET}"
+        if self.reloads:
+            return f"{GRAY}⟳ reloaded {self.reloads}x{RESET}"
+        return ""
+
+config_watcher = ConfigWatcher()
+
+def merge_config_changes():
+    """Reload vms.json and fold outside edits into the running inventory"""
+    changed = config_watcher.reload(vms)
+    for vm_name in changed:
+        reindex(vm_name, vms.get(vm_name))
+    # Local edits that survived the merge still need to reach the disk
+    if not config_writer.dirty and not config_watcher.matches(vms):
+        config_writer.mark_dirty()
+    return changed
+
+# Inventory storage backends
+class JsonBackend:
+    """vms.json: the whole inventory in memory, saved by the write-behind flusher"""
+
+    name = "json"
+
+    def __init__(self, path=CONFIG_FILE):
+        self.path = path
+        self.inventory = {}
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def load(self):
+        self.inventory = load_config()
+        return self.inventory
+
+    def commit(self, vm_name, vm_info):
+        config_writer.mark_dirty()
+
+    def commit_batch(self, items):
+        # The whole file is rewritten anyway, so a batch is simply flushed right away
+        config_writer.mark_dirty()
+        return config_writer.flush(verbose=True)
+
+    def vms_at(self, ip):
+        return [vm_name for vm_name, vm_info in self.inventory.items() if vm_info.ip == ip]
+
+    def vms_for_user(self, username):
+        return [vm_name for vm_name, vm_info in self.inventory.items() if username in vm_info.users]
+
+    def replace(self, inventory):
+        """Overwrite the whole store, used as a migration target"""
+        write_config(dict(inventory.items()), self.path)
+
+    def close(self):
+        if config_writer.dirty:
+            config_writer.flush(verbose=True)
+        elif not self.exists():
+            save_config(self.inventory)
+
+    def summary(self):
+        return config_writer.summary()
+
+def sqlite_backend():
+    from .sqlite import SqliteBackend
+    return SqliteBackend()
+
+BACKENDS = {"json": JsonBackend, "sqlite": sqlite_backend}
+
+def open_backend(name=None):
+    """Create the inventory backend named by SSH_MENU_BACKEND (default: json)"""
+    name = name or os.environ.get("SSH_MENU_BACKEND") or "json"
+    if name not in BACKENDS:
+        raise LookupError(f"Unknown inventory backend '{name}' (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
+
+backend = JsonBackend()
+
+# Search index over VM names, IPs and users
+SEARCH_CACHED_QUERY = 2   # Ranked results of queries up to this long are kept until the index changes
+SEARCH_CACHE_SIZE = 64    # Queries cached at most, each up to a full inventory of names
+WORD_BOUNDARY = frozenset(" .-_@")
+ORDER_BITS = 32           # Rank keys are score << ORDER_BITS | insertion sequence, sorted as plain ints
+ORDER_MASK = (1 << ORDER_BITS) - 1
+
+def fuzzy_span(text, query):
+    """Length of the leftmost, shortest subsequence match of query in text, or -1
+
+    The same match as the regex 'a.*?b.*?c', found with str.find alone.
+    """
+    start = pos = text.find(query[0])
+    if pos < 0:
+        return -1
+    for char in query[1:]:
+        pos = text.find(char, pos + 1)
+        if pos < 0:
+            return -1
+    return pos + 1 - start
+
+class SearchIndex:
+    """Character index used by the '/' type-to-filter search
+
+    The first keystrokes match most of a large inventory, so ranked
+    results of short queries are cached in the index (not per search
+    session) until a VM is added, edited or removed.
+    """
+
+    def __init__(self):
+        self.texts = {}      # VM name -> lowercase searchable text
+        self.order = {}      # VM name -> insertion sequence, used as tie-breaker
+        self.names = {}      # insertion sequence -> VM name
+        self.chars = {}      # character -> set of VM names containing it
+        self.cache = {}      # short query -> ranked VM names
+        self.sequence = 0
+        self.version = 0
+        self.built = False   # Only the interactive menu builds (and so maintains) the index
+
+    @classmethod
+    def from_inventory(cls, vms):
+        index = cls()
+        index.built = True
+        for vm_name, vm_info in vms.items():
+            index.add(vm_name, vm_info)
+        return index
+
+    def add(self, vm_name, vm_info):
+        # Re-indexing an edited VM keeps its original position
+        position = self.order.get(vm_name)
+        if position is None:
+            position = self.sequence
+            self.sequence += 1
+        self.remove(vm_name)
+        text = " ".join((vm_name, vm_info.ip) + vm_info.users + vm_info.tags).lower()
+        self.texts[vm_name] = text
+        self.order[vm_name] = position
+        self.names[position] = vm_name
+        for char in set(text):
+            self.chars.setdefault(char, set()).add(vm_name)
+        self.version += 1
+        if self.cache:
+            self.cache.clear()
+
+    def remove(self, vm_name):
+        text = self.texts.pop(vm_name, None)
+        if text is None:
+            return
+        self.names.pop(self.order.pop(vm_name, None), None)
+        for char in set(text):
+            self.chars[char].discard(vm_name)
+        self.version += 1
+        if self.cache:
+            self.cache.clear()
+
+    def update(self, vm_name, vm_info):
+        self.add(vm_name, vm_info)
+
+    def candidates(self, query):
+        """VM names that contain every character of the query"""
+        sets = []
+        for char in set(query):
+            names = self.chars.get(char)
+            if not names:
+                return set()
+            sets.append(names)
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:]) if len(sets) > 1 else sets[0]
+
+    def search(self, query, within=None):
+        """Return matching VM names ranked best first
+
+        Substring hits rank above fuzzy subsequence hits; earlier and
+        word-aligned hits rank higher, and matches inside the VM name beat
+        matches in the IP or user list.
+        """
+        query = query.lower()
+        if not query:
+            return sorted(self.texts, key=self.order.get)
+        cached = self.cache.get(query)
+        if cached is not None:
+            return cached
+        if within is None:
+            within = self.candidates(query)
+
+        texts = self.texts
+        order = self.order
+        boundary = WORD_BOUNDARY
+        width = len(query)
+        ranked = []
+        append = ranked.append
+        for vm_name in within:
+            text = texts.get(vm_name)
+            if text is None:
+                continue
+            pos = text.find(query)
+            if pos == 0:
+                score = -1600
+            elif pos > 0:
+                score = pos - 1000 if pos < 500 else -500
+                if text[pos - 1] in boundary:
+                    score -= 200
+                if pos < len(vm_name):
+                    score -= 100
+            else:
+                # Fuzzy subsequence match, penalised by the gaps between matched characters
+                span = fuzzy_span(text, query)
+                if span < 0:
+                    continue
+                score = min(-1, span - width - 500)
+            append(score << ORDER_BITS | order[vm_name])
+        ranked.sort()
+        names = self.names
+        ranked = [names[key & ORDER_MASK] for key in ranked]
+        if width <= SEARCH_CACHED_QUERY:
+            if len(self.cache) >= SEARCH_CACHE_SIZE:
+                self.cache.clear()
+            self.cache[query] = ranked
+        return ranked
+
+    def session(self):
+        return SearchSession(self)
+
+class SearchSession:
+    """Incremental search state, each keystroke narrows the previous results"""
+
+    def __init__(self, index):
+        self.index = index
+        self.version = index.version
+        self.results = {}    # query -> ranked VM names
+
+    def filter(self, query):
+        query = query.lower()
+        if self.version != self.index.version:
+            self.results.clear()
+            self.version = self.index.version
+        if query in self.results:
+            return self.results[query]
+
+        # A longer query can only match a subset of what its prefix matched
+        within = None
+        for length in range(len(query) - 1, 0, -1):
+            previous = self.results.get(query[:length])
+            if previous is not None:
+                within = previous
+                break
+        matches = self.index.search(query, within)
+        self.results[query] = matches
+        return matches
+
+# Group tree over VM tags
+UNTAGGED = "(untagged)"   # Pseudo group at the root for VMs without tags
+
+def tag_prefixes(tag):
+    """'region/eu/west' -> ['region', 'region/eu', 'region/eu/west']"""
+    parts = tag.split("/")
+    return ["/".join(parts[:depth]) for depth in range(1, len(parts) + 1)]
+
+class TagIndex:
+    """Tag -> VM indexes behind the group menu
+
+    A tag such as region/eu/west nests under region and region/eu. Every
+    node keeps the VMs at or below it (for counts) and its child nodes, so
+    a menu level only touches its own entries however large the fleet is.
+    Updated in place as VMs are added, edited or removed.
+    """
+
+    def __init__(self):
+        self.members = {}    # tag path -> {VM name: None} for VMs at or below it
+        self.direct = {}     # tag path -> {VM name: None} for VMs tagged exactly with it
+        self.children = {}   # tag path ("" is the root) -> {child path: None}
+        self.tags_of = {}    # VM name -> tags it is indexed under
+        self.built = False
+
+    @classmethod
+    def from_inventory(cls, vms):
+        index = cls()
+        index.built = True
+        for vm_name, vm_info in vms.items():
+            index.add(vm_name, vm_info)
+        return index
+
+    def add(self, vm_name, vm_info):
+        self.remove(vm_name)
+        tags = vm_info.tags or (UNTAGGED,)
+        self.tags_of[vm_name] = tags
+        for tag in tags:
+            self.direct.setdefault(tag, {})[vm_name] = None
+            parent = ""
+            for path in tag_prefixes(tag):
+                self.children.setdefault(parent, {})[path] = None
+                self.members.setdefault(path, {})[vm_name] = None
+                parent = path
+
+    def remove(self, vm_name):
+        tags = self.tags_of.pop(vm_name, None)
+        if tags is None:
+            return
+        for tag in tags:
+            direct = self.direct.get(tag)
+            if direct is not None:
+                direct.pop(vm_name, None)
+                if not direct:
+                    del self.direct[tag]
+            # Deepest first, so an emptied node is unlinked before its parent is looked at
+            for path in reversed(tag_prefixes(tag)):
+                members = self.members.get(path)
+                if members is None:
+                    continue
+                members.pop(vm_name, None)
+                if not members:
+                    del self.members[path]
+                    self.children.pop(path, None)
+                    parent = path.rpartition("/")[0]
+                    siblings = self.children.get(parent)
+                    if siblings is not None:
+                        siblings.pop(path, None)
+                        if not siblings:
+                            del self.children[parent]
+
+    def update(self, vm_name, vm_info):
+        self.add(vm_name, vm_info)
+
+    def __contains__(self, path):
+        return path in self.members
+
+    def count(self, path):
+        return len(self.members.get(path, ()))
+
+    def groups(self, path=""):
+        """Child groups of a node, sorted by name with the untagged group last"""
+        return sorted(self.children.get(path, ()), key=lambda child: (child == UNTAGGED, child.lower()))
+
+    def vms_at(self, path):
+        return list(self.direct.get(path, ()))
+
+# Reachability probe
+PROBE_TIMEOUT = 2.0   # Seconds to wait for a TCP connect
+PROBE_TTL = 60.0      # Seconds a probe result stays fresh
+
+async def probe_tcp(host, port, timeout=PROBE_TIMEOUT):
+    """Open and close a TCP connection, returns (reachable, rtt_ms, checked_at)"""
+    import asyncio
+    start = time.perf_counter()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError, ValueError):
+        return (False, None, time.monotonic())
+    rtt = (time.perf_counter() - start) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return (True, rtt, time.monotonic())
+
+def probe_concurrency():
+    """How many probes may be in flight at once without running out of file descriptors"""
+    try:
+        import resource
+        soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        return max(16, min(1024, soft - 128))
+    except (ImportError, ValueError, OSError):
+        return 512
+
+class ReachabilityProbe:
+    """Check TCP reachability of every VM in the background with a TTL cache"""
+
+    def __init__(self, timeout=PROBE_TIMEOUT, ttl=PROBE_TTL, concurrency=None):
+        self.timeout = timeout
+        self.ttl = ttl
+        self.concurrency = concurrency or probe_concurrency()
+        self.results = {}     # (host, port) -> (reachable, rtt_ms, checked_at)
+        self.pending = set()
+        self.targets = set()
+        self.lock = threading.Lock()
+        self.version = 0      # Bumped whenever a result arrives
+        self.next_refresh = 0.0
+
+    def status(self, host, port=22):
+        return self.results.get((host, port))
+
+    def refresh(self, targets=None):
+        """Start probing every target whose result is missing or expired"""
+        now = time.monotonic()
+        with self.lock:
+            if targets is not None:
+                self.targets = set(targets)
+            due = [
+                target for target in self.targets
+                if target not in self.pending
+                and (target not in self.results or now - self.results[target][2] >= self.ttl)
+            ]
+            self.pending.update(due)
+            self.next_refresh = now + self.ttl
+        if due and not menu_loop.spawn(self.probe_batch(due)):
+            import asyncio  # Deferred so CLI commands don't pay for it
+            threading.Thread(target=asyncio.run, args=(self.probe_batch(due),), daemon=True).start()
+        return len(due)
+
+    def tick(self):
+        """Re-probe expired targets, called from the menu loop while idle"""
+        if time.monotonic() >= self.next_refresh:
+            self.refresh()
+
+    async def probe_batch(self, targets):
+        # All targets are probed concurrently, bounded only by the fd budget,
+        # so a batch takes about one timeout period regardless of its size
+        import asyncio
+        limit = asyncio.Semaphore(self.concurrency)
+
+        async def probe_one(target):
+            async with limit:
+                result = await probe_tcp(target[0], target[1], self.timeout)
+            with self.lock:
+                self.results[target] = result
+                self.pending.discard(target)
+                self.version += 1
+            menu_loop.wake()
+
+        await asyncio.gather(*(probe_one(target) for target in targets))
+
+reachability = ReachabilityProbe()
+
+def reachability_status(vm_info):
+    result = reachability.status(*vm_target(vm_info))
+    if result is None:
+        return f"{GREEN}Ready to connect{RESET} {GRAY}(reachability unknown){RESET}"
+    reachable, rtt, _ = result
+    if reachable:
+        return f"{GREEN}Ready to connect{RESET} {GRAY}(port open, {rtt:.0f} ms){RESET}"
+    return f"{YELLOW}Port unreachable{RESET} {GRAY}(connection may fail){RESET}"
+
+def vm_target(vm_info):
+    from .resolver import resolver
+    # Host names are probed at their resolved address once it is known
+    return (resolver.address(vm_info.ip), vm_info.port)
+
+def reachability_marker(vm_info):
+    """Fixed-width up/down marker with round-trip time for menu labels"""
+    result = reachability.status(*vm_target(vm_info))
+    if result is None:
+        return f"{GRAY}○   ... {RESET}"
+    reachable, rtt, _ = result
+    if reachable:
+        return f"{GREEN}●{WHITE} {rtt:>4.0f}ms{RESET}"
+    return f"{RED}●{GRAY}   down{RESET}"
+
+# SSH connection multiplexing (OpenSSH ControlMaster/ControlPersist)
+SSH_BIN = os.environ.get("SSH_MENU_SSH", "ssh")   # Override to use a wrapper or a fake ssh
+POOL_STATE_FILE = "vms_pool.json"
+CONTROL_DIR = os.path.join(os.path.expanduser("~"), ".ssh", "ssh-tui-manager")
+CONTROL_PERSIST = "10m"   # How long an idle master stays up after the last session
+POOL_RECENT_LIMIT = 12    # Recently used hosts kept for pre-warming
+
+def multiplexing_supported():
+    # The Win32 port of OpenSSH has no ControlMaster support
+    return os.name != 'nt'
+
+def control_path(username, ip, port=22):
+    """Short, hashed socket path (unix socket paths are limited to ~100 bytes)"""
+    digest = hashlib.sha1(f"{username}@{ip}:{port}".encode("utf-8")).hexdigest()[:16]
+    return os.path.join(CONTROL_DIR, f"cm-{digest}")
+
+def ssh_command_args(username, vm_info, multiplex=True):
+    """Build the ssh argument list for a VM, reusing a pooled master when possible"""
+    ip = vm_info.ip
+    port = vm_info.port
+    args = [SSH_BIN]
+    if multiplex and multiplexing_supported():
+        args += [
+            "-o", "ControlMaster=auto",
+            "-o", f"ControlPath={control_path(username, ip, port)}",
+            "-o", f"ControlPersist={CONTROL_PERSIST}",
+        ]
+    if port != 22:
+        args += ["-p", str(port)]
+    if vm_info.identity_file:
+        args += ["-i", os.path.expanduser(vm_info.identity_file)]
+    args += vm_info.ssh_args
+    args += ["--", f"{username}@{ip}"]  # A name starting with '-' must not read as an option
+    return args
+
+class ConnectionPool:
+    """Track ControlMaster sockets per (user, ip, port) and pre-warm recent hosts"""
+
+    def __init__(self, state_file=POOL_STATE_FILE):
+        self.state_file = state_file
+        self.recent = []     # [username, ip, port] most recent first
+        self.masters = {}    # control path -> [username, ip, port]
+        self.loaded = False  # The state file is read on first use, so imports and most CLI calls skip it
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def load(self):
+        import json
+        self.loaded = True
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.recent = [list(target) for target in state.get("recent", [])]
+            self.masters = {path: list(target) for path, target in state.get("masters", {}).items()}
+        except (OSError, ValueError, AttributeError, TypeError):
+            self.recent = []
+            self.masters = {}
+
+    def save(self):
+        import json
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump({"recent": self.recent, "masters": self.masters}, f, indent=4)
+        except OSError:
+            pass  # Pool state is a cache, losing it only costs a handshake
+
+    def record(self, username, vm_info):
+        """Remember a connection so its master can be pre-warmed next time"""
+        if not multiplexing_supported():
+            return
+        self.ensure_loaded()
+        target = [username, vm_info.ip, vm_info.port]
+        if target in self.recent:
+            self.recent.remove(target)
+        self.recent.insert(0, target)
+        del self.recent[POOL_RECENT_LIMIT:]
+        self.masters[control_path(*target)] = target
+        self.save()
+
+    def has_socket(self, username, ip, port=22):
+        """Cheap check used for menu markers, a stale socket may still be listed"""
+        return multiplexing_supported() and os.path.exists(control_path(username, ip, port))
+
+    def check(self, path, target):
+        """Ask the master itself whether it is alive"""
+        if not os.path.exists(path):
+            return False
+        import subprocess
+        username, ip, port = target
+        try:
+            result = subprocess.run(
+                [SSH_BIN, "-S", path, "-O", "check", "-p", str(port), f"{username}@{ip}"],
+                stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                timeout=5,
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+        return result.returncode == 0
+
+    def live_masters(self):
+        """List (path, target, alive) for every master this tool has started"""
+        self.ensure_loaded()
+        return [(path, target, self.check(path, target)) for path, target in self.masters.items()]
+
+    def close(self, path):
+        self.ensure_loaded()
+        target = self.masters.pop(path, None)
+        if target and os.path.exists(path):
+            import subprocess
+            username, ip, port = target
+            try:
+                subprocess.run(
+                    [SSH_BIN, "-S", path, "-O", "exit", "-p", str(port), f"{username}@{ip}"],
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                    timeout=5,
+                )
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self.save()
+
+    def close_all(self):
+        self.ensure_loaded()
+        for path in list(self.masters):
+            self.close(path)
+
+    def prewarm(self):
+        """Start background masters for recent hosts that have none, without blocking"""
+        self.ensure_loaded()
+        if not multiplexing_supported() or not self.recent:
+            return 0
+        import subprocess
+        os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+        started = 0
+        for username, ip, port in self.recent:
+            if self.has_socket(username, ip, port):
+                continue
+            # Same identity file and options as a real session, taken from the VM at that address
+            vm_info = next((vms[vm_name] for vm_name in backend.vms_at(ip)
+                            if vm_name in vms and vms[vm_name].port == port), None)
+            # BatchMode: pre-warming only works with key auth and must never prompt
+            args = ssh_command_args(username, vm_info or VM(None, ip, port=port))
+            args[1:1] = ["-M", "-N", "-f", "-o", "BatchMode=yes", "-o", "ConnectTimeout=5"]
+            try:
+                subprocess.Popen(
+                    args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL, start_new_session=True,
+                )
+                started += 1
+            except OSError:
+                break
+        return started
+
+connection_pool = ConnectionPool()
+
+# Connection history and frecency ranking
+HISTORY_FILE = "vms_history.log"
+HISTORY_TAIL_BYTES = 256 * 1024       # Only the end of the log is read at startup
+HISTORY_COMPACT_BYTES = 1024 * 1024   # Rewrite the log once it grows past this
+HISTORY_VISITS_PER_VM = 10            # Visits kept per VM when compacting
+FRECENCY_BUCKETS = [                  # (max age in days, weight)
+    (4, 100),
+    (14, 70),
+    (31, 50),
+    (90, 30),
+]
+FRECENCY_OLD_WEIGHT = 10
+
+class ConnectionHistory:
+    """Append-only connection log that ranks VMs by frecency
+
+    Every connect appends one JSON line. Loading reads only the tail of the
+    file and compaction keeps the last few visits per VM, so startup cost
+    is bounded by the recent entries, not the lifetime of the log.
+    """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        self.visits = {}   # VM name -> [(timestamp, user)] oldest first
+        self.scores = {}
+
+    def load(self):
+        import json
+        self.visits = {}
+        try:
+            with open(self.path, "rb") as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - HISTORY_TAIL_BYTES))
+                tail = f.read()
+        except OSError:
+            tail = b""
+        lines = tail.splitlines()
+        if len(tail) >= HISTORY_TAIL_BYTES and lines:
+            lines = lines[1:]  # Drop the partial first line
+        for line in lines:
+            try:
+                timestamp, vm_name, username = json.loads(line)
+            except (ValueError, TypeError):
+                continue
+            self.add_visit(vm_name, username, timestamp)
+        self.rescore()
+
+    def add_visit(self, vm_name, username, timestamp):
+        visits = self.visits.setdefault(vm_name, [])
+        visits.append((timestamp, username))
+        del visits[:-HISTORY_VISITS_PER_VM]
+
+    def record(self, vm_name, username):
+        import json
+        timestamp = int(time.time())
+        self.add_visit(vm_name, username, timestamp)
+        self.scores[vm_name] = self.frecency(vm_name, timestamp)
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps([timestamp, vm_name, username], ensure_ascii=False) + "\n")
+                size = f.tell()
+            if size > HISTORY_COMPACT_BYTES:
+                self.compact()
+        except OSError:
+            pass  # History only affects ordering, never block a connection on it
+
+    def compact(self):
+        """Rewrite the log keeping the last HISTORY_VISITS_PER_VM visits of every VM
+
+        Unlike load(), this streams the whole file, so VMs whose visits are
+        all older than the tail keep them. Lines other menus append while
+        the new file is written are copied over before it replaces the log.
+        """
+        import json
+        visits = {}
+        end = 0   # Offset just past the last complete line read
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # Still being written, carried over below
+                end += len(line)
+                try:
+                    timestamp, vm_name, username = json.loads(line)
+                except (ValueError, TypeError):
+                    continue
+                kept = visits.setdefault(vm_name, [])
+                kept.append((timestamp, username))
+                if len(kept) > 2 * HISTORY_VISITS_PER_VM:
+                    del kept[:-HISTORY_VISITS_PER_VM]
+        for kept in visits.values():
+            del kept[:-HISTORY_VISITS_PER_VM]
+        entries = sorted(
+            (timestamp, vm_name, username)
+            for vm_name, kept in visits.items()
+            for timestamp, username in kept
+        )
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as out:
+            for entry in entries:
+                out.write((json.dumps(list(entry), ensure_ascii=False) + "\n").encode("utf-8"))
+            while True:
+                with open(self.path, "rb") as f:
+                    f.seek(end)
+                    appended = f.read()
+                if not appended:
+                    break
+                out.write(appended)
+                end += len(appended)
+        os.replace(tmp_path, self.path)
+        self.visits = visits
+        self.rescore()
+
+    def frecency(self, vm_name, now=None):
+        """Visit frequency weighted by how recent each visit is"""
+        now = now or time.time()
+        score = 0
+        for timestamp, _ in self.visits.get(vm_name, ()):
+            age_days = (now - timestamp) / 86400
+            for max_age, weight in FRECENCY_BUCKETS:
+                if age_days <= max_age:
+                    score += weight
+                    break
+            else:
+                score += FRECENCY_OLD_WEIGHT
+        return score
+
+    def rescore(self):
+        now = time.time()
+        self.scores = {vm_name: self.frecency(vm_name, now) for vm_name in self.visits}
+
+    def order(self, vm_names):
+        """Most frecent VMs first, the rest keep their inventory order"""
+        ranked = sorted((vm_name for vm_name in vm_names if self.scores.get(vm_name)),
+                        key=lambda vm_name: -self.scores[vm_name])
+        if not ranked:
+            return list(vm_names)
+        top = set(ranked)
+        return ranked + [vm_name for vm_name in vm_names if vm_name not in top]
+
+    def preferred_user(self, vm_name, users):
+        """The configured user with the best frecency on this VM, if any"""
+        now = time.time()
+        best = None
+        best_score = 0
+        for username in users:
+            score = 0
+            for timestamp, visited_as in self.visits.get(vm_name, ()):
+                if visited_as == username:
+                    score += 1 + 1 / (1 + (now - timestamp) / 86400)
+            if score > best_score:
+                best, best_score = username, score
+        return best
+
+history = ConnectionHistory()
+
+# Session launchers
+# Every launcher gets the ssh argv as a list and starts it without a shell,
+# so VM and user names never pass through command-line parsing.
+
+def launch_prepare(vm_name, username, vm_info):
+    """Bookkeeping shared by every launcher, returns the ssh argv"""
+    if multiplexing_supported():
+        os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+    connection_pool.record(username, vm_info)
+    history.record(vm_name, username)
+    return ssh_command_args(username, vm_info)
+
+def launch_result(launcher, start, error=None):
+    return {"launcher": launcher, "spawn_ms": (time.perf_counter() - start) * 1000,
+            "returncode": None, "duration": None, "error": error}
+
+class ExecLauncher:
+    """Replace this process with ssh, the menu ends with the launch"""
+
+    name = "exec"
+    foreground = False
+
+    def available(self):
+        return True
+
+    def launch(self, args, vm_name):
+        backend.close()  # Nothing runs after exec, pending edits go to disk first
+        if posix_keys is not None:
+            posix_keys.restore()
+        sys.stdout.flush()
+        start = time.perf_counter()
+        metrics.count("launch:exec")
+        metrics.dump()  # atexit never runs after exec
+        try:
+            os.execvp(args[0], args)
+        except OSError as e:
+            return launch_result(self.name, start, str(e))
+
+class ChildLauncher:
+    """Run ssh in this terminal and return to the menu when the session ends"""
+
+    name = "child"
+    foreground = True
+
+    def available(self):
+        return True
+
+    def launch(self, args, vm_name):
+        import subprocess
+        start = time.perf_counter()
+        try:
+            proc = subprocess.Popen(args)
+        except OSError as e:
+            return launch_result(self.name, start, str(e))
+        result = launch_result(self.name, start)
+        result["returncode"] = proc.wait()
+        result["duration"] = time.perf_counter() - start
+        return result
+
+class RecordingLauncher:
+    """Like child, but ssh runs on a pty relayed by the menu, which records its output as a transcript"""
+
+    name = "record"
+    foreground = True
+    RELAY_TICK = 0.25   # Seconds between window size checks and partial chunk flushes
+    size = None         # Terminal size last given to the pty
+
+    def available(self):
+        return os.name != 'nt'
+
+    def launch(self, args, vm_name):
+        import fcntl
+        import select
+        import subprocess
+        import termios
+        import tty
+        from .transcripts import transcripts
+        username, _, host = args[-1].rpartition("@")   # ssh_command_args() ends with user@host
+        start = time.perf_counter()
+        master, slave = os.openpty()
+        self.size = None
+        self.resize(master)
+        try:
+            # The pty becomes ssh's controlling terminal, so password prompts and window changes work
+            proc = subprocess.Popen(args, stdin=slave, stdout=slave, stderr=slave, start_new_session=True,
+                                    preexec_fn=lambda: fcntl.ioctl(0, termios.TIOCSCTTY, 0))
+        except OSError as e:
+            os.close(master)
+            return launch_result(self.name, start, str(e))
+        finally:
+            os.close(slave)
+        result = launch_result(self.name, start)
+        try:
+            session = transcripts.open_session(vm_name, username, host)
+        except OSError as e:
+            session = None
+            result["transcript_error"] = str(e)
+        stdin_fd = sys.stdin.fileno()
+        try:
+            saved = termios.tcgetattr(stdin_fd)
+            tty.setraw(stdin_fd)
+        except termios.error:
+            saved = None   # Not a terminal, keys are passed on as they come
+        try:
+            readers = [master, stdin_fd]
+            while True:
+                self.resize(master)
+                ready = select.select(readers, [], [], self.RELAY_TICK)[0]
+                if master in ready:
+                    try:
+                        data = os.read(master, 65536)
+                    except OSError:
+                        data = b""   # EIO: ssh and everything it started are gone
+                    if not data:
+                        break
+                    self.write_all(sys.stdout.fileno(), data)
+                    if session is not None:
+                        session.write(data)
+                if stdin_fd in ready:
+                    data = os.read(stdin_fd, 4096)
+                    if data:
+                        self.write_all(master, data)
+                    else:
+                        readers.remove(stdin_fd)
+                if session is not None:
+                    session.tick()
+        finally:
+            if saved is not None:
+                termios.tcsetattr(stdin_fd, termios.TCSAFLUSH, saved)
+            os.close(master)
+            result["returncode"] = proc.wait()
+            result["duration"] = time.perf_counter() - start
+            if session is not None:
+                session.close(result["returncode"])
+                result["transcript"] = session.id
+                if session.error:
+                    result["transcript_error"] = session.error
+        return result
+
+    def resize(self, master):
+        """Give the pty the size of the real terminal, the kernel tells ssh with SIGWINCH"""
+        import fcntl
+        import termios
+        try:
+            size = os.get_terminal_size(sys.stdout.fileno())
+        except OSError:
+            return
+        if size != self.size:
+            self.size = size
+            fcntl.ioctl(master, termios.TIOCSWINSZ, struct.pack("HHHH", size.lines, size.columns, 0, 0))
+
+    @staticmethod
+    def write_all(fd, data):
+        view = memoryview(data)
+        while view:
+            view = view[os.write(fd, view):]
+
+class TmuxLauncher:
+    """Open the session in a new tmux window, or a pane next to the menu"""
+
+    foreground = False
+
+    def __init__(self, pane=False):
+        self.pane = pane
+        self.name = "tmux-pane" if pane else "tmux"
+
+    def available(self):
+        if not os.environ.get("TMUX"):
+            return False
+        import shutil
+        return shutil.which("tmux") is not None
+
+    def launch(self, args, vm_name):
+        import subprocess
+        # With more than one argument tmux execs the command directly, no shell involved
+        command = ["tmux", "split-window", "-h"] if self.pane else ["tmux", "new-window", "-n", vm_name]
+        start = time.perf_counter()
+        try:
+            done = subprocess.run(command + args, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                  stderr=subprocess.PIPE, timeout=10)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            return launch_result(self.name, start, str(e))
+        error = done.stderr.decode("utf-8", errors="replace").strip() or f"tmux exited with {done.returncode}"
+        return launch_result(self.name, start, error if done.returncode else None)
+
+class ConsoleLauncher:
+    """Open the session in a new console window (Windows)"""
+
+    name = "console"
+    foreground = False
+
+    def available(self):
+        return os.name == 'nt'
+
+    def launch(self, args, vm_name):
+        import subprocess
+        start = time.perf_counter()
+        try:
+            subprocess.Popen(args, creationflags=subprocess.CREATE_NEW_CONSOLE)
+        except OSError as e:
+            return launch_result(self.name, start, str(e))
+        return launch_result(self.name, start)
+
+LAUNCHERS = {
+    "exec": ExecLauncher(),
+    "child": ChildLauncher(),
+    "record": RecordingLauncher(),
+    "tmux": TmuxLauncher(),
+    "tmux-pane": TmuxLauncher(pane=True),
+    "console": ConsoleLauncher(),
+}
+
+def open_launcher(name=None):
+    """Pick the session launcher: SSH_MENU_LAUNCHER, or auto (new console on Windows, tmux inside tmux, else child)"""
+    name = (name or os.environ.get("SSH_MENU_LAUNCHER") or "auto").lower()
+    if name == "auto":
+        for candidate in ("console", "tmux"):
+            if LAUNCHERS[candidate].available():
+                return LAUNCHERS[candidate]
+        return LAUNCHERS["child"]
+    launcher = LAUNCHERS.get(name)
+    if launcher is None:
+        raise LookupError(f"Unknown launcher '{name}' (choose from auto, {', '.join(LAUNCHERS)})")
+    if not launcher.available():
+        raise LookupError(f"The {name} launcher is not available here")
+    return launcher
+
+launcher = LAUNCHERS["child"]
+
+async def launch_session(vm_name, username, vm_info):
+    """Start an SSH session through the active launcher and report how the launch went"""
+    start = time.perf_counter()
+    args = launch_prepare(vm_name, username, vm_info)
+    if launcher.name == "exec":
+        metrics.observe("ssh_launch", (time.perf_counter() - start) * 1000)
+        print(f"{GRAY}Handing the terminal to ssh ({(time.perf_counter() - start) * 1000:.1f} ms){RESET}")
+        return launcher.launch(args, vm_name)  # Only returns if exec failed
+    if not launcher.foreground:
+        return launch_observed(await menu_loop.run_blocking(launcher.launch, args, vm_name))
+    # The menu is suspended while ssh owns the terminal; Ctrl-C belongs to the remote shell
+    import signal
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        return launch_observed(await menu_loop.run_blocking(launcher.launch, args, vm_name))
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        screen.invalidate()
+
+def launch_observed(result):
+    metrics.count(f"launch:{result['launcher']}")
+    metrics.observe("ssh_launch", result["spawn_ms"])
+    return result
+
+def launch_report(result):
+    if result["error"]:
+        return f"{RED}✗ Launch via {result['launcher']} failed: {result['error']}{RESET}"
+    spawned = f"{GRAY}(started in {result['spawn_ms']:.1f} ms){RESET}"
+    if result["launcher"] in ("child", "record"):
+        code = result["returncode"]
+        status = f"{GREEN}exit 0{RESET}" if code == 0 else f"{RED}exit {code}{RESET}"
+        report = f"\n{CYAN}ℹ Session ended ({status}{CYAN}) after {result['duration']:.1f}s{RESET} {spawned}"
+        if result.get("transcript_error"):
+            report += f"\n{YELLOW}⚠ Transcript incomplete: {result['transcript_error']}{RESET}"
+        elif result.get("transcript"):
+            report += f"\n{GRAY}Recorded as {result['transcript']}{RESET}"
+        return report
+    where = {"tmux": "a new tmux window", "tmux-pane": "a tmux pane", "console": "a new console window"}
+    return f"{GREEN}✓ Opened in {where[result['launcher']]}{RESET} {spawned}"
+
+# Color name mapping
+COLORS = {
+    "RED": RED,
+    "GREEN": GREEN,
+    "CYAN": CYAN,
+    "YELLOW": YELLOW,
+    "BLUE": BLUE,
+    "MAGENTA": MAGENTA,
+    "WHITE": WHITE,
+    "ORANGE": ORANGE,
+    "PURPLE": PURPLE
+}
+
+CLEAR = "\033[2J\033[H"             # Clear screen and home cursor
+ERASE_LINE = "\033[K"               # Erase to end of line
+
+class ScreenRenderer:
+    """Keep the last painted frame and repaint only the lines that changed"""
+
+    def __init__(self, stream=None):
+        self.stream = stream
+        self.frame = []
+        self.valid = False
+
+    def invalidate(self):
+        """Forget the last frame so the next render repaints everything"""
+        self.frame = []
+        self.valid = False
+
+    def render(self, lines):
+        """Paint a frame with a single buffered write, returns bytes written"""
+        out = []
+        if self.valid:
+            old = self.frame
+        else:
+            out.append(CLEAR)
+            old = []
+
+        for row, line in enumerate(lines):
+            if row >= len(old) or old[row] != line:
+                out.append(f"\033[{row + 1};1H{line}{ERASE_LINE}")
+        # Blank any rows left over from a taller previous frame
+        for row in range(len(lines), len(old)):
+            out.append(f"\033[{row + 1};1H{ERASE_LINE}")
+
+        self.frame = list(lines)
+        self.valid = True
+        if not out:
+            return 0
+
+        # Park the cursor below the frame so later prints start on a clean line
+        out.append(f"\033[{len(lines) + 1};1H")
+        data = "".join(out)
+        stream = self.stream or sys.stdout
+        stream.write(data)
+        stream.flush()
+        return len(data)
+
+screen = ScreenRenderer()
+
+@timed("clear_screen")
+def clear_screen():
+    screen.invalidate()
+    metrics.count("terminal_bytes", len(CLEAR))
+    sys.stdout.write(CLEAR)
+    sys.stdout.flush()
+
+class PosixKeyReader:
+    """Raw-mode keyboard input for POSIX terminals
+
+    stdin is read in bulk with os.read and split into keys here, so a
+    burst of auto-repeated arrows is already queued when the menu looks
+    for more. Escape sequences (arrows, PgUp/PgDn, Home/End in their CSI
+    and SS3 forms) are parsed from the buffer; a lone ESC only counts as
+    the Esc key once no sequence byte follows within ESCAPE_TIMEOUT, and a
+    sequence that stops halfway is dropped.
+    """
+
+    ESCAPE_TIMEOUT = 0.05
+    SEQUENCES = {
+        b"[A": 'UP', b"[B": 'DOWN', b"[C": 'RIGHT', b"[D": 'LEFT',
+        b"OA": 'UP', b"OB": 'DOWN', b"OC": 'RIGHT', b"OD": 'LEFT',
+        b"[5~": 'PGUP', b"[6~": 'PGDN',
+        b"[H": 'HOME', b"[F": 'END', b"OH": 'HOME', b"OF": 'END',
+        b"[1~": 'HOME', b"[4~": 'END', b"[7~": 'HOME', b"[8~": 'END',
+        b"[24~": 'F12',
+    }
+    CONTROL = {b"\r": 'ENTER', b"\n": 'ENTER', b"\x7f": 'BACKSPACE', b"\x08": 'BACKSPACE', b"\t": 'TAB'}
+
+    def __init__(self, fd=None):
+        self.fd = sys.stdin.fileno() if fd is None else fd
+        self.buffer = bytearray()
+        self.saved = None    # Terminal attributes to restore, None while not in raw mode
+
+    def raw(self):
+        """Switch the terminal to raw input (no line buffering, no echo), output is left alone"""
+        if self.saved is not None:
+            return
+        import termios
+        try:
+            self.saved = termios.tcgetattr(self.fd)
+        except termios.error:
+            return  # Not a terminal (piped input), bytes arrive as they are
+        attrs = termios.tcgetattr(self.fd)
+        attrs[0] &= ~(termios.ICRNL | termios.IXON)     # Enter reads as \r, Ctrl-S/Q are plain keys
+        attrs[3] &= ~(termios.ICANON | termios.ECHO)    # ISIG stays, so Ctrl-C still interrupts
+        attrs[6][termios.VMIN] = 1
+        attrs[6][termios.VTIME] = 0
+        termios.tcsetattr(self.fd, termios.TCSANOW, attrs)
+        atexit.register(self.restore)
+
+    def restore(self):
+        """Back to the normal line-buffered terminal, needed before input() or launching ssh"""
+        if self.saved is None:
+            return
+        import termios
+        termios.tcsetattr(self.fd, termios.TCSANOW, self.saved)
+        self.saved = None
+
+    def fill(self, timeout):
+        """Wait up to timeout for input and append everything available, False on timeout"""
+        import select
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        data = os.read(self.fd, 4096)
+        if not data:
+            raise EOFError("stdin closed")
+        self.buffer += data
+        return True
+
+    def read(self, timeout=None):
+        """Next key press, or None if none arrives within timeout"""
+        self.raw()
+        if not self.buffer and not self.fill(timeout):
+            return None
+        while True:
+            key, length = self.parse(self.buffer)
+            if key is not None:
+                del self.buffer[:length]
+                return key
+            # Incomplete escape sequence or UTF-8 character, give the rest a moment to arrive
+            if not self.fill(self.ESCAPE_TIMEOUT):
+                # A lone ESC is the Esc key; the start of a sequence whose rest never came
+                # is dropped whole, so its '[' or 'O' is not typed into a search query
+                key = 'ESC' if self.buffer == b"\x1b" else '' if self.buffer[:1] == b"\x1b" else None
+                self.buffer.clear()
+                return key
+
+    def buffered(self):
+        """Next key if one is complete in the buffer already, never reads or waits"""
+        if not self.buffer:
+            return None
+        key, length = self.parse(self.buffer)
+        if key is None:
+            return None
+        del self.buffer[:length]
+        return key
+
+    def parse(self, buffer):
+        """Split one key off the front of buffer: (key, bytes used), or (None, 0) when incomplete"""
+        first = bytes(buffer[:1])
+        if first == b"\x1b":
+            if len(buffer) == 1:
+                return None, 0
+            if buffer[1:2] not in (b"[", b"O"):
+                return 'ESC', 1  # Alt+key or a real Esc followed by typing
+            # CSI/SS3: parameter bytes, then one final byte in @..~
+            for end in range(2, len(buffer)):
+                if 0x40 <= buffer[end] <= 0x7E and not (buffer[1:2] == b"[" and buffer[end] == 0x5B):
+                    sequence = bytes(buffer[1:end + 1])
+                    return self.SEQUENCES.get(sequence, ''), end + 1  # Unknown sequences are swallowed
+            return None, 0
+        if first in self.CONTROL:
+            return self.CONTROL[first], 1
+        # UTF-8: the lead byte says how long the character is
+        lead = buffer[0]
+        length = 1 if lead < 0x80 else 2 if lead >> 5 == 0b110 else 3 if lead >> 4 == 0b1110 else 4 if lead >> 3 == 0b11110 else 1
+        if len(buffer) < length:
+            return None, 0
+        return bytes(buffer[:length]).decode("utf-8", errors="ignore"), length
+
+posix_keys = None
+
+def get_key(timeout=None):
+    """Get a single key press, or None if the timeout expires first"""
+    global posix_keys
+    if os.name == 'nt':  # Windows
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+            while not msvcrt.kbhit():
+                if time.monotonic() >= deadline:
+                    return None
+                time.sleep(0.01)
+        key = msvcrt.getch()
+        if key == b'\xe0' or key == b'\x00':  # Special key (arrow keys)
+            key = msvcrt.getch()
+            if key == b'H':  # Up arrow
+                return 'UP'
+            elif key == b'P':  # Down arrow
+                return 'DOWN'
+            elif key == b'M':  # Right arrow
+                return 'RIGHT'
+            elif key == b'K':  # Left arrow
+                return 'LEFT'
+            elif key == b'I':  # Page Up
+                return 'PGUP'
+            elif key == b'Q':  # Page Down
+                return 'PGDN'
+            elif key == b'G':  # Home
+                return 'HOME'
+            elif key == b'O':  # End
+                return 'END'
+            elif key == b'\x86':  # F12
+                return 'F12'
+        elif key == b'\r':  # Enter
+            return 'ENTER'
+        elif key == b'\x1b':  # Escape
+            return 'ESC'
+        elif key == b'\x08':  # Backspace
+            return 'BACKSPACE'
+        elif key == b'\t':  # Tab
+            return 'TAB'
+        elif key.isdigit():  # Number keys
+            return key.decode('utf-8')
+        else:
+            return key.decode('utf-8', errors='ignore')
+    if posix_keys is None:
+        posix_keys = PosixKeyReader()
+    return posix_keys.read(timeout)
+
+CONTROLS_BOX = [
+    f"{CYAN}┌─ Controls ────────────────────────────────────────┐{RESET}",
+    f"{CYAN}│{WHITE} ↑↓{GRAY} Navigate  {WHITE}Enter/→{GRAY} Select  {WHITE}←/Esc{GRAY} Back  {WHITE}0-9{GRAY} Direct {CYAN}│{RESET}",
+    f"{CYAN}│{WHITE} PgUp/PgDn{GRAY} Page  {WHITE}Home/End{GRAY} First/Last  {WHITE}/{GRAY} Search     {CYAN}│{RESET}",
+    f"{CYAN}└───────────────────────────────────────────────────┘{RESET}",
+]
+
+MULTI_CONTROLS_BOX = [
+    f"{CYAN}┌─ Controls ────────────────────────────────────────┐{RESET}",
+    f"{CYAN}│{WHITE} ↑↓ PgUp/PgDn{GRAY} Move  {WHITE}Space/Tab{GRAY} Toggle  {WHITE}Enter{GRAY} Confirm{CYAN}│{RESET}",
+    f"{CYAN}│{WHITE} +{GRAY} All (or matches)  {WHITE}-{GRAY} None  {WHITE}/{GRAY} Search  {WHITE}Esc{GRAY} Back    {CYAN}│{RESET}",
+    f"{CYAN}└───────────────────────────────────────────────────┘{RESET}",
+]
+
+class LazyOptions:
+    """Menu option list that formats entries only when they are displayed"""
+
+    def __init__(self, items, formatter, head=(), tail=()):
+        self.items = items
+        self.formatter = formatter
+        self.head = list(head)
+        self.tail = list(tail)
+        self.cache = {}
+
+    def __len__(self):
+        return len(self.head) + len(self.items) + len(self.tail)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index < len(self.head):
+            return self.head[index]
+        index -= len(self.head)
+        if index < len(self.items):
+            label = self.cache.get(index)
+            if label is None:
+                if metrics.enabled:
+                    start = time.perf_counter()
+                    label = self.cache[index] = self.formatter(self.items[index])
+                    metrics.observe("format_option", (time.perf_counter() - start) * 1000)
+                else:
+                    label = self.cache[index] = self.formatter(self.items[index])
+            return label
+        return self.tail[index - len(self.items)]
+
+    def invalidate(self, indices=None):
+        """Drop cached labels, all of them or only the given option indices"""
+        if indices is None:
+            self.cache.clear()
+            return
+        for index in indices:
+            self.cache.pop(index - len(self.head), None)
+
+NAVIGATION_KEYS = ('UP', 'DOWN', 'PGUP', 'PGDN', 'HOME', 'END')
+MENU_RELOAD = -2   # arrow_menu result when a refresh asks for the options to be rebuilt
+
+def format_option(option, is_selected):
+    if is_selected:
+        return f"{HIGHLIGHT} ➤ {option} {RESET}"
+    return f"{GRAY}   {option}{RESET}"
+
+def menu_height(chrome_lines):
+    """Number of option rows that fit on screen next to the menu chrome"""
+    import shutil
+    rows = shutil.get_terminal_size((80, 24)).lines
+    # Title, blank line, position indicator, controls box and the parked cursor line
+    return max(3, rows - chrome_lines - 3 - len(CONTROLS_BOX))
+
+def scroll_window(selected, top, height, total):
+    """Return the first visible row so that the selection stays in view"""
+    if selected < top:
+        top = selected
+    elif selected >= top + height:
+        top = selected - height + 1
+    return max(0, min(top, total - height))
+
+def position_indicator(selected, top, height, total):
+    if total <= height:
+        return ""
+    above = f"{WHITE}▲{GRAY}" if top > 0 else " "
+    below = f"{WHITE}▼{GRAY}" if top + height < total else " "
+    return f"{GRAY}   {above}{below} {selected + 1}/{total}  (rows {top + 1}-{min(top + height, total)}){RESET}"
+
+MENU_TICK = 0.25   # Seconds between idle refreshes while waiting for a key
+KEY_POLL = 0.01    # Seconds between console polls on Windows, the bound on keypress-to-paint latency
+COALESCED_KEYS = ('UP', 'DOWN', 'PGUP', 'PGDN')   # Auto-repeated keys handled as one move per burst
+
+class MenuLoop:
+    """The asyncio loop the interactive menus run on
+
+    Key presses, background results and timers are all events on one
+    loop: reachability probes run as tasks, write-behind flushes and hot
+    reloads run from a housekeeping task (reloads straight off the inotify
+    fd where there is one), and anything that changes what is on screen
+    wakes the current menu so it repaints without waiting for a key.
+    Blocking calls such as input() and ssh launches go to a thread
+    through run_blocking(), so the loop keeps running meanwhile.
+    On POSIX the loop waits on stdin itself; the Windows console cannot
+    be selected on, so there it polls every KEY_POLL.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.thread = None
+        self.woken = False
+        self.waiter = None       # Future the loop sleeps on while waiting for input
+        self.pushback = None     # Key read while counting a burst that belongs to the next call
+        self.repeat = 1          # How many identical keys the last next_key() result stands for
+        self.blocking = 0        # run_blocking() calls in flight
+        self.reload_due = False
+        self.watching = False    # Config reloads are driven by the inotify fd
+        self.key_at = None       # When the key being handled was read
+        self.worst_latency_ms = 0.0
+        self.keys = 0
+
+    def run(self, main):
+        import asyncio
+        return asyncio.run(self.main(main))
+
+    async def main(self, main):
+        import asyncio
+        self.loop = asyncio.get_running_loop()
+        self.thread = threading.get_ident()
+        housekeeping = asyncio.create_task(self.housekeeping())
+        if config_watcher.inotify is not None:
+            try:
+                self.loop.add_reader(config_watcher.inotify.fd, self.config_event)
+                self.watching = True
+            except (NotImplementedError, OSError):
+                pass
+        try:
+            return await main
+        finally:
+            if posix_keys is not None:
+                posix_keys.restore()
+            housekeeping.cancel()
+            if self.watching:
+                self.loop.remove_reader(config_watcher.inotify.fd)
+                self.watching = False
+            self.loop = None
+
+    def spawn(self, coro):
+        """Run a coroutine as a task on the menu loop, returns False when called off the loop"""
+        if self.loop is None or threading.get_ident() != self.thread:
+            coro.close()
+            return False
+        self.loop.create_task(coro)
+        return True
+
+    def wake(self):
+        """Ask the current menu to repaint, safe from any thread"""
+        self.woken = True
+        if self.loop is not None:
+            if threading.get_ident() == self.thread:
+                self.release()
+            else:
+                self.loop.call_soon_threadsafe(self.release)
+
+    def release(self):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(None)
+
+    async def next_key(self, timeout=None):
+        """Next key press, or None once woken or when the timeout runs out
+
+        Identical navigation keys queued right behind it (a held arrow
+        key) are consumed as well and counted in self.repeat, so a burst
+        moves the cursor once and costs a single repaint.
+        """
+        deadline = None if timeout is None else self.loop.time() + timeout
+        while True:
+            key, self.pushback = self.pushback or get_key(timeout=0), None
+            if key is not None:
+                self.key_at = time.perf_counter()
+                self.repeat = 1
+                if key in COALESCED_KEYS:
+                    following = self.queued()
+                    while following == key:
+                        self.repeat += 1
+                        following = self.queued()
+                    self.pushback = following
+                return key
+            if self.woken or (deadline is not None and self.loop.time() >= deadline):
+                self.woken = False
+                return None
+            await self.idle(deadline)
+
+    @staticmethod
+    def queued():
+        """A key that is already waiting; on POSIX only what is buffered, a split sequence must not block"""
+        if posix_keys is not None:
+            return posix_keys.buffered()
+        return get_key(timeout=0)
+
+    async def idle(self, deadline):
+        """Sleep until a key arrives, wake() is called or the deadline passes"""
+        import asyncio
+        if posix_keys is None or posix_keys.buffer:
+            remaining = KEY_POLL if deadline is None else deadline - self.loop.time()
+            await asyncio.sleep(max(0, min(KEY_POLL, remaining)))
+            return
+        self.waiter = self.loop.create_future()
+        self.loop.add_reader(posix_keys.fd, self.release)
+        timer = self.loop.call_at(deadline, self.release) if deadline is not None else None
+        try:
+            await self.waiter
+        finally:
+            self.loop.remove_reader(posix_keys.fd)
+            if timer is not None:
+                timer.cancel()
+            self.waiter = None
+
+    def painted(self):
+        if self.key_at is not None:
+            latency = (time.perf_counter() - self.key_at) * 1000
+            self.worst_latency_ms = max(self.worst_latency_ms, latency)
+            metrics.observe("keypress_to_paint", latency)
+            self.keys += 1
+            self.key_at = None
+
+    async def run_blocking(self, func, *args):
+        """Run a blocking call in a daemon thread while the loop keeps going
+
+        Reload merges and flushes wait until it returns, since the caller
+        may be halfway through editing a VM record. Not the default
+        executor: on Ctrl-C asyncio.run() joins its threads, which would
+        hang for as long as input() waits for a line.
+        """
+        self.blocking += 1
+        if posix_keys is not None:
+            posix_keys.restore()  # input() and ssh need the terminal back in line mode
+        loop = self.loop
+        future = loop.create_future()
+
+        def settle(result, error):
+            if not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+        def work():
+            result, error = None, None
+            try:
+                result = func(*args)
+            except BaseException as e:
+                error = e
+            try:
+                loop.call_soon_threadsafe(settle, result, error)
+            except RuntimeError:
+                pass  # The loop is gone, the menu is exiting
+
+        threading.Thread(target=work, daemon=True).start()
+        try:
+            return await future
+        finally:
+            self.blocking -= 1
+
+    def config_event(self):
+        """inotify fd readable: something in the config directory changed"""
+        if config_watcher.changed():
+            self.reload_due = True
+            self.reload()
+
+    def reload(self):
+        if self.reload_due and not self.blocking:
+            self.reload_due = False
+            merge_config_changes()
+            self.wake()
+
+    async def housekeeping(self):
+        import asyncio
+        from .forwards import forward_manager
+        while True:
+            await asyncio.sleep(MENU_TICK)
+            if not self.watching and config_watcher.changed():
+                self.reload_due = True
+            self.reload()
+            if not self.blocking:
+                config_writer.flush_if_due()
+            if forward_manager.supervise():
+                self.wake()
+
+    def latency_report(self):
+        return (f"{CYAN}ℹ {self.keys} key(s) handled, worst keypress-to-paint {self.worst_latency_ms:.1f} ms "
+                f"(poll bound {KEY_POLL * 1000:.0f} ms){RESET}")
+
+menu_loop = MenuLoop()
+
+async def ainput(prompt=""):
+    """input() for the menus, probes and timers keep running while the user types"""
+    return await menu_loop.run_blocking(input, prompt)
+
+async def arrow_menu(options, title="Select an option", header=None, search=None, refresh=None,
+               multi=False, initial=0):
+    """Display a menu with arrow key navigation
+
+    When a search callback is given, '/' starts type-to-filter mode. The
+    callback receives the query and returns the matching option indices.
+    A refresh callback runs whenever background work (reachability
+    results, hot reloads) wakes the menu and on every idle tick, so the
+    visible rows repaint without waiting for a key. When refresh returns
+    True the menu returns MENU_RELOAD so the caller can rebuild its options.
+    With multi=True, Space/Tab toggle options and Enter returns the sorted
+    list of chosen indices (or the highlighted one if none were toggled).
+    '+' chooses every option, or every match while a search is active
+    (host names never contain '+'); '-' clears the choice outside search,
+    where it would otherwise be typed into the query.
+    """
+    selected = initial if 0 <= initial < len(options) else 0
+    top = 0
+    header = list(header or [])
+    query = None     # None while not searching
+    view = None      # Option indices shown while a filter is active
+    chosen = set()   # Toggled option indices in multi-select mode
+    controls = MULTI_CONTROLS_BOX if multi else CONTROLS_BOX
+    while True:
+        total = len(view) if view is not None else len(options)
+        overlay = metrics.overlay_lines() if metrics.overlay else []
+        height = menu_height(len(header) + len(overlay))
+        top = scroll_window(selected, top, height, max(total, 1))
+
+        # Only the visible window is formatted, so a redraw costs O(height)
+        lines = header + [f"{BLUE}{title}{RESET}" + (f"  {GREEN}{len(chosen)} selected{RESET}" if multi else "")]
+        if query is None:
+            lines.append("")
+        else:
+            lines.append(f"{CYAN}/{WHITE}{query}{GRAY}▏ {total} match{'es' if total != 1 else ''}{RESET}")
+        for i in range(top, min(top + height, total)):
+            index = view[i] if view is not None else i
+            option = options[index]
+            if multi:
+                option = (f"{GREEN}[✓]{RESET} " if index in chosen else "[ ] ") + option
+            lines.append(format_option(option, i == selected))
+        lines.append(position_indicator(selected, top, height, total))
+        lines += controls + overlay
+        if metrics.enabled:
+            start = time.perf_counter()
+            written = screen.render(lines)
+            metrics.observe("render", (time.perf_counter() - start) * 1000)
+            if written:
+                metrics.count("frames")
+                metrics.count("terminal_bytes", written)
+        else:
+            screen.render(lines)
+        menu_loop.painted()
+
+        key = await menu_loop.next_key(MENU_TICK)
+        if refresh is not None and refresh():
+            return MENU_RELOAD
+        if key is None:
+            continue
+        if key == 'F12':  # Hidden debug overlay, collects metrics in memory if they were off
+            metrics.overlay = not metrics.overlay
+            metrics.enable()
+            continue
+
+        current = (view[selected] if view is not None else selected) if total else None
+        if multi:
+            if key in (' ', 'TAB'):
+                if current is not None:
+                    chosen.symmetric_difference_update({current})
+                continue
+            elif key == 'ENTER' or key == 'RIGHT':
+                if chosen:
+                    return sorted(chosen)
+                if current is not None:
+                    return [current]
+                continue
+            elif key == '+':  # All matches while searching (an empty query matches everything)
+                chosen.update(view if view is not None else range(len(options)))
+                continue
+            elif query is None and key == '-':
+                chosen.clear()
+                continue
+
+        if query is not None and key not in NAVIGATION_KEYS:
+            # Search mode: printable keys edit the query, navigation keys still work
+            if key == 'ESC' or (key == 'BACKSPACE' and not query):
+                query = None
+                view = None
+                selected = top = 0
+                continue
+            elif key == 'ENTER' or key == 'RIGHT':
+                if current is not None:
+                    return current
+                continue
+            elif key == 'BACKSPACE':
+                query = query[:-1]
+            elif key and len(key) == 1 and key.isprintable():
+                query += key
+            else:
+                continue
+            view = search(query) if query else None
+            selected = top = 0
+            continue
+        elif key == '/' and search is not None:
+            query = ""
+            continue
+
+        if key == 'ESC' or key == 'LEFT':  # Escape or Left arrow to go back
+            return -1  # Go back, also out of a menu with nothing to choose
+        if not total:
+            continue
+        repeat = menu_loop.repeat
+        if key == 'UP':
+            selected = (selected - repeat) % total
+        elif key == 'DOWN':
+            selected = (selected + repeat) % total
+        elif key == 'PGUP':
+            selected = max(0, selected - height * repeat)
+        elif key == 'PGDN':
+            selected = min(total - 1, selected + height * repeat)
+        elif key == 'HOME':
+            selected = 0
+        elif key == 'END':
+            selected = total - 1
+        elif key == 'ENTER' or key == 'RIGHT':  # Enter or Right arrow to select
+            return selected
+        elif key and key.isdigit() and not multi:
+            num = int(key)
+            if 0 <= num < total:
+                return num
+
+# Inventory, loaded by main() so importing the module stays cheap
+vms = {}
+search_index = SearchIndex()
+tag_index = TagIndex()
+
+def vm_search(vm_names, offset):
+    """Build an arrow_menu search callback that maps matching VMs to option indices"""
+    session = search_index.session()
+    positions = {vm_name: i + offset for i, vm_name in enumerate(vm_names)}
+    return lambda query: [positions[vm_name] for vm_name in session.filter(query) if vm_name in positions]
+
+def reindex(vm_name, vm_info):
+    """Bring the search and tag indexes in line with one VM (None when it was deleted)"""
+    for index in (search_index, tag_index):
+        if index.built:
+            if vm_info is None:
+                index.remove(vm_name)
+            else:
+                index.update(vm_name, vm_info)
+
+def commit_vm(vm_name):
+    """Persist an added, edited or deleted VM through the active backend and reindex it"""
+    vm_info = vms.get(vm_name)
+    reindex(vm_name, vm_info)
+    backend.commit(vm_name, vm_info)
+
+def warn_shared_ip(ip, vm_name=None):
+    """Point out other VMs already using an address (looked up through the backend's IP index)"""
+    others = [other for other in backend.vms_at(ip) if other != vm_name]
+    if others:
+        print(f"{YELLOW}⚠ Also used by: {', '.join(others[:5])}{' ...' if len(others) > 5 else ''}{RESET}")
+
+def commit_vms(items):
+    """Persist a batch of added or edited VMs with a single write, returns True when saved"""
+    items = list(items)
+    for vm_name, vm_info in items:
+        reindex(vm_name, vm_info)
+    return backend.commit_batch(items)
+
+# Bulk edits and undo journal
+UNDO_JOURNAL_FILE = "vms_undo.json"
+UNDO_DEPTH = 20           # Bulk edits that can be rolled back, newest last
+BULK_PREVIEW_LINES = 20   # Changed VMs listed before asking to apply a bulk edit
+
+def bulk_plan(vm_names, edit):
+    """Run edit(vm_info) on copies of the given VMs, returns ({vm_name: edited copy}, errors)
+
+    Only VMs the edit actually changed are returned. edit raises
+    ValueError for a VM it cannot handle; those end up in errors as
+    'name: message' and should reject the batch as a whole.
+    """
+    changes, errors = {}, []
+    for vm_name in vm_names:
+        current = vms.get(vm_name)
+        if current is None:
+            continue  # Deleted on disk meanwhile
+        updated = current.copy()
+        try:
+            edit(updated)
+        except ValueError as e:
+            errors.append(f"{vm_name}: {e}")
+            continue
+        if updated != current:
+            changes[vm_name] = updated
+    return changes, errors
+
+def bulk_diff(vm_name, before, after):
+    """One preview line per VM: 'name: field old → new, ...' or 'name: delete'"""
+    if after is None:
+        return f"{RED}- {vm_name}{RESET}"
+    if before is None:
+        return f"{GREEN}+ {vm_name}{RESET}"
+    old, new = before.to_dict(), after.to_dict()
+    parts = []
+    for field in dict.fromkeys(itertools.chain(old, new)):
+        if old.get(field) != new.get(field):
+            parts.append(f"{field} {GRAY}{old.get(field, '-')}{RESET} → {WHITE}{new.get(field, '-')}{RESET}")
+    return f"{YELLOW}~ {vm_name}{RESET}: " + ", ".join(parts)
+
+def apply_batch(label, changes, journal=True):
+    """Apply {vm_name: VM, or None to delete} in memory and persist it with one write
+
+    The replaced records go to the undo journal once the write succeeded;
+    when it fails the in-memory inventory is rolled back too, so memory
+    and disk never disagree about a half-applied batch. Returns True when
+    saved.
+    """
+    from .forwards import forward_manager
+    from .resolver import resolver
+    before = {vm_name: vms.get(vm_name) for vm_name in changes}
+
+    def put(records):
+        for vm_name, vm_info in records.items():
+            if vm_info is None:
+                vms.pop(vm_name, None)
+            else:
+                vms[vm_name] = vm_info
+
+    put(changes)
+    if not commit_vms(changes.items()):
+        put(before)
+        for vm_name, vm_info in before.items():
+            reindex(vm_name, vm_info)
+        return False
+    if journal:
+        undo_journal.record(label, before, changes)
+    for vm_name, vm_info in changes.items():
+        if vm_info is None:
+            forward_manager.stop_all(vm_name)
+    resolver.request(vm_info.ip for vm_info in changes.values() if vm_info is not None)
+    return True
+
+class UndoJournal:
+    """The last UNDO_DEPTH bulk edits with the records they replaced
+
+    Each batch stores every touched VM as it was before and after the edit
+    (None for a VM that did not exist), in UNDO_JOURNAL_FILE so an undo
+    still works after a restart. The file is read on first use.
+    """
+
+    def __init__(self, path=UNDO_JOURNAL_FILE, depth=UNDO_DEPTH):
+        self.path = path
+        self.depth = depth
+        self.batches = None
+
+    def entries(self):
+        """Journaled batches, oldest first"""
+        import json
+        if self.batches is None:
+            try:
+                with open(self.path, encoding="utf-8") as f:
+                    batches = json.load(f).get("batches")
+            except (OSError, ValueError, AttributeError):
+                batches = None
+            self.batches = [
+                batch for batch in batches
+                if isinstance(batch, dict) and isinstance(batch.get("before"), dict) and isinstance(batch.get("after"), dict)
+            ] if isinstance(batches, list) else []
+        return self.batches
+
+    def last(self):
+        batches = self.entries()
+        return batches[-1] if batches else None
+
+    def save(self):
+        import json
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"batches": self.batches}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            return True
+        except OSError as e:
+            print(f"{YELLOW}⚠ Cannot write the undo journal {self.path}: {e}{RESET}")
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    def record(self, label, before, after):
+        def encode(vm_info):
+            return None if vm_info is None else vm_info.to_dict()
+        self.entries().append({
+            "label": label,
+            "at": time.time(),
+            "before": {vm_name: encode(vm_info) for vm_name, vm_info in before.items()},
+            "after": {vm_name: encode(vm_info) for vm_name, vm_info in after.items()},
+        })
+        del self.batches[:-self.depth]
+        self.save()
+
+    def undo(self):
+        """Roll back the newest batch as one batch of its own
+
+        VMs changed again since that batch are left as they are. Returns
+        (batch, restored VM names, skipped VM names); batch is None when
+        there is nothing to undo and restored is None when saving failed.
+        """
+        batch = self.last()
+        if batch is None:
+            return None, [], []
+        changes, skipped = {}, []
+        for vm_name, written in batch["after"].items():
+            expected = None if written is None else VM.from_dict(vm_name, written)
+            if vms.get(vm_name) != expected:
+                skipped.append(vm_name)
+                continue
+            previous = batch["before"].get(vm_name)
+            changes[vm_name] = None if previous is None else VM.from_dict(vm_name, previous)
+        if changes and not apply_batch(f"undo {batch['label']}", changes, journal=False):
+            return batch, None, skipped
+        self.batches.pop()
+        self.save()
+        return batch, list(changes), skipped
+
+    def summary(self):
+        batch = self.last()
+        if batch is None:
+            return f"{GRAY}(nothing to undo){RESET}"
+        return f"{GRAY}({batch['label']}, {len(batch['after'])} VM(s)){RESET}"
+
+undo_journal = UndoJournal()
+
+def inventory_refresh(options, vm_names, offset):
+    """Build an arrow_menu refresh callback that follows hot reloads of vms.json
+
+    Rows of VMs edited on disk are repainted in place; when VMs were added
+    or removed the callback returns True so the menu gets rebuilt.
+    """
+    seen_version = config_watcher.version
+    positions = {vm_name: i + offset for i, vm_name in enumerate(vm_names)}
+
+    def refresh():
+        nonlocal seen_version
+        if config_watcher.version == seen_version:
+            return False
+        changed, structural = config_watcher.changes_since(seen_version)
+        seen_version = config_watcher.version
+        if structural:
+            return True
+        options.invalidate(positions[vm_name] for vm_name in changed if vm_name in positions)
+        return False
+
+    return refresh
+
+MAIN_BANNER = [
+    f"{BORDER}╔══════════════════════════════════════════════╗{RESET}",
+    f"{BORDER}║{CYAN}              SSH MANAGER v2.1              {BORDER}║{RESET}",
+    f"{BORDER}╠══════════════════════════════════════════════╣{RESET}",
+    f"{BORDER}║{GRAY}         Professional Terminal Access        {BORDER}║{RESET}",
+    f"{BORDER}╚══════════════════════════════════════════════╝{RESET}",
+    "",
+]
+
+def vm_label(vm_name):
+    from .resolver import resolution_note
+    vm_info = vms[vm_name]
+    return f"{reachability_marker(vm_info)} {vm_info.line()}{resolution_note(vm_info.ip)}"
+
+async def ssh_menu():
+    from .forwards import forward_manager
+    from .resolver import resolver
+    while True:
+        # Create menu options (VM labels are formatted lazily as they scroll into view)
+        start = time.perf_counter()
+        vm_names = history.order(vms.keys())
+        metrics.observe("build_options", (time.perf_counter() - start) * 1000)
+        options = LazyOptions(vm_names, vm_label, head=["Exit"], tail=["Browse groups", "Run command on VMs", "Transfer files", "Admin Menu"])
+
+        # Resolve host names and probe every VM in the background, labels pick up results as they arrive
+        resolver.refresh(vm_info.ip for vm_info in vms.values())
+        reachability.refresh(vm_target(vm_info) for vm_info in vms.values())
+        seen_version = reachability.version
+        resolve_version = resolver.version
+        follow_reloads = inventory_refresh(options, vm_names, 1)
+        reload_version = config_watcher.version
+
+        def refresh_status():
+            nonlocal seen_version, resolve_version, reload_version
+            if follow_reloads():
+                return True
+            if config_watcher.version != reload_version:
+                # Edited addresses need resolving and probing before their markers mean anything
+                reload_version = config_watcher.version
+                resolver.refresh(vm_info.ip for vm_info in vms.values())
+                reachability.refresh(vm_target(vm_info) for vm_info in vms.values())
+            resolver.tick()
+            reachability.tick()
+            if resolver.version != resolve_version:
+                resolve_version = resolver.version
+                options.invalidate()
+                if not resolver.pending:
+                    # Resolved names are probed at their new address
+                    reachability.refresh(vm_target(vm_info) for vm_info in vms.values())
+            if reachability.version != seen_version:
+                seen_version = reachability.version
+                options.invalidate()
+
+        # Show menu with arrow navigation
+        selection = await arrow_menu(options, "Select an option:", header=MAIN_BANNER,
+                               search=vm_search(vm_names, 1), refresh=refresh_status)
+        
+        if selection == -1 or selection == MENU_RELOAD:  # ESC/Left arrow, or VMs added/removed on disk
+            continue
+        elif selection == 0:  # Exit
+            backend.close()
+            clear_screen()
+            print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+            print(f"{BLUE}║{WHITE}              GOODBYE!                       {BLUE}║{RESET}")
+            print(f"{BLUE}║{GRAY}         Thanks for using SSH Manager        {BLUE}║{RESET}")
+            print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}")
+            print(f"\n{CYAN}Configuration saved. Session terminated.{RESET}")
+            if config_writer.flushes:
+                print(f"{GRAY}{config_writer.flushes} write(s), last took {config_writer.last_flush_ms:.1f} ms{RESET}")
+            if forward_manager.running():
+                print(f"{CYAN}ℹ {len(forward_manager.running())} port forward(s) keep running in the background; "
+                      f"they are supervised again next time the menu runs{RESET}")
+            if os.environ.get("SSH_MENU_TIMING"):
+                print(menu_loop.latency_report())
+            sys.exit(0)
+        elif selection == len(options) - 4:  # Browse groups
+            await group_menu()
+        elif selection == len(options) - 3:  # Run command on VMs
+            from .fanout import fanout_menu
+            await fanout_menu()
+        elif selection == len(options) - 2:  # Transfer files
+            from .transfer import transfer_menu
+            await transfer_menu()
+        elif selection == len(options) - 1:  # Admin Menu
+            await admin_menu()
+        elif 1 <= selection <= len(vm_names):  # VM selected
+            await open_vm(vm_names[selection - 1])
+
+async def open_vm(vm_name):
+    """Connect straight away when the VM has a single user, otherwise open its user menu"""
+    vm_info = vms[vm_name]
+    
+    # Quick connect feature: if VM has only one user, connect directly
+    if len(vm_info.users) == 1:
+        username = vm_info.users[0]
+        color = vm_info.color_code
+        clear_screen()
+        print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+        print(f"{BLUE}║{WHITE}              QUICK CONNECT                  {BLUE}║{RESET}")
+        print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+        
+        print(f"{CYAN}Target:{RESET} {color}{vm_name}{RESET} ({WHITE}{vm_info.ip}{RESET})")
+        print(f"{CYAN}User:{RESET} {YELLOW}{username}{RESET}")
+        print(f"{CYAN}Status:{RESET} {reachability_status(vm_info)}\n")
+        
+        print(f"{CYAN}┌─ Quick Actions ──────────────────────────────────┐{RESET}")
+        print(f"{CYAN}│{WHITE} Enter/→{GRAY} Connect Now   {WHITE}Any Key{GRAY} Open User Menu     {CYAN}│{RESET}")
+        print(f"{CYAN}└──────────────────────────────────────────────────┘{RESET}")
+        
+        key = None
+        while key is None:  # Background results wake the loop, only a key press answers
+            key = await menu_loop.next_key()
+        if key == 'ENTER' or key == 'RIGHT':
+            clear_screen()
+            print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+            print(f"{BLUE}║{WHITE}              SSH CONNECTION                 {BLUE}║{RESET}")
+            print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+            
+            print(f"{CYAN}➤ Target:{RESET} {color}{vm_name}{RESET} ({WHITE}{vm_info.ip}{RESET})")
+            print(f"{CYAN}➤ User:{RESET} {YELLOW}{username}{RESET}")
+            print(f"{CYAN}➤ Status:{RESET} {GREEN}Launching SSH session...{RESET}\n")
+            
+            print(launch_report(await launch_session(vm_name, username, vm_info)))
+            await ainput(f"{GRAY}Press Enter to return to menu...{RESET}")
+        else:
+            await connect_user_menu(vm_name)
+    else:
+        await connect_user_menu(vm_name)
+
+def group_label(item):
+    is_group, key = item
+    if is_group:
+        return f"{YELLOW}▸ {key.rpartition('/')[2]}{RESET} {GRAY}({tag_index.count(key)}){RESET}"
+    return vm_label(key)
+
+async def group_menu(path=""):
+    """Browse VMs by tag, expanding one level of the group tree at a time"""
+    initial = 0
+    while True:
+        # Only this level's child groups and directly tagged VMs are listed
+        groups = tag_index.groups(path)
+        vm_names = history.order(tag_index.vms_at(path))
+        items = [(True, group) for group in groups] + [(False, vm_name) for vm_name in vm_names]
+        options = LazyOptions(items, group_label, head=["Back"])
+
+        reachability.refresh(vm_target(vms[vm_name]) for vm_name in vm_names)
+        seen_version = reachability.version
+        reload_version = config_watcher.version
+
+        def refresh_status():
+            nonlocal seen_version
+            if config_watcher.version != reload_version:
+                return True  # Tags may have moved VMs between groups, rebuild this level
+            reachability.tick()
+            if reachability.version != seen_version:
+                seen_version = reachability.version
+                options.invalidate()
+
+        title = f"{YELLOW}=== GROUPS{': ' + path if path else ''} ==={RESET}  {GRAY}{tag_index.count(path) if path else len(vms)} VMs{RESET}"
+        selection = await arrow_menu(options, title, search=vm_search(vm_names, 1 + len(groups)),
+                               refresh=refresh_status, initial=initial)
+
+        if selection == MENU_RELOAD:
+            if path and path not in tag_index:
+                return
+            continue
+        elif selection == -1 or selection == 0:  # ESC/Left arrow or Back
+            return
+        initial = selection
+        is_group, key = items[selection - 1]
+        if is_group:
+            await group_menu(key)
+        else:
+            await open_vm(key)
+        if path and path not in tag_index:
+            return
+
+def username_problem(user):
+    """Why a new user name is rejected, None when it is fine"""
+    if len(user) < 2:
+        return "Username must be at least 2 characters long!"
+    if any(char in user for char in [' ', '@', '#', '$', '%', '^', '&', '*']):
+        return "Username contains invalid characters! Use only letters, numbers, underscore, and hyphen"
+    return None
+
+async def connect_user_menu(vm_name):
+    """User submenu for connection and user management"""
+    from .forwards import forward_manager
+    from .resolver import resolution_note
+    # Rebuild the menu when this VM is edited on disk while it is shown
+    def follow_reloads():
+        return vm_name in config_watcher.changes_since(seen_version)[0]
+
+    while True:
+        vm_info = vms.get(vm_name)
+        if vm_info is None:
+            return  # Deleted on disk meanwhile
+        ip = vm_info.ip
+        color = vm_info.color_code
+        seen_version = config_watcher.version
+
+        # Create menu options
+        options = ["Back"]
+        
+        for user, line in zip(vm_info.users, vm_info.user_lines()):
+            if connection_pool.has_socket(user, ip, vm_info.port):
+                options.append(f"{line} {GREEN}⚡ pooled{RESET}")
+            else:
+                options.append(line)
+        
+        options.append("Add new user")
+        options.append("Remove user")
+        running = sum(1 for forward in forward_manager.for_vm(vm_name) if forward.state != "stopped")
+        options.append(f"Port forwards {GRAY}({running}/{len(vm_info.forwards)} running){RESET}")
+
+        # Start on the user most often (and most recently) used for this VM
+        preferred = history.preferred_user(vm_name, vm_info.users)
+        initial = vm_info.users.index(preferred) + 1 if preferred else 0
+        
+        # Show menu with arrow navigation
+        selection = await arrow_menu(options, f"{color}=== Users for {vm_name} ({ip}) ==={RESET}{resolution_note(ip)}",
+                               initial=initial, refresh=follow_reloads)
+        
+        if selection == MENU_RELOAD:
+            continue
+        elif selection == -1 or selection == 0:  # ESC/Left arrow or Back
+            return
+        elif 1 <= selection <= len(vm_info.users):  # Connect as user
+            username = vm_info.users[selection - 1]
+            clear_screen()
+            print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+            print(f"{BLUE}║{WHITE}              SSH CONNECTION                 {BLUE}║{RESET}")
+            print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+            
+            print(f"{CYAN}➤ Target:{RESET} {color}{vm_name}{RESET} ({WHITE}{ip}{RESET})")
+            print(f"{CYAN}➤ User:{RESET} {YELLOW}{username}{RESET}")
+            print(f"{CYAN}➤ Status:{RESET} {GREEN}Launching SSH session...{RESET}\n")
+            
+            print(launch_report(await launch_session(vm_name, username, vm_info)))
+            await ainput(f"{GRAY}Press Enter to return to menu...{RESET}")
+        elif selection == len(vm_info.users) + 1:  # Add new user
+            clear_screen()
+            print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+            print(f"{BLUE}║{WHITE}              ADD USER                       {BLUE}║{RESET}")
+            print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+            
+            print(f"{CYAN}Target VM:{RESET} {color}{vm_name}{RESET}")
+            print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+            
+            while True:
+                new_user = (await ainput(f"{CYAN}Username: {WHITE}")).strip()
+                print(f"{RESET}", end="")
+                
+                if new_user.lower() in ['cancel', 'exit', 'quit']:
+                    print(f"\n{YELLOW}ℹ User creation cancelled.{RESET}")
+                    break
+                elif not new_user:
+                    print(f"{RED}✗ Username cannot be empty!{RESET}")
+                    continue
+                elif new_user in vm_info.users:
+                    print(f"{RED}✗ User '{new_user}' already exists!{RESET}")
+                    continue
+                elif username_problem(new_user):
+                    print(f"{RED}✗ {username_problem(new_user)}{RESET}")
+                    continue
+                else:
+                    vm_info.add_user(new_user)
+                    commit_vm(vm_name)
+                    print(f"\n{GREEN}✓ User {YELLOW}{new_user}{GREEN} added successfully!{RESET}")
+                    break
+            
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        elif selection == len(vm_info.users) + 2:  # Remove user
+            if not vm_info.users:
+                clear_screen()
+                print(f"{RED}╔══════════════════════════════════════════════╗{RESET}")
+                print(f"{RED}║{WHITE}              NO USERS                       {RED}║{RESET}")
+                print(f"{RED}╚══════════════════════════════════════════════╝{RESET}\n")
+                
+                print(f"{CYAN}VM:{RESET} {color}{vm_name}{RESET}")
+                print(f"{RED}✗ No users available to remove.{RESET}")
+                print(f"{CYAN}ℹ Add users first before attempting to remove them.{RESET}")
+                
+                await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            else:
+                # Create submenu for user removal
+                remove_options = ["Cancel"]
+                for user in vm_info.users:
+                    remove_options.append(f"Remove {user}")
+                
+                remove_selection = await arrow_menu(remove_options, f"{RED}=== Remove User from {vm_name} ==={RESET}",
+                                              refresh=follow_reloads)
+                
+                if remove_selection > 0:  # User selected for removal
+                    user_to_remove = vm_info.users[remove_selection - 1]
+                    clear_screen()
+                    print(f"{RED}╔══════════════════════════════════════════════╗{RESET}")
+                    print(f"{RED}║{WHITE}              REMOVE USER                    {RED}║{RESET}")
+                    print(f"{RED}╚══════════════════════════════════════════════╝{RESET}\n")
+                    
+                    print(f"{CYAN}VM:{RESET} {color}{vm_name}{RESET}")
+                    print(f"{CYAN}User to Remove:{RESET} {YELLOW}{user_to_remove}{RESET}\n")
+                    print(f"{RED}⚠ This will remove the user from this VM.{RESET}\n")
+                    
+                    confirm = await ainput(f"{CYAN}Type 'yes' to confirm removal: {WHITE}")
+                    print(f"{RESET}", end="")
+                    
+                    if confirm.lower() == "yes":
+                        vm_info.remove_user(user_to_remove)
+                        commit_vm(vm_name)
+                        print(f"\n{GREEN}✓ User {user_to_remove} removed successfully!{RESET}")
+                    else:
+                        print(f"\n{YELLOW}ℹ Removal cancelled.{RESET}")
+                    
+                    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        elif selection == len(vm_info.users) + 3:  # Port forwards
+            from .forwards import forwards_menu
+            await forwards_menu(vm_name)
+
+async def admin_menu():
+    """VM administration menu"""
+    while True:
+        # Create menu options
+        vm_names = list(vms.keys())
+        options = LazyOptions(vm_names, lambda vm_name: f"Edit {vm_name}",
+                              head=["Back"], tail=["Add new VM", "Import VMs", "Delete VM", "Bulk edit VMs",
+                                                   f"Undo last bulk edit {undo_journal.summary()}",
+                                                   "Connection Pool", "Port Forwards", "Session transcripts"])
+        
+        # Show menu with arrow navigation
+        selection = await arrow_menu(options, f"{YELLOW}=== ADMIN MENU ==={RESET}  {backend.summary()} {config_watcher.summary()}",
+                               search=vm_search(vm_names, 1), refresh=inventory_refresh(options, vm_names, 1))
+        
+        if selection == MENU_RELOAD:  # VMs added/removed on disk
+            continue
+        elif selection == -1 or selection == 0:  # ESC/Left arrow or Back
+            return
+        elif selection == len(options) - 8:  # Add new VM
+            await add_vm()
+        elif selection == len(options) - 7:  # Import VMs
+            from .importers import import_menu
+            await import_menu()
+        elif selection == len(options) - 6:  # Delete VM
+            await delete_vm()
+        elif selection == len(options) - 5:  # Bulk edit VMs
+            await bulk_menu()
+        elif selection == len(options) - 4:  # Undo last bulk edit
+            await undo_menu()
+        elif selection == len(options) - 3:  # Connection Pool
+            await pool_menu()
+        elif selection == len(options) - 2:  # Port Forwards
+            from .forwards import forward_status_menu
+            await forward_status_menu()
+        elif selection == len(options) - 1:  # Session transcripts
+            from .transcripts import transcripts_menu
+            await transcripts_menu()
+        elif 1 <= selection <= len(vm_names):  # Edit VM
+            vm_name = vm_names[selection - 1]
+            await edit_vm(vm_name)
+
+BULK_ACTIONS = ["Add user", "Remove user", "Set color", "Add tag", "Remove tag", "Change address by pattern", "Delete VMs"]
+
+async def bulk_menu():
+    """Pick many VMs and apply one change to all of them as a single, undoable batch"""
+    vm_names = list(vms.keys())
+    options = LazyOptions(vm_names, vm_label)
+    picked = await arrow_menu(options, f"{YELLOW}=== BULK EDIT: select VMs ==={RESET}",
+                        search=vm_search(vm_names, 0), multi=True)
+    if picked == -1 or not vm_names:
+        return
+    selected = [vm_names[i] for i in picked]
+    action = await arrow_menu(["Cancel"] + BULK_ACTIONS, f"{YELLOW}=== BULK EDIT: {len(selected)} VM(s) ==={RESET}")
+    if action <= 0:
+        return
+    action = BULK_ACTIONS[action - 1]
+
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              BULK EDIT                      {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    print(f"{CYAN}Targets:{RESET} {WHITE}{len(selected)} VM(s){RESET} {GRAY}({', '.join(selected[:5])}{', ...' if len(selected) > 5 else ''}){RESET}")
+    print(f"{CYAN}Action:{RESET} {WHITE}{action}{RESET}")
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+
+    request = await bulk_request(action, selected)
+    if request is None:
+        print(f"\n{YELLOW}ℹ Bulk edit cancelled.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    label, edit = request
+    if edit is None:
+        changes, errors = {vm_name: None for vm_name in selected if vm_name in vms}, []
+    else:
+        changes, errors = bulk_plan(selected, edit)
+
+    if errors:
+        print(f"\n{RED}✗ Nothing was changed, {len(errors)} VM(s) cannot take this edit:{RESET}")
+        for line in errors[:BULK_PREVIEW_LINES]:
+            print(f"  {RED}{line}{RESET}")
+        if len(errors) > BULK_PREVIEW_LINES:
+            print(f"  {GRAY}... and {len(errors) - BULK_PREVIEW_LINES} more{RESET}")
+    elif not changes:
+        print(f"\n{YELLOW}ℹ The selected VMs already look like that, nothing to change.{RESET}")
+    else:
+        print(f"\n{CYAN}{label}: {len(changes)} VM(s) change{RESET}\n")
+        for vm_name, vm_info in itertools.islice(changes.items(), BULK_PREVIEW_LINES):
+            print(f"  {bulk_diff(vm_name, vms.get(vm_name), vm_info)}")
+        if len(changes) > BULK_PREVIEW_LINES:
+            print(f"  {GRAY}... and {len(changes) - BULK_PREVIEW_LINES} more{RESET}")
+        if edit is None:
+            confirm = (await ainput(f"\n{RED}Type 'yes' to delete {len(changes)} VM(s): {WHITE}")).strip().lower()
+            approved = confirm == "yes"
+        else:
+            confirm = (await ainput(f"\n{CYAN}Apply to {len(changes)} VM(s)? (y/n): {WHITE}")).strip().lower()
+            approved = confirm in ['y', 'yes']
+        print(f"{RESET}", end="")
+        if not approved:
+            print(f"\n{YELLOW}ℹ Bulk edit cancelled.{RESET}")
+        else:
+            start = time.perf_counter()
+            if apply_batch(label, changes):
+                print(f"\n{GREEN}✓ {label}: {len(changes)} VM(s) updated in one write "
+                      f"({(time.perf_counter() - start) * 1000:.0f} ms){RESET}")
+                print(f"{GRAY}ℹ 'Undo last bulk edit' in the admin menu rolls it back.{RESET}")
+            else:
+                print(f"\n{RED}✗ Nothing was changed, the batch could not be saved.{RESET}")
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def bulk_request(action, selected):
+    """Ask for what the bulk action needs, returns (label, edit) or None when cancelled
+
+    edit is applied to a copy of every selected VM; it is None for deletion.
+    """
+    def cancelled(answer):
+        return not answer or answer.lower() in ['cancel', 'exit', 'quit']
+
+    if action == "Add user":
+        while True:
+            user = (await ainput(f"{CYAN}Username to add: {WHITE}")).strip()
+            print(f"{RESET}", end="")
+            if cancelled(user):
+                return None
+            problem = username_problem(user)
+            if problem is None:
+                break
+            print(f"{RED}✗ {problem}{RESET}")
+
+        def edit(vm_info):
+            if user not in vm_info.users:
+                vm_info.add_user(user)
+        return f"add user {user}", edit
+
+    if action in ("Remove user", "Remove tag"):
+        field = "users" if action == "Remove user" else "tags"
+        counts = collections.Counter(value for vm_name in selected if vm_name in vms
+                                     for value in getattr(vms[vm_name], field))
+        if not counts:
+            print(f"{YELLOW}ℹ None of the selected VMs has any {field}.{RESET}")
+            return None
+        values = [value for value, _ in counts.most_common()]
+        choice = await arrow_menu(["Cancel"] + [f"{value} {GRAY}({counts[value]} VM(s)){RESET}" for value in values],
+                                  f"{YELLOW}=== {action} ==={RESET}")
+        if choice <= 0:
+            return None
+        value = values[choice - 1]
+        if field == "users":
+            return f"remove user {value}", lambda vm_info: vm_info.remove_user(value)
+        return f"remove tag {value}", lambda vm_info: vm_info.set_tags(tag for tag in vm_info.tags if tag != value)
+
+    if action == "Set color":
+        colors = list(COLORS)
+        choice = await arrow_menu(["Cancel"] + [f"{COLORS[color]}{color}{RESET}" for color in colors],
+                                  f"{YELLOW}=== {action} ==={RESET}")
+        if choice <= 0:
+            return None
+        color = colors[choice - 1]
+        return f"set color {color}", lambda vm_info: vm_info.set_color(color)
+
+    if action == "Add tag":
+        tag = normalize_tag((await ainput(f"{CYAN}Tag to add (e.g. prod or region/eu-west): {WHITE}")).strip())
+        print(f"{RESET}", end="")
+        if cancelled(tag):
+            return None
+        return f"add tag {tag}", lambda vm_info: vm_info.set_tags(vm_info.tags + (tag,))
+
+    if action == "Change address by pattern":
+        import re
+        print(f"{GRAY}ℹ A regular expression replaced in each address, e.g. ^10\\.0\\.1\\. → 10.2.1.{RESET}")
+        while True:
+            pattern = (await ainput(f"{CYAN}Find (regex): {WHITE}")).strip()
+            print(f"{RESET}", end="")
+            if cancelled(pattern):
+                return None
+            try:
+                compiled = re.compile(pattern)
+                break
+            except re.error as e:
+                print(f"{RED}✗ Invalid pattern: {e}{RESET}")
+        replacement = (await ainput(f"{CYAN}Replace with (\\1 refers to groups): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        from .resolver import normalize_host
+
+        def edit(vm_info):
+            try:
+                address = compiled.sub(replacement, vm_info.ip, count=1)
+            except (re.error, IndexError) as e:
+                raise ValueError(f"bad replacement: {e}")
+            if address != vm_info.ip:
+                vm_info.set_ip(normalize_host(address))
+        return f"re-address {pattern} → {replacement}", edit
+
+    return "delete", None   # Delete VMs
+
+async def undo_menu():
+    """Roll back the last bulk edit"""
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              UNDO BULK EDIT                 {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    batch, restored, skipped = undo_journal.undo()
+    if batch is None:
+        print(f"{YELLOW}ℹ There is no bulk edit to undo.{RESET}")
+    elif restored is None:
+        print(f"{RED}✗ Undo of '{batch['label']}' could not be saved, nothing was changed.{RESET}")
+    else:
+        print(f"{GREEN}✓ Undid '{batch['label']}': {len(restored)} VM(s) restored{RESET}")
+        if skipped:
+            print(f"{YELLOW}⚠ Left alone, changed again since: {', '.join(skipped[:5])}"
+                  f"{' ...' if len(skipped) > 5 else ''}{RESET}")
+        if undo_journal.last() is not None:
+            print(f"{GRAY}ℹ Next undo: {undo_journal.last()['label']}{RESET}")
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def pool_menu():
+    """Show pooled SSH masters and close them"""
+    if not multiplexing_supported():
+        clear_screen()
+        print(f"{YELLOW}ℹ Connection pooling needs OpenSSH ControlMaster, which is not available on Windows.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+
+    while True:
+        masters = connection_pool.live_masters()
+        options = ["Back"]
+        for path, (username, ip, port), alive in masters:
+            state = f"{GREEN}● live{RESET}" if alive else f"{GRAY}○ closed{RESET}"
+            options.append(f"Close {username}@{ip}:{port}  {state}")
+        options.append("Close all masters")
+        options.append("Pre-warm recent hosts")
+
+        live = sum(1 for _, _, alive in masters if alive)
+        selection = await arrow_menu(options, f"{YELLOW}=== CONNECTION POOL ({live} live) ==={RESET}")
+
+        if selection == -1 or selection == 0:
+            return
+        elif selection == len(options) - 2:  # Close all
+            await menu_loop.run_blocking(connection_pool.close_all)
+        elif selection == len(options) - 1:  # Pre-warm
+            started = connection_pool.prewarm()
+            clear_screen()
+            print(f"{CYAN}ℹ Started {started} background master(s) for recently used hosts.{RESET}")
+            print(f"{GRAY}Hosts that need a password are skipped (pre-warming runs in batch mode).{RESET}")
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        else:
+            connection_pool.close(masters[selection - 1][0])
+
+async def edit_vm(vm_name):
+    """Edit VM IP address, tags and SSH options"""
+    from .resolver import normalize_host, resolution_note, resolver
+    vm_info = vms[vm_name]
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              EDIT VM                        {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    
+    color = vm_info.color_code
+    print(f"{CYAN}VM Name:{RESET} {color}{vm_name}{RESET}")
+    print(f"{CYAN}Current address:{RESET} {WHITE}{vm_info.ip}{RESET}{resolution_note(vm_info.ip)}")
+    print(f"{CYAN}Users:{RESET} {YELLOW}{', '.join(vm_info.users) if vm_info.users else 'None'}{RESET}")
+    print(f"{CYAN}Tags:{RESET} {YELLOW}{', '.join(vm_info.tags) if vm_info.tags else 'None'}{RESET}\n")
+    
+    while True:
+        new_ip = (await ainput(f"{CYAN}New address, IP or host name (leave blank to keep current): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        
+        if not new_ip:  # Keep current IP
+            print(f"{YELLOW}ℹ Address unchanged.{RESET}")
+            break
+        try:
+            new_ip = normalize_host(new_ip)
+        except ValueError as e:
+            print(f"{RED}✗ {e}{RESET}")
+            print(f"{GRAY}Try again or leave blank to cancel...{RESET}")
+            continue
+        old_ip = vm_info.ip
+        vm_info.set_ip(new_ip)
+        commit_vm(vm_name)
+        resolver.request([new_ip])  # Resolved in the background, the menu shows it once known
+        print(f"\n{GREEN}✓ Address updated successfully!{RESET}")
+        print(f"{CYAN}Old address:{RESET} {GRAY}{old_ip}{RESET}")
+        print(f"{CYAN}New address:{RESET} {WHITE}{new_ip}{RESET}")
+        warn_shared_ip(new_ip, vm_name)
+        break
+    
+    new_tags = (await ainput(f"\n{CYAN}Tags, comma separated (e.g. prod, region/eu-west; blank keeps, '-' clears): {WHITE}")).strip()
+    print(f"{RESET}", end="")
+    if new_tags:
+        vm_info.set_tags([] if new_tags == "-" else new_tags.split(","))
+        commit_vm(vm_name)
+        print(f"{GREEN}✓ Tags updated:{RESET} {YELLOW}{', '.join(vm_info.tags) if vm_info.tags else 'None'}{RESET}")
+    
+    # SSH options, passed to ssh as separate arguments for every session with this VM
+    print(f"\n{CYAN}SSH Options:{RESET} {GRAY}port {vm_info.port}, identity {vm_info.identity_file or 'default'}, "
+          f"extra args {' '.join(vm_info.ssh_args) or 'none'}{RESET}")
+    while True:
+        new_port = (await ainput(f"{CYAN}Port (blank keeps {vm_info.port}): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not new_port:
+            break
+        if new_port.isdigit() and 1 <= int(new_port) <= 65535:
+            vm_info.port = int(new_port)
+            commit_vm(vm_name)
+            print(f"{GREEN}✓ Port set to {new_port}{RESET}")
+            break
+        print(f"{RED}✗ Port must be a number from 1 to 65535!{RESET}")
+    
+    identity = (await ainput(f"{CYAN}Identity file (blank keeps, '-' uses the default key): {WHITE}")).strip()
+    print(f"{RESET}", end="")
+    if identity:
+        vm_info.identity_file = None if identity == "-" else identity
+        commit_vm(vm_name)
+        print(f"{GREEN}✓ Identity file: {vm_info.identity_file or 'default'}{RESET}")
+        if vm_info.identity_file and not os.path.exists(os.path.expanduser(vm_info.identity_file)):
+            print(f"{YELLOW}⚠ {vm_info.identity_file} does not exist (yet){RESET}")
+    
+    while True:
+        extra_args = (await ainput(f"{CYAN}Extra ssh args, e.g. -o ServerAliveInterval=30 (blank keeps, '-' clears): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not extra_args:
+            break
+        try:
+            vm_info.ssh_args = () if extra_args == "-" else tuple(split_ssh_args(extra_args))
+        except ValueError as e:
+            print(f"{RED}✗ Cannot parse arguments: {e}{RESET}")
+            continue
+        commit_vm(vm_name)
+        print(f"{GREEN}✓ Extra ssh args: {' '.join(vm_info.ssh_args) or 'none'}{RESET}")
+        break
+    
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def add_vm():
+    from .resolver import normalize_host, resolver
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              ADD NEW VM                     {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' at any time to abort{RESET}\n")
+    
+    # VM Name validation
+    while True:
+        name = (await ainput(f"{CYAN}VM Name: {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        
+        if name.lower() in ['cancel', 'exit', 'quit']:
+            print(f"\n{YELLOW}ℹ VM creation cancelled.{RESET}")
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            return
+        elif not name:
+            print(f"{RED}✗ VM name is required!{RESET}")
+            continue
+        elif name in vms:
+            print(f"{RED}✗ VM name '{name}' already exists!{RESET}")
+            continue
+        elif len(name) < 2:
+            print(f"{RED}✗ VM name must be at least 2 characters long!{RESET}")
+            continue
+        else:
+            print(f"{GREEN}✓ VM name accepted{RESET}")
+            break
+    
+    # IP Address validation
+    while True:
+        ip = (await ainput(f"{CYAN}VM address (IP or host name): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        
+        if ip.lower() in ['cancel', 'exit', 'quit']:
+            print(f"\n{YELLOW}ℹ VM creation cancelled.{RESET}")
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            return
+        elif not ip:
+            print(f"{RED}✗ Address is required!{RESET}")
+            continue
+        try:
+            ip = normalize_host(ip)
+        except ValueError as e:
+            print(f"{RED}✗ {e}{RESET}")
+            continue
+        resolver.request([ip])
+        print(f"{GREEN}✓ Address accepted{RESET}")
+        warn_shared_ip(ip)
+        break
+    
+    # Color selection
+    print(f"\n{CYAN}Available Colors:{RESET}")
+    color_options = ["RED", "GREEN", "CYAN", "YELLOW", "BLUE", "MAGENTA", "WHITE", "ORANGE", "PURPLE"]
+    for i, color in enumerate(color_options):
+        color_code = COLORS[color]
+        print(f"  {i+1}. {color_code}{color}{RESET}")
+    
+    while True:
+        color_choice = (await ainput(f"\n{CYAN}Choose color (1-9 or name, default: CYAN): {WHITE}")).strip().upper()
+        print(f"{RESET}", end="")
+        
+        if color_choice.lower() in ['cancel', 'exit', 'quit']:
+            print(f"\n{YELLOW}ℹ VM creation cancelled.{RESET}")
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            return
+        elif not color_choice:  # Default to CYAN
+            color = "CYAN"
+            print(f"{GREEN}✓ Using default color: {COLORS['CYAN']}CYAN{RESET}")
+            break
+        elif color_choice.isdigit() and 1 <= int(color_choice) <= len(color_options):
+            color = color_options[int(color_choice) - 1]
+            print(f"{GREEN}✓ Color selected: {COLORS[color]}{color}{RESET}")
+            break
+        elif color_choice in COLORS:
+            color = color_choice
+            print(f"{GREEN}✓ Color selected: {COLORS[color]}{color}{RESET}")
+            break
+        else:
+            print(f"{RED}✗ Invalid color! Choose 1-9 or valid color name{RESET}")
+    
+    # Tags (optional), '/' nests groups in the group menu
+    tags_text = (await ainput(f"\n{CYAN}Tags, comma separated (e.g. prod, region/eu-west; optional): {WHITE}")).strip()
+    print(f"{RESET}", end="")
+    if tags_text.lower() in ['cancel', 'exit', 'quit']:
+        print(f"\n{YELLOW}ℹ VM creation cancelled.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    tags = normalize_tags(tags_text.split(","))
+    
+    # Final confirmation
+    print(f"\n{CYAN}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{CYAN}║{WHITE}              REVIEW NEW VM                  {CYAN}║{RESET}")
+    print(f"{CYAN}╚══════════════════════════════════════════════╝{RESET}")
+    print(f"{CYAN}Name:{RESET} {COLORS[color]}{name}{RESET}")
+    print(f"{CYAN}IP:{RESET} {WHITE}{ip}{RESET}")
+    print(f"{CYAN}Color:{RESET} {COLORS[color]}{color}{RESET}")
+    print(f"{CYAN}Tags:{RESET} {YELLOW}{', '.join(tags) if tags else 'None'}{RESET}")
+    
+    while True:
+        confirm = (await ainput(f"\n{CYAN}Create this VM? (y/n/cancel): {WHITE}")).strip().lower()
+        print(f"{RESET}", end="")
+        
+        if confirm in ['cancel', 'exit', 'quit', 'n', 'no']:
+            print(f"\n{YELLOW}ℹ VM creation cancelled.{RESET}")
+            break
+        elif confirm in ['y', 'yes']:
+            vms[name] = VM(name, ip, color=color, tags=tags)
+            commit_vm(name)
+            print(f"\n{GREEN}✓ VM {COLORS[color]}{name}{GREEN} created successfully!{RESET}")
+            break
+        else:
+            print(f"{RED}✗ Please enter 'y' to create, 'n' to cancel, or 'cancel' to abort{RESET}")
+    
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def delete_vm():
+    if not vms:
+        clear_screen()
+        print(f"{RED}No VMs to delete.{RESET}")
+        await ainput("Press Enter to return...")
+        return
+    
+    # Create menu options
+    vm_names = list(vms.keys())
+    options = LazyOptions(vm_names, lambda vm_name: f"Delete {vm_name}", head=["Cancel"])
+    
+    # Show menu with arrow navigation
+    selection = await arrow_menu(options, f"{RED}=== DELETE VM ==={RESET}",
+                           refresh=inventory_refresh(options, vm_names, 1))
+    
+    if selection in (-1, 0, MENU_RELOAD):  # ESC/Left arrow, Cancel, or the list changed on disk
+        return
+    elif 1 <= selection <= len(vm_names):  # VM selected for deletion
+        vm_name = vm_names[selection - 1]
+        vm_info = vms[vm_name]
+        color = vm_info.color_code
+        
+        clear_screen()
+        print(f"{RED}╔══════════════════════════════════════════════╗{RESET}")
+        print(f"{RED}║{WHITE}              CONFIRM DELETION               {RED}║{RESET}")
+        print(f"{RED}╚══════════════════════════════════════════════╝{RESET}\n")
+        
+        print(f"{CYAN}VM to Delete:{RESET} {color}{vm_name}{RESET}")
+        print(f"{CYAN}IP Address:{RESET} {WHITE}{vm_info.ip}{RESET}")
+        print(f"{CYAN}Users:{RESET} {YELLOW}{', '.join(vm_info.users) if vm_info.users else 'None'}{RESET}\n")
+        
+        print(f"{RED}⚠ WARNING: This action cannot be undone!{RESET}\n")
+        
+        confirm = await ainput(f"{CYAN}Type 'yes' to confirm deletion: {WHITE}")
+        print(f"{RESET}", end="")
+        
+        if confirm.lower() == "yes":
+            vms.pop(vm_name, None)  # May already be gone if it was deleted on disk meanwhile
+            commit_vm(vm_name)
+            from .forwards import forward_manager
+            forward_manager.stop_all(vm_name)
+            print(f"\n{GREEN}✓ VM {vm_name} deleted successfully!{RESET}")
+        else:
+            print(f"\n{YELLOW}ℹ Deletion cancelled.{RESET}")
+        
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+# Non-interactive command line
+# Defaults and choices the parser shows in --help live here, so building it
+# imports none of the subsystem modules; each command loads its own when it runs.
+FANOUT_CONCURRENCY = 10
+FANOUT_TIMEOUT = 60.0
+TRANSFER_CONCURRENCY = 20
+TRANSFER_RETRIES = 2          # Extra attempts after a connection failure
+IMPORT_FORMATS = ("ssh_config", "known_hosts", "csv", "ansible")
+
+def find_vm(query):
+    """Resolve a VM by exact name, then case-insensitive name, then unique prefix"""
+    if query in vms:
+        return query
+    folded = query.lower()
+    matches = [vm_name for vm_name in vms if vm_name.lower() == folded]
+    if not matches:
+        matches = [vm_name for vm_name in vms if vm_name.lower().startswith(folded)]
+    if len(matches) == 1:
+        return matches[0]
+    if matches:
+        raise LookupError(f"'{query}' is ambiguous: {', '.join(sorted(matches)[:10])}")
+    raise LookupError(f"No VM named '{query}'")
+
+def cli_connect(args):
+    vm_name = find_vm(args.vm)
+    vm_info = vms[vm_name]
+    username = args.user
+    if username is None:
+        if len(vm_info.users) != 1:
+            users = ", ".join(vm_info.users) or "none configured"
+            raise LookupError(f"Specify a user for '{vm_name}' ({users})")
+        username = vm_info.users[0]
+    via = open_launcher(args.via)
+    result = via.launch(launch_prepare(vm_name, username, vm_info), vm_name)
+    if result["error"]:
+        print(f"ssh_menu.py: launch via {via.name} failed: {result['error']}", file=sys.stderr)
+        return 1
+    return result["returncode"] or 0
+
+def cli_ls(args):
+    if args.user:
+        # Answered from the backend's user index instead of scanning every VM
+        items = [(vm_name, vms[vm_name]) for vm_name in backend.vms_for_user(args.user)]
+    else:
+        items = vms.items()
+    if args.tag:
+        tag = normalize_tag(args.tag)
+        items = [(vm_name, vm_info) for vm_name, vm_info in items if vm_info.has_tag(tag)]
+    if args.json:
+        import json
+        json.dump(dict(items), sys.stdout, indent=4, ensure_ascii=False, default=VM.to_dict)
+        sys.stdout.write("\n")
+        return 0
+    for vm_name, vm_info in items:
+        print(f"{vm_name}\t{vm_info.ip}\t{','.join(vm_info.users)}\t{','.join(vm_info.tags)}")
+    return 0
+
+def select_vms(patterns):
+    """Resolve names, shell-style patterns (web-*) and groups (@prod) to VM names, keeping inventory order"""
+    import fnmatch
+    wanted = set()
+    for pattern in patterns:
+        if pattern.startswith("@"):
+            tag = normalize_tag(pattern[1:])
+            matches = [vm_name for vm_name, vm_info in vms.items() if vm_info.has_tag(tag)]
+            if not matches:
+                raise LookupError(f"No VM is tagged '{tag}'")
+            wanted.update(matches)
+        elif any(char in pattern for char in "*?["):
+            matches = [vm_name for vm_name in vms if fnmatch.fnmatch(vm_name.lower(), pattern.lower())]
+            if not matches:
+                raise LookupError(f"No VM matches '{pattern}'")
+            wanted.update(matches)
+        else:
+            wanted.add(find_vm(pattern))
+    return [vm_name for vm_name in vms if vm_name in wanted]
+
+class PlainWriter:
+    """Strip ANSI colors when output goes to a pipe or file"""
+
+    def __init__(self, stream):
+        import re
+        self.stream = stream
+        self.ansi = re.compile(r"\033\[[0-9;]*m")
+
+    def write(self, text):
+        self.stream.write(self.ansi.sub("", text))
+
+    def flush(self):
+        self.stream.flush()
+
+def cli_ip(args):
+    print(vms[find_vm(args.vm)].ip)
+    return 0
+
+def cli_undo(args):
+    if args.list:
+        for batch in reversed(undo_journal.entries()):
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(batch.get("at", 0)))
+            print(f"{when}\t{len(batch['after'])}\t{batch.get('label', '?')}")
+        return 0
+    batch, restored, skipped = undo_journal.undo()
+    if batch is None:
+        raise LookupError("Nothing to undo")
+    if restored is None:
+        print(f"ssh_menu.py: undo of '{batch['label']}' could not be saved", file=sys.stderr)
+        return 1
+    print(f"Undid '{batch['label']}': {len(restored)} VM(s) restored")
+    if skipped:
+        print(f"Left alone, changed again since: {', '.join(skipped)}", file=sys.stderr)
+    return 0
+
+def cli_migrate(args):
+    target = open_backend(args.target)
+    source = open_backend(args.source or next(name for name in BACKENDS if name != target.name))
+    if source.name == target.name:
+        raise LookupError("Source and target backends are the same")
+    if not source.exists():
+        raise LookupError(f"Nothing to migrate, '{source.path}' does not exist")
+    if target.exists() and not args.force:
+        raise LookupError(f"'{target.path}' already exists, pass --force to overwrite it")
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        inventory = source.load()
+    target.replace(inventory)
+    count = len(inventory)
+    source.close()
+    target.close()
+    print(f"Migrated {count} VM(s) from {source.path} to {target.path} "
+          f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+    return 0
+
+def lazy_handler(module, name):
+    """Handler for a command whose code lives in a module imported only when it runs"""
+    def handler(args):
+        import importlib
+        return getattr(importlib.import_module(f".{module}", __package__), name)(args)
+    return handler
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="ssh_menu.py",
+        description="SSH manager. Run without arguments for the interactive menu.",
+        epilog="--metrics FILE and --profile FILE before the command record timings and a cProfile run.",
+    )
+    parser.set_defaults(load_inventory=True)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    connect = commands.add_parser("connect", help="connect to a VM without opening the menu")
+    connect.add_argument("vm", help="VM name (case-insensitive, unique prefixes allowed)")
+    connect.add_argument("user", nargs="?", help="user to connect as (default: the VM's only user)")
+    connect.add_argument("--via", default="exec", choices=sorted(LAUNCHERS),
+                         help="how to start ssh (default: exec, replacing this process)")
+    connect.set_defaults(handler=cli_connect)
+
+    ls = commands.add_parser("ls", help="list VMs")
+    ls.add_argument("--json", action="store_true", help="print the inventory as JSON")
+    ls.add_argument("-u", "--user", help="only VMs that have this user")
+    ls.add_argument("-t", "--tag", help="only VMs in this group (prod also matches prod/web)")
+    ls.set_defaults(handler=cli_ls)
+
+    ip = commands.add_parser("ip", help="print the IP address of a VM")
+    ip.add_argument("vm")
+    ip.set_defaults(handler=cli_ip)
+
+    resolve = commands.add_parser("resolve", help="resolve VM host names through the cached resolver")
+    resolve.add_argument("targets", nargs="*", help="VM names, patterns or @groups (default: all VMs)")
+    resolve.add_argument("--refresh", action="store_true", help="look names up again even when the cache is fresh")
+    resolve.set_defaults(handler=lazy_handler("resolver", "cli_resolve"))
+
+    transcript = commands.add_parser("transcripts", help="list, show or search recorded sessions (SSH_MENU_LAUNCHER=record)")
+    transcript.add_argument("targets", nargs="*", help="only sessions on VMs matching these names or patterns")
+    transcript.add_argument("--grep", metavar="REGEX", help="print output lines matching REGEX (colors stripped)")
+    transcript.add_argument("--show", metavar="SESSION", help="write the raw output of one session (id or unique prefix)")
+    transcript.add_argument("--at", metavar="OFFSET", help="with --show, start this far into the session (seconds, mm:ss)")
+    transcript.set_defaults(handler=lazy_handler("transcripts", "cli_transcripts"), load_inventory=False)
+
+    undo = commands.add_parser("undo", help="roll back the last bulk edit made in the admin menu")
+    undo.add_argument("--list", action="store_true", help="list the bulk edits that can be undone, newest first")
+    undo.set_defaults(handler=cli_undo)
+
+    run = commands.add_parser("run", help="run a command on many VMs in parallel")
+    run.add_argument("targets", nargs="*", help="VM names, shell-style patterns such as 'web-*', or groups such as '@prod'")
+    run.add_argument("--all", action="store_true", help="run on every VM in the inventory")
+    run.add_argument("-c", "--command", required=True, help="remote command to run")
+    run.add_argument("-u", "--user", help="user to run as (default: each VM's first user)")
+    run.add_argument("-j", "--jobs", type=int, default=FANOUT_CONCURRENCY,
+                     help=f"hosts to run on at once (default: {FANOUT_CONCURRENCY})")
+    run.add_argument("-t", "--timeout", type=float, default=FANOUT_TIMEOUT,
+                     help=f"seconds before a host is killed (default: {FANOUT_TIMEOUT:.0f})")
+    run.set_defaults(handler=lazy_handler("fanout", "cli_run"))
+
+    for direction, source_help, dest_help in (
+            ("push", "local file to copy", "remote path, a trailing / (or ~/) keeps the file name"),
+            ("pull", "remote file to fetch", "local directory, each VM's copy lands in <dir>/<vm>/")):
+        transfer = commands.add_parser(direction, help=f"{direction} a file {'to' if direction == 'push' else 'from'} many VMs in parallel")
+        transfer.add_argument("source", help=source_help)
+        transfer.add_argument("dest", help=dest_help)
+        transfer.add_argument("targets", nargs="*", help="VM names, shell-style patterns such as 'web-*', or groups such as '@prod'")
+        transfer.add_argument("--all", action="store_true", help="every VM in the inventory")
+        transfer.add_argument("-u", "--user", help="user to connect as (default: each VM's first user)")
+        transfer.add_argument("-j", "--jobs", type=int, default=TRANSFER_CONCURRENCY,
+                              help=f"hosts to transfer to at once (default: {TRANSFER_CONCURRENCY})")
+        transfer.add_argument("--retries", type=int, default=TRANSFER_RETRIES,
+                              help=f"extra attempts after a connection failure (default: {TRANSFER_RETRIES})")
+        transfer.add_argument("--force", action="store_true", help="transfer even when the checksums already match")
+        transfer.set_defaults(handler=lazy_handler("transfer", "cli_transfer"), direction=direction)
+
+    imports = commands.add_parser("import", help="bulk import VMs from ssh config, known_hosts, CSV or Ansible INI")
+    imports.add_argument("paths", nargs="+", metavar="path", help="files to import ('-' reads stdin)")
+    imports.add_argument("-f", "--format", choices=sorted(IMPORT_FORMATS),
+                         help="input format (default: guessed from the file name)")
+    imports.add_argument("-n", "--dry-run", action="store_true", help="show the changes without saving them")
+    imports.add_argument("--update", action="store_true",
+                         help="replace the address/port of existing VMs instead of reporting a conflict")
+    imports.add_argument("-u", "--user", help="user for imported VMs that name none")
+    imports.add_argument("--color", default="CYAN", choices=sorted(COLORS), help="color for new VMs")
+    imports.set_defaults(handler=lazy_handler("importers", "cli_import"))
+
+    forwards = commands.add_parser("forwards", help="list, start, stop or supervise background port forwards")
+    forwards.add_argument("targets", nargs="*", help="VM names, patterns or @groups (default: every forward)")
+    forwards.add_argument("--start", action="store_true", help="start the forwards defined for the named VMs")
+    forwards.add_argument("--stop", action="store_true", help="stop forwards")
+    forwards.add_argument("-u", "--user", help="user to open the forwards as (default: the VM's usual user)")
+    forwards.add_argument("-w", "--watch", action="store_true",
+                          help="keep supervising and restarting forwards until Ctrl-C")
+    forwards.set_defaults(handler=lazy_handler("forwards", "cli_forwards"))
+
+    migrate = commands.add_parser("migrate", help="copy the inventory between the JSON and SQLite backends")
+    migrate.add_argument("--to", dest="target", required=True, choices=sorted(BACKENDS),
+                         help="backend to write")
+    migrate.add_argument("--from", dest="source", choices=sorted(BACKENDS),
+                         help="backend to read (default: the other one)")
+    migrate.add_argument("--force", action="store_true", help="overwrite an existing target")
+    migrate.set_defaults(handler=cli_migrate, load_inventory=False)
+    return parser
+
+def quick_args(argv):
+    """Arguments for plain `ip VM`, `ls` and `connect VM [USER]`, None when argv needs the parser
+
+    Importing argparse and building the parser takes longer than the rest
+    of such a run. Anything with an option, --help included, is parsed
+    properly; the defaults here must match build_parser().
+    """
+    import types
+    if not argv or any(arg.startswith("-") for arg in argv):
+        return None
+    command, operands = argv[0], argv[1:]
+    if command == "ip" and len(operands) == 1:
+        return types.SimpleNamespace(command=command, handler=cli_ip, load_inventory=True, vm=operands[0])
+    if command == "ls" and not operands:
+        return types.SimpleNamespace(command=command, handler=cli_ls, load_inventory=True,
+                                     json=False, user=None, tag=None)
+    if command == "connect" and len(operands) in (1, 2):
+        user = operands[1] if len(operands) == 2 else None
+        return types.SimpleNamespace(command=command, handler=cli_connect, load_inventory=True,
+                                     vm=operands[0], user=user, via="exec")
+    return None
+
+def run_cli(argv):
+    global vms
+    args = quick_args(argv) or build_parser().parse_args(argv)
+    # Keep stdout clean for scripts, load warnings go to stderr
+    if args.load_inventory:
+        with contextlib.redirect_stdout(sys.stderr):
+            vms = backend.load()
+            if os.environ.get("SSH_MENU_TIMING"):
+                print(timing_report())
+    try:
+        return args.handler(args)
+    except LookupError as e:
+        print(f"ssh_menu.py: {e.args[0]}", file=sys.stderr)
+        return 2
+
+def run_tui():
+    global vms, search_index, tag_index
+    if os.name == 'nt':
+        os.system('')  # Enable ANSI escape processing in the Windows console
+    vms = backend.load()
+    if os.environ.get("SSH_MENU_TIMING"):
+        print(timing_report())
+    search_index = SearchIndex.from_inventory(vms)
+    tag_index = TagIndex.from_inventory(vms)
+    if backend.name == "json":
+        config_watcher.start(vms)  # SQLite edits are already per-row, nothing to merge
+    history.load()
+    from .forwards import forward_manager
+    from .resolver import resolver
+    resolver.load()
+    connection_pool.prewarm()
+    forward_manager.restore()
+    menu_loop.run(ssh_menu())
+
+def main(argv=None):
+    global backend, launcher
+    argv = sys.argv[1:] if argv is None else argv
+    try:
+        argv = metrics_options(argv)
+        backend = open_backend()
+        if not argv:
+            launcher = open_launcher()  # Only menu sessions use it, connect has --via
+    except LookupError as e:
+        print(f"ssh_menu.py: {e.args[0]}", file=sys.stderr)
+        return 2
+    if argv:
+        return run_cli(argv)
+    return run_tui()
@@ -0,0 +1,181 @@
+"""Run one command on many VMs in parallel"""
+import os
+import sys
+import time
+import signal
+import subprocess
+import threading
+from . import core
+from .core import (BLUE, CYAN, FANOUT_CONCURRENCY, FANOUT_TIMEOUT, GRAY, GREEN, RED, RESET, WHITE,
+                   YELLOW, LazyOptions, PlainWriter, ainput, arrow_menu, clear_screen, menu_loop,
+                   select_vms, ssh_command_args, vm_label, vm_search)
+
+# Parallel command fan-out
+def fanout_targets(vm_names, username=None):
+    """Pair each VM with the user to run as, VMs without users are reported as skipped"""
+    targets = []
+    for vm_name in vm_names:
+        vm_info = core.vms[vm_name]
+        user = username or (vm_info.users[0] if vm_info.users else None)
+        targets.append((vm_name, user, vm_info))
+    return targets
+
+def run_on_host(vm_name, username, vm_info, command, timeout, emit):
+    """Run one remote command, streaming its output through emit(vm_name, line)"""
+    result = {"vm": vm_name, "user": username, "returncode": None,
+              "duration": 0.0, "timed_out": False, "error": None}
+    if username is None:
+        result["error"] = "no users configured"
+        return result
+
+    # Batch mode: a password prompt would block the whole fan-out
+    args = ssh_command_args(username, vm_info)
+    args[1:1] = ["-T", "-o", "BatchMode=yes", "-o", "ConnectTimeout=10"]
+    args.append(command)
+
+    start = time.monotonic()
+    try:
+        # Own process group, so a timeout also kills anything ssh spawned
+        proc = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, start_new_session=(os.name != 'nt'))
+    except OSError as e:
+        result["error"] = str(e)
+        return result
+
+    def expire():
+        result["timed_out"] = True
+        try:
+            if os.name == 'nt':
+                proc.kill()
+            else:
+                os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    timer = threading.Timer(timeout, expire) if timeout else None
+    if timer:
+        timer.start()
+    try:
+        for raw in proc.stdout:
+            emit(vm_name, raw.decode("utf-8", errors="replace").rstrip("\r\n"))
+        result["returncode"] = proc.wait()
+    finally:
+        if timer:
+            timer.cancel()
+        proc.stdout.close()
+    result["duration"] = time.monotonic() - start
+    return result
+
+def run_fanout(targets, command, concurrency=FANOUT_CONCURRENCY, timeout=FANOUT_TIMEOUT, out=None):
+    """Run a command on many VMs at once, output lines are prefixed with the VM name"""
+    from concurrent.futures import ThreadPoolExecutor
+    out = out or sys.stdout
+    width = max((len(vm_name) for vm_name, _, _ in targets), default=0)
+    lock = threading.Lock()
+    # Resolved up front, worker threads must not touch the inventory backend
+    colors = {vm_name: vm_info.color_code for vm_name, _, vm_info in targets}
+
+    def emit(vm_name, line):
+        color = colors.get(vm_name, RESET)
+        with lock:
+            out.write(f"{color}{vm_name:<{width}}{RESET} {GRAY}│{RESET} {line}\n")
+            out.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(run_on_host, vm_name, user, vm_info, command, timeout, emit)
+                   for vm_name, user, vm_info in targets]
+        return [future.result() for future in futures]
+
+def fanout_summary(results, wall_time):
+    """Final table with exit codes and durations"""
+    width = max([len(result["vm"]) for result in results] + [4])
+    lines = [f"\n{CYAN}{'Host':<{width}}  {'User':<12} {'Exit':>5} {'Time':>8}  Status{RESET}"]
+    ok = failed = 0
+    for result in results:
+        if result["error"]:
+            status, code = f"{YELLOW}skipped: {result['error']}{RESET}", "-"
+            failed += 1
+        elif result["timed_out"]:
+            status, code = f"{RED}timed out{RESET}", "-"
+            failed += 1
+        elif result["returncode"] == 0:
+            status, code = f"{GREEN}ok{RESET}", "0"
+            ok += 1
+        else:
+            status, code = f"{RED}failed{RESET}", str(result["returncode"])
+            failed += 1
+        lines.append(f"{result['vm']:<{width}}  {str(result['user'] or '-'):<12} {code:>5} "
+                     f"{result['duration']:>7.2f}s  {status}")
+    lines.append(f"\n{GREEN}{ok} ok{RESET}, {RED if failed else GRAY}{failed} failed{RESET} "
+                 f"{GRAY}in {wall_time:.2f}s{RESET}")
+    return "\n".join(lines)
+
+# Menu
+async def fanout_menu():
+    """Pick several VMs and run the same command on all of them"""
+    vm_names = list(core.vms.keys())
+    options = LazyOptions(vm_names, vm_label)
+    picked = await arrow_menu(options, f"{CYAN}=== RUN COMMAND: select VMs ==={RESET}",
+                        search=vm_search(vm_names, 0), multi=True)
+    if picked == -1:
+        return
+    targets = fanout_targets([vm_names[i] for i in picked])
+
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              RUN COMMAND                    {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    print(f"{CYAN}Targets:{RESET} {WHITE}{len(targets)} VM(s){RESET} {GRAY}({', '.join(name for name, _, _ in targets[:5])}{', ...' if len(targets) > 5 else ''}){RESET}")
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+
+    command = (await ainput(f"{CYAN}Command: {WHITE}")).strip()
+    print(f"{RESET}", end="")
+    if not command or command.lower() in ['cancel', 'exit', 'quit']:
+        print(f"\n{YELLOW}ℹ Command cancelled.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+
+    concurrency = FANOUT_CONCURRENCY
+    while True:
+        answer = (await ainput(f"{CYAN}Parallel hosts [{FANOUT_CONCURRENCY}]: {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not answer:
+            break
+        if answer.isdigit() and int(answer) > 0:
+            concurrency = int(answer)
+            break
+        print(f"{RED}✗ Enter a positive number!{RESET}")
+
+    timeout = FANOUT_TIMEOUT
+    while True:
+        answer = (await ainput(f"{CYAN}Timeout per host in seconds [{FANOUT_TIMEOUT:.0f}]: {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not answer:
+            break
+        try:
+            timeout = float(answer)
+            if timeout > 0:
+                break
+        except ValueError:
+            pass
+        print(f"{RED}✗ Enter a positive number of seconds!{RESET}")
+
+    print(f"\n{CYAN}➤ Running on {len(targets)} VM(s), {concurrency} at a time...{RESET}\n")
+    start = time.monotonic()
+    results = await menu_loop.run_blocking(run_fanout, targets, command, concurrency, timeout)
+    print(fanout_summary(results, time.monotonic() - start))
+    await ainput(f"\n{GRAY}Press Enter to return to menu...{RESET}")
+
+# Command line
+def cli_run(args):
+    vm_names = list(core.vms) if args.all else select_vms(args.targets)
+    if not vm_names:
+        raise LookupError("No target VMs, name some or pass --all")
+    out = sys.stdout if sys.stdout.isatty() else PlainWriter(sys.stdout)
+    start = time.monotonic()
+    results = run_fanout(fanout_targets(vm_names, args.user), args.command,
+                         args.jobs, args.timeout, out=out)
+    out.write(fanout_summary(results, time.monotonic() - start) + "\n")
+    out.flush()
+    ok = all(result["returncode"] == 0 and not result["timed_out"] for result in results)
+    return 0 if ok else 1
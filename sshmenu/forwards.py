@@ -0,0 +1,602 @@
+"""Background port forwards that outlive the menu"""
+import os
+import sys
+import json
+import re
+import time
+import signal
+import hashlib
+import subprocess
+from . import core
+from .core import (BLUE, CONTROL_DIR, CYAN, GRAY, GREEN, MENU_RELOAD, MENU_TICK, RED, RESET, WHITE,
+                   YELLOW, LazyOptions, PlainWriter, ainput, arrow_menu, clear_screen, commit_vm,
+                   config_watcher, history, select_vms, ssh_command_args)
+
+# Port forwards
+# Each forward runs as its own background ssh process (-N, no pooled master,
+# so a forward never ends up owning the master that interactive sessions use).
+# The processes are detached from the menu and survive it; the state file
+# lets the next run adopt them again instead of starting duplicates.
+FORWARD_STATE_FILE = "vms_forwards.json"
+FORWARD_KINDS = {"L": "local", "R": "remote", "D": "dynamic"}
+FORWARD_FLAGS = {"L": "-L", "R": "-R", "D": "-D"}
+FORWARD_BACKOFF_MIN = 1.0      # Seconds before the first restart of a failed forward
+FORWARD_BACKOFF_MAX = 60.0     # Longest wait between restarts
+FORWARD_STABLE = 30.0          # Seconds up after which a forward's backoff starts over
+FORWARD_CHECK_INTERVAL = 10.0  # Seconds between health checks of a running forward
+FORWARD_STARTUP_POLL = 0.5     # Seconds between checks while a new forward connects
+FORWARD_STARTUP_TIMEOUT = 20.0 # Seconds a new forward has to open its listener
+FORWARD_MISSES = 3             # Failed health checks in a row before a forward is restarted
+
+def split_forward_value(value):
+    """Split 'bind:port:host:hostport' on colons outside [IPv6] brackets"""
+    return re.split(r":(?![^\[]*\])", value)
+
+def forward_port(text):
+    if not text.isdigit() or not 1 <= int(text) <= 65535:
+        raise ValueError(f"'{text}' is not a port number (1-65535)")
+    return int(text)
+
+def parse_forward(spec):
+    """Validate 'L 8080:localhost:3000', 'R 9000:localhost:22' or 'D 1080', returns (kind, value)"""
+    kind, _, value = spec.strip().partition(" ")
+    kind, value = kind.upper(), value.strip()
+    if kind not in FORWARD_KINDS:
+        raise ValueError(f"Forward type must be L (local), R (remote) or D (dynamic), not '{kind}'")
+    parts = split_forward_value(value)
+    if kind == "D":
+        if len(parts) not in (1, 2):
+            raise ValueError("Dynamic forwards look like 'D [bind:]port'")
+        forward_port(parts[-1])
+    else:
+        if len(parts) not in (3, 4) or not parts[-2]:
+            raise ValueError(f"{FORWARD_KINDS[kind].capitalize()} forwards look like '{kind} [bind:]port:host:hostport'")
+        forward_port(parts[-3])
+        forward_port(parts[-1])
+    return kind, value
+
+def normalize_forward(spec):
+    return " ".join(parse_forward(spec))
+
+def forward_listener(kind, value):
+    """Local (host, port) a forward listens on, None for remote forwards"""
+    if kind == "R":
+        return None
+    parts = split_forward_value(value)
+    listen = parts[0] if len(parts) in (2, 4) else ""
+    port = int(parts[-1] if kind == "D" else parts[-3])
+    host = listen.strip("[]")
+    if host in ("", "localhost"):
+        host = "127.0.0.1"   # ssh's default bind address (GatewayPorts no)
+    elif host == "*":
+        host = "0.0.0.0"
+    return (host, port)
+
+def forward_description(kind, value):
+    parts = split_forward_value(value)
+    if kind == "D":
+        return f"SOCKS proxy on {value}"
+    listen = ":".join(parts[:-2])
+    target = f"{parts[-2]}:{parts[-1]}"
+    if kind == "L":
+        return f"local {listen} → {target}"
+    return f"remote {listen} → {target}"
+
+def port_listening(host, port):
+    """Bytes-free health check: the port is held if we cannot bind it ourselves
+
+    Connecting to the listener would open a channel and reach the service
+    behind it (a database, a dashboard), a bind attempt touches nothing.
+    """
+    import errno
+    import socket
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as probe:
+        try:
+            probe.bind((host, port))
+        except OSError as e:
+            return e.errno == errno.EADDRINUSE
+    return False
+
+def forward_command_args(username, vm_info, kind, value):
+    args = ssh_command_args(username, vm_info, multiplex=False)
+    # BatchMode: a background forward can never answer a password prompt
+    args[1:1] = ["-N", "-o", "ExitOnForwardFailure=yes", "-o", "BatchMode=yes",
+                 "-o", "ServerAliveInterval=15", "-o", "ServerAliveCountMax=3",
+                 "-o", "ConnectTimeout=10", "-o", "LogLevel=ERROR", FORWARD_FLAGS[kind], value]
+    return args
+
+def forward_pid_alive(pid, value):
+    """Is an adopted pid still an ssh holding this forward? Guards against reused pids"""
+    if os.name == 'nt':
+        return False  # os.kill() would terminate it, adopted forwards are restarted instead
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    try:
+        with open(f"/proc/{pid}/cmdline", "rb") as f:
+            return value.encode("utf-8") in f.read().split(b"\0")
+    except OSError:
+        return True   # No /proc (macOS), the pid is all we have
+
+class Forward:
+    """One supervised port forward of a VM"""
+
+    def __init__(self, vm_name, username, spec):
+        self.vm_name = vm_name
+        self.username = username
+        self.kind, self.value = parse_forward(spec)
+        self.spec = f"{self.kind} {self.value}"
+        self.listener = forward_listener(self.kind, self.value)
+        self.proc = None         # Popen of a forward started by this process
+        self.pid = None          # Set for adopted forwards too
+        self.state = "stopped"   # starting, up, unhealthy, backoff or stopped
+        self.failures = 0        # Failures since the forward was last stable
+        self.restarts = 0
+        self.started_at = None
+        self.up_since = None
+        self.next_start = 0.0
+        self.next_check = 0.0
+        self.misses = 0
+        self.last_error = None
+
+    @property
+    def key(self):
+        return (self.vm_name, self.spec)
+
+    def log_path(self):
+        digest = hashlib.sha1(f"{self.vm_name}\0{self.spec}".encode("utf-8")).hexdigest()[:16]
+        return os.path.join(CONTROL_DIR, f"fw-{digest}.log")
+
+    def exited(self):
+        """Exit status once the ssh process is gone, None while it runs"""
+        if self.proc is not None:
+            return self.proc.poll()
+        if self.pid is not None and not forward_pid_alive(self.pid, self.value):
+            return -1
+        return None
+
+    def error_text(self, code):
+        try:
+            with open(self.log_path(), "r", encoding="utf-8", errors="replace") as f:
+                lines = [line.strip() for line in f if line.strip()]
+        except OSError:
+            lines = []
+        return lines[-1][:200] if lines else f"ssh exited with {code}"
+
+    def kill(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.wait()
+        elif self.pid is not None and forward_pid_alive(self.pid, self.value):
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except OSError:
+                pass
+        self.proc = None
+        self.pid = None
+
+class ForwardManager:
+    """Start, supervise and restart background port forwards
+
+    supervise() is cheap enough for the menu loop's housekeeping tick:
+    exits are noticed with a non-blocking poll, health checks run every
+    FORWARD_CHECK_INTERVAL, and a failed forward is restarted after an
+    exponential backoff with jitter so dozens of forwards to one dead
+    host do not retry in lockstep.
+    """
+
+    def __init__(self, state_file=FORWARD_STATE_FILE):
+        self.state_file = state_file
+        self.forwards = {}   # (vm_name, spec) -> Forward
+        self.version = 0     # Bumped whenever a forward changes state
+
+    def get(self, vm_name, spec):
+        return self.forwards.get((vm_name, spec))
+
+    def for_vm(self, vm_name):
+        return [forward for forward in self.forwards.values() if forward.vm_name == vm_name]
+
+    def running(self):
+        return [forward for forward in self.forwards.values() if forward.state != "stopped"]
+
+    def start(self, vm_name, username, spec):
+        forward = self.get(vm_name, spec)
+        if forward is None or forward.username != username:
+            if forward is not None:
+                forward.kill()
+            forward = Forward(vm_name, username, spec)
+            self.forwards[forward.key] = forward
+        elif forward.state != "stopped":
+            return forward
+        forward.failures = forward.restarts = 0
+        forward.last_error = None
+        self.spawn(forward)
+        self.changed()
+        return forward
+
+    def spawn(self, forward):
+        vm_info = core.vms.get(forward.vm_name)
+        if vm_info is None:
+            forward.state = "stopped"
+            forward.last_error = "VM is no longer in the inventory"
+            return
+        now = time.monotonic()
+        if forward.started_at is not None:
+            forward.restarts += 1
+        if os.name == 'nt':
+            detach = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP | subprocess.CREATE_NO_WINDOW}
+        else:
+            detach = {"start_new_session": True}   # Outlives the menu and ignores its Ctrl-C
+        try:
+            os.makedirs(CONTROL_DIR, mode=0o700, exist_ok=True)
+            with open(forward.log_path(), "wb") as log:
+                forward.proc = subprocess.Popen(
+                    forward_command_args(forward.username, vm_info, forward.kind, forward.value),
+                    stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=log, **detach,
+                )
+        except OSError as e:
+            self.failed(forward, str(e))
+            return
+        forward.pid = forward.proc.pid
+        forward.state = "starting"
+        forward.started_at = now
+        forward.up_since = None
+        forward.next_check = now + FORWARD_STARTUP_POLL
+        forward.misses = 0
+
+    def failed(self, forward, error):
+        import random
+        now = time.monotonic()
+        if forward.up_since is not None and now - forward.up_since >= FORWARD_STABLE:
+            forward.failures = 0   # It had been working, retry quickly
+        forward.failures += 1
+        forward.last_error = error
+        forward.proc = None
+        forward.pid = None
+        forward.up_since = None
+        delay = min(FORWARD_BACKOFF_MAX, FORWARD_BACKOFF_MIN * 2 ** (forward.failures - 1))
+        forward.state = "backoff"
+        forward.next_start = now + delay * random.uniform(0.8, 1.2)
+
+    def stop(self, vm_name, spec):
+        forward = self.get(vm_name, spec)
+        if forward is None or forward.state == "stopped":
+            return False
+        forward.kill()
+        forward.state = "stopped"
+        self.changed()
+        return True
+
+    def stop_all(self, vm_name=None):
+        stopped = 0
+        for forward in list(self.forwards.values()):
+            if vm_name in (None, forward.vm_name) and self.stop(*forward.key):
+                stopped += 1
+        return stopped
+
+    def forget(self, vm_name, spec):
+        """Stop a forward whose definition was removed from the VM"""
+        self.stop(vm_name, spec)
+        self.forwards.pop((vm_name, spec), None)
+
+    def supervise(self):
+        """Restart exited forwards and health-check live ones, returns True when any state changed"""
+        now = time.monotonic()
+        changed = False
+        for forward in list(self.forwards.values()):
+            if forward.state == "stopped":
+                continue
+            if forward.state == "backoff":
+                if now >= forward.next_start:
+                    self.spawn(forward)
+                    changed = True
+                continue
+            # Adopted forwards have no Popen to poll, their pid is checked with the health check
+            if forward.proc is not None or now >= forward.next_check:
+                code = forward.exited()
+                if code is not None:
+                    self.failed(forward, forward.error_text(code))
+                    changed = True
+                    continue
+            if now < forward.next_check:
+                continue
+            # Remote forwards listen on the VM; ExitOnForwardFailure makes a live process the check
+            if forward.listener is None or port_listening(*forward.listener):
+                if forward.state != "up":
+                    forward.state = "up"
+                    forward.up_since = now
+                    changed = True
+                forward.misses = 0
+                forward.next_check = now + FORWARD_CHECK_INTERVAL
+            elif forward.state == "starting" and now - forward.started_at < FORWARD_STARTUP_TIMEOUT:
+                forward.next_check = now + FORWARD_STARTUP_POLL   # Still connecting
+            else:
+                forward.misses += 1
+                forward.next_check = now + FORWARD_CHECK_INTERVAL
+                if forward.misses >= FORWARD_MISSES or forward.state == "starting":
+                    forward.kill()
+                    self.failed(forward, f"nothing listening on {forward.listener[0]}:{forward.listener[1]}")
+                else:
+                    forward.state = "unhealthy"
+                changed = True
+        if changed:
+            self.changed()
+        return changed
+
+    def changed(self):
+        self.version += 1
+        self.save()
+
+    def save(self):
+        state = [
+            {"vm": forward.vm_name, "user": forward.username, "spec": forward.spec, "pid": forward.pid}
+            for forward in self.running()
+        ]
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump({"forwards": state}, f, indent=4, ensure_ascii=False)
+        except OSError:
+            pass  # Only costs re-adopting the forwards next time
+
+    def restore(self):
+        """Adopt forwards a previous run left running and restart the ones that died"""
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("forwards", [])
+        except (OSError, ValueError, AttributeError):
+            return 0
+        now = time.monotonic()
+        for entry in entries:
+            try:
+                forward = Forward(entry["vm"], entry["user"], entry["spec"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if forward.vm_name not in core.vms or forward.key in self.forwards:
+                continue
+            self.forwards[forward.key] = forward
+            pid = entry.get("pid")
+            if isinstance(pid, int) and forward_pid_alive(pid, forward.value):
+                forward.pid = pid
+                forward.state = "starting"
+                forward.started_at = now
+            else:
+                forward.state = "backoff"
+                forward.next_start = now
+        if self.forwards:
+            self.changed()
+        return len(self.forwards)
+
+    def summary(self):
+        running = self.running()
+        if not running:
+            return ""
+        up = sum(1 for forward in running if forward.state == "up")
+        color = GREEN if up == len(running) else YELLOW
+        return f"{color}⇄ {up}/{len(running)} forward(s) up{RESET}"
+
+forward_manager = ForwardManager()
+
+def forward_status(forward):
+    """Colored state of a forward for menus and the command line"""
+    if forward is None or forward.state == "stopped":
+        error = f" {GRAY}({forward.last_error}){RESET}" if forward is not None and forward.last_error else ""
+        return f"{GRAY}○ stopped{RESET}{error}"
+    if forward.state == "up":
+        restarts = f", {forward.restarts} restart(s)" if forward.restarts else ""
+        return f"{GREEN}● up{RESET} {GRAY}as {forward.username}{restarts}{RESET}"
+    if forward.state == "starting":
+        return f"{YELLOW}◌ starting{RESET} {GRAY}as {forward.username}{RESET}"
+    if forward.state == "unhealthy":
+        return f"{YELLOW}● not listening{RESET} {GRAY}({forward.misses} missed check(s)){RESET}"
+    wait = max(0.0, forward.next_start - time.monotonic())
+    return f"{RED}● retry in {wait:.0f}s{RESET} {GRAY}{forward.last_error or ''}{RESET}"
+
+# Menus
+def forward_label(vm_name, spec):
+    try:
+        kind, value = parse_forward(spec)
+    except ValueError as e:
+        return f"{spec}  {RED}✗ {e}{RESET}"
+    return (f"{WHITE}{kind} {value}{RESET}  {forward_status(forward_manager.get(vm_name, f'{kind} {value}'))}"
+            f"  {GRAY}{forward_description(kind, value)}{RESET}")
+
+def forward_refresh(options):
+    """Menu refresh that repaints forward rows when a state changes or a retry countdown ticks"""
+    seen_version = forward_manager.version
+
+    def refresh():
+        nonlocal seen_version
+        if forward_manager.version != seen_version or any(
+                forward.state == "backoff" for forward in forward_manager.forwards.values()):
+            seen_version = forward_manager.version
+            options.invalidate()
+
+    return refresh
+
+async def toggle_forward(vm_name, spec, username=None):
+    """Stop a running forward, or start it as the given (or the VM's usual) user"""
+    try:
+        spec = normalize_forward(spec)
+    except ValueError as e:
+        clear_screen()
+        print(f"{RED}✗ Cannot start '{spec}': {e}{RESET}")
+        print(f"{GRAY}Remove it and add it again in the right format.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    if forward_manager.stop(vm_name, spec):
+        return
+    vm_info = core.vms[vm_name]
+    username = username or history.preferred_user(vm_name, vm_info.users) or next(iter(vm_info.users), None)
+    if username is None:
+        clear_screen()
+        print(f"{RED}✗ {vm_name} has no users to open the forward as.{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    forward_manager.start(vm_name, username, spec)
+
+async def forwards_menu(vm_name):
+    """Start, stop and define the port forwards of one VM"""
+    initial = 0
+    while True:
+        vm_info = core.vms.get(vm_name)
+        if vm_info is None:
+            return  # Deleted on disk meanwhile
+        specs = list(vm_info.forwards)
+        options = LazyOptions(specs, lambda spec: forward_label(vm_name, spec), head=["Back"],
+                              tail=["Add forward", "Remove forward", "Start all", "Stop all"])
+        follow_forwards = forward_refresh(options)
+        seen_version = config_watcher.version
+
+        def refresh_status():
+            if vm_name in config_watcher.changes_since(seen_version)[0]:
+                return True
+            follow_forwards()
+
+        selection = await arrow_menu(options, f"{vm_info.color_code}=== Port forwards for {vm_name} ==={RESET}  {forward_manager.summary()}",
+                               refresh=refresh_status, initial=initial)
+
+        if selection == MENU_RELOAD:
+            continue
+        elif selection == -1 or selection == 0:  # ESC/Left arrow or Back
+            return
+        initial = selection
+        if selection == len(options) - 4:  # Add forward
+            await add_forward(vm_name)
+        elif selection == len(options) - 3:  # Remove forward
+            await remove_forward(vm_name)
+        elif selection == len(options) - 2:  # Start all
+            for spec in specs:
+                forward = forward_manager.get(vm_name, spec)
+                if forward is None or forward.state == "stopped":
+                    await toggle_forward(vm_name, spec)
+        elif selection == len(options) - 1:  # Stop all
+            forward_manager.stop_all(vm_name)
+        else:
+            await toggle_forward(vm_name, specs[selection - 1])
+
+async def add_forward(vm_name):
+    vm_info = core.vms[vm_name]
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              ADD PORT FORWARD               {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    
+    print(f"{CYAN}Target VM:{RESET} {vm_info.color_code}{vm_name}{RESET}")
+    print(f"{GRAY}  L [bind:]port:host:hostport   local port → host:hostport as seen from the VM{RESET}")
+    print(f"{GRAY}  R [bind:]port:host:hostport   port on the VM → host:hostport as seen from here{RESET}")
+    print(f"{GRAY}  D [bind:]port                 local SOCKS proxy through the VM{RESET}")
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+    
+    while True:
+        spec = (await ainput(f"{CYAN}Forward (e.g. L 8080:localhost:3000): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        
+        if spec.lower() in ['cancel', 'exit', 'quit']:
+            print(f"\n{YELLOW}ℹ Forward creation cancelled.{RESET}")
+            break
+        try:
+            spec = normalize_forward(spec)
+        except ValueError as e:
+            print(f"{RED}✗ {e}{RESET}")
+            continue
+        if spec in vm_info.forwards:
+            print(f"{RED}✗ '{spec}' is already defined!{RESET}")
+            continue
+        vm_info.forwards += (spec,)
+        commit_vm(vm_name)
+        print(f"\n{GREEN}✓ Forward {WHITE}{spec}{GREEN} added, select it to start it.{RESET}")
+        break
+    
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def remove_forward(vm_name):
+    vm_info = core.vms[vm_name]
+    if not vm_info.forwards:
+        return
+    remove_options = ["Cancel"] + [f"Remove {spec}" for spec in vm_info.forwards]
+    remove_selection = await arrow_menu(remove_options, f"{RED}=== Remove Port Forward from {vm_name} ==={RESET}")
+    if remove_selection > 0:
+        spec = vm_info.forwards[remove_selection - 1]
+        try:
+            forward_manager.forget(vm_name, normalize_forward(spec))
+        except ValueError:
+            pass  # Never parsed, so never started
+        vm_info.forwards = tuple(item for item in vm_info.forwards if item != spec)
+        commit_vm(vm_name)
+
+def forward_row(forward):
+    return f"{forward.vm_name}  {WHITE}{forward.spec}{RESET}  {forward_status(forward)}"
+
+async def forward_status_menu():
+    """Every port forward started in this session or adopted from the last one"""
+    initial = 0
+    while True:
+        forwards = sorted(forward_manager.forwards.values(), key=lambda forward: forward.key)
+        options = LazyOptions(forwards, forward_row, head=["Back"], tail=["Stop all forwards"])
+        running = forward_manager.running()
+        up = sum(1 for forward in running if forward.state == "up")
+        selection = await arrow_menu(options, f"{YELLOW}=== PORT FORWARDS ({up} up, {len(running)} running) ==={RESET}",
+                               refresh=forward_refresh(options), initial=initial)
+
+        if selection == -1 or selection == 0:
+            return
+        initial = selection
+        if selection == len(options) - 1:  # Stop all
+            forward_manager.stop_all()
+        elif forwards[selection - 1].vm_name in core.vms:
+            forward = forwards[selection - 1]
+            await toggle_forward(forward.vm_name, forward.spec, forward.username)
+
+# Command line
+def cli_forwards(args):
+    history.load()
+    forward_manager.restore()
+    vm_names = select_vms(args.targets) if args.targets else None
+    if args.stop:
+        stopped = sum(forward_manager.stop_all(vm_name) for vm_name in (vm_names or [None]))
+        print(f"Stopped {stopped} forward(s)")
+        return 0
+    if args.start:
+        if not vm_names:
+            raise LookupError("Name the VMs whose forwards to start")
+        for vm_name in vm_names:
+            vm_info = core.vms[vm_name]
+            username = args.user or history.preferred_user(vm_name, vm_info.users) or next(iter(vm_info.users), None)
+            if username is None:
+                raise LookupError(f"Specify a user for '{vm_name}', it has none configured")
+            for spec in vm_info.forwards:
+                try:
+                    forward_manager.start(vm_name, username, spec)
+                except ValueError as e:
+                    print(f"ssh_menu.py: skipping '{spec}' on {vm_name}: {e}", file=sys.stderr)
+    out = sys.stdout if sys.stdout.isatty() else PlainWriter(sys.stdout)
+    shown = {}
+    # Let new and adopted forwards reach a verdict before reporting them
+    deadline = time.monotonic() + FORWARD_STARTUP_TIMEOUT
+    while (not args.watch and time.monotonic() < deadline
+           and any(forward.state == "starting" for forward in forward_manager.forwards.values())):
+        forward_manager.supervise()
+        time.sleep(FORWARD_STARTUP_POLL)
+    try:
+        while True:
+            forward_manager.supervise()
+            for forward in sorted(forward_manager.forwards.values(), key=lambda forward: forward.key):
+                if vm_names is not None and forward.vm_name not in vm_names:
+                    continue
+                line = forward_row(forward)
+                if shown.get(forward.key) != forward.state:
+                    out.write(f"{time.strftime('%H:%M:%S ') if args.watch else ''}{line}\n")
+                    shown[forward.key] = forward.state
+            out.flush()
+            if not args.watch:
+                return 0
+            time.sleep(MENU_TICK)
+    except KeyboardInterrupt:
+        out.write(f"{len(forward_manager.running())} forward(s) left running\n")
+        return 0
@@ -0,0 +1,378 @@
+"""Bulk import from ssh config, known_hosts, CSV and Ansible inventories"""
+import os
+import sys
+import re
+import time
+import itertools
+from . import core
+from .core import (BLUE, COLORS, CYAN, GRAY, GREEN, RED, RESET, VM, WHITE, YELLOW, PlainWriter,
+                   ainput, arrow_menu, clear_screen, commit_vms, normalize_tags, records)
+from .resolver import address_literal
+
+# Bulk import from other inventories
+IMPORT_PREVIEW_LINES = 20   # Diff lines shown before asking to apply an import in the menu
+
+def is_host_pattern(host):
+    return any(char in host for char in "*?!")
+
+def looks_like_address(host):
+    return address_literal(host) is not None
+
+def import_entry(ip, users=(), port=None, color=None, tags=(), identity_file=None):
+    vm_info = {"ip": ip, "users": list(users)}
+    if identity_file:
+        vm_info["identity_file"] = identity_file
+    if color:
+        vm_info["color"] = color
+    tags = normalize_tags(tags)
+    if tags:
+        vm_info["tags"] = list(tags)
+    if port and str(port).isdigit() and int(port) != 22:
+        vm_info["port"] = int(port)
+    return vm_info
+
+def parse_ssh_config(lines):
+    """Yield (name, vm_info) for every concrete Host of an OpenSSH client config
+
+    Wildcard hosts and Match blocks are skipped; like ssh, the first value
+    of HostName/User/Port/IdentityFile in a block wins.
+    """
+    hosts, options = [], {}
+    for line in itertools.chain(lines, ["Host"]):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = re.match(r"(\w+)\s*(?:=\s*|\s+)?(.*)", line)
+        if not match:
+            continue
+        keyword, value = match.group(1).lower(), match.group(2).strip().strip('"')
+        if keyword in ("host", "match"):
+            for host in hosts:
+                hostname = options.get("hostname", host).replace("%h", host)
+                users = [options["user"]] if "user" in options else []
+                yield host, import_entry(hostname, users, options.get("port"),
+                                         identity_file=options.get("identityfile"))
+            hosts = [host for host in value.split() if not is_host_pattern(host)] if keyword == "host" else []
+            options = {}
+        elif keyword in ("hostname", "user", "port", "identityfile"):
+            options.setdefault(keyword, value)
+
+def parse_known_hosts(lines):
+    """Yield one VM per known_hosts line, hashed and wildcard entries carry no usable name"""
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith(("#", "@")):
+            continue
+        names, port = [], None
+        for host in fields[0].split(","):
+            if host.startswith("|") or is_host_pattern(host):
+                continue
+            bracketed = re.fullmatch(r"\[(.+)\]:(\d+)", host)
+            if bracketed:
+                host, port = bracketed.group(1), bracketed.group(2)
+            names.append(host)
+        if not names:
+            continue
+        # "web1,10.0.0.5 ssh-ed25519 ..." names the VM web1 with address 10.0.0.5
+        ip = next((host for host in names if looks_like_address(host)), names[0])
+        name = next((host for host in names if host != ip), ip)
+        yield name, import_entry(ip, port=port)
+
+CSV_COLUMNS = {
+    "name": ("name", "vm", "alias", "host"),
+    "ip": ("ip", "address", "addr", "hostname", "ansible_host"),
+    "users": ("users", "user", "username"),
+    "color": ("color",),
+    "port": ("port",),
+    "tags": ("tags", "tag", "groups", "group"),
+}
+
+def parse_csv(lines):
+    """Yield VMs from a CSV file with a header row (name, ip, users, color, port, tags)"""
+    import csv
+    lines = iter(lines)
+    first = next(lines, "")
+    delimiter = max(",;\t", key=first.count)
+    header = [column.strip().lower() for column in next(csv.reader([first], delimiter=delimiter), [])]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in header and header.index(alias) not in columns.values():
+                columns[field] = header.index(alias)
+                break
+    if "name" not in columns and "ip" not in columns:
+        raise ValueError("CSV header needs a 'name' or 'ip' column")
+    user_separators = r"[;|\s]+" if delimiter == "," else r"[,;|\s]+"
+    for row in csv.reader(lines, delimiter=delimiter):
+        get = lambda field: row[columns[field]].strip() if field in columns and columns[field] < len(row) else ""
+        name, ip = get("name"), get("ip")
+        color = get("color").upper()
+        users = [user for user in re.split(user_separators, get("users")) if user]
+        tags = [tag for tag in re.split(user_separators, get("tags")) if tag]
+        yield name or ip, import_entry(ip or name, users, get("port"), color if color in COLORS else None, tags)
+
+def expand_host_range(pattern):
+    """Expand Ansible numeric host ranges: web[01:03] -> web01, web02, web03"""
+    match = re.search(r"\[(\d+):(\d+)(?::(\d+))?\]", pattern)
+    if not match:
+        yield pattern
+        return
+    start, end, step = match.group(1), match.group(2), int(match.group(3) or 1)
+    width = len(start) if start.startswith("0") else 0
+    for number in range(int(start), int(end) + 1, step):
+        yield from expand_host_range(pattern[:match.start()] + str(number).zfill(width) + pattern[match.end():])
+
+def parse_ansible_ini(lines):
+    """Yield VMs from an Ansible INI inventory (ansible_host/ansible_user/ansible_port)
+
+    The group a host is listed under becomes its tag.
+    """
+    import shlex
+    skipping = False
+    group = None
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith(("#", ";")):
+            continue
+        if line.startswith("["):
+            # [group:vars] and [group:children] list variables and groups, not hosts
+            skipping = ":" in line and not line.rstrip("]").endswith(":hosts")
+            group = line.strip("[]").partition(":")[0].strip()
+            if group in ("all", "ungrouped"):
+                group = None
+            continue
+        if skipping:
+            continue
+        if '"' in line or "'" in line:
+            try:
+                tokens = shlex.split(line, comments=True)
+            except ValueError:
+                tokens = line.split()
+        else:
+            tokens = line.split("#", 1)[0].split()  # shlex is ~20x slower, only needed for quoting
+        if not tokens:
+            continue
+        variables = dict(token.split("=", 1) for token in tokens[1:] if "=" in token)
+        for host in expand_host_range(tokens[0]):
+            users = [variables["ansible_user"]] if "ansible_user" in variables else []
+            yield host, import_entry(variables.get("ansible_host", host), users, variables.get("ansible_port"),
+                                     tags=[group] if group else ())
+
+IMPORT_PARSERS = {
+    "ssh_config": parse_ssh_config,
+    "known_hosts": parse_known_hosts,
+    "csv": parse_csv,
+    "ansible": parse_ansible_ini,
+}
+
+def detect_import_format(path):
+    base = os.path.basename(path).lower()
+    if base.endswith(".csv"):
+        return "csv"
+    if "known_hosts" in base:
+        return "known_hosts"
+    if base.endswith((".ini", ".cfg")) or base in ("hosts", "inventory"):
+        return "ansible"
+    if base == "config" or base.endswith(".conf"):
+        return "ssh_config"
+    return None
+
+def read_import(path, import_format=None):
+    """Stream (name, dict) records from an import source, one line at a time"""
+    import_format = import_format or detect_import_format(path)
+    if import_format not in IMPORT_PARSERS:
+        raise LookupError(f"Cannot tell the format of '{path}', pass one of: {', '.join(IMPORT_PARSERS)}")
+    if path == "-":
+        yield from IMPORT_PARSERS[import_format](sys.stdin)
+        return
+    with open(os.path.expanduser(path), encoding="utf-8", errors="replace", newline="") as f:
+        yield from IMPORT_PARSERS[import_format](f)
+
+class ImportPlan:
+    """Dedupe imported records against the inventory and stage the resulting changes
+
+    A record matches an existing VM by name, or failing that by address.
+    Matches only gain missing users and tags (and, with update=True, a new
+    address or port); everything else becomes a new VM. Nothing touches the
+    inventory until apply(), which saves all changes in one write.
+    """
+
+    def __init__(self, inventory, update=False, default_user=None, color="CYAN"):
+        self.inventory = inventory
+        self.update = update
+        self.default_user = default_user
+        self.color = color
+        self.added = {}       # name -> vm_info for new VMs
+        self.changed = {}     # name -> edited copy of an existing VM
+        self.conflicts = []   # (name, current address, imported address) left alone
+        self.records = 0
+        self.skipped = 0
+        # One pass up front, so matching by address stays O(1) per record
+        self.by_address = {}
+        for vm_name, vm_info in inventory.items():
+            self.by_address.setdefault(vm_info.ip, vm_name)
+
+    def add_all(self, records):
+        for name, record in records:
+            self.add(name, record)
+        return self
+
+    def add(self, name, record):
+        self.records += 1
+        name, ip = name.strip(), record["ip"].strip()
+        if not name or not ip:
+            self.skipped += 1
+            return
+        users = record["users"]
+        by_name = name in self.added or name in self.changed or name in self.inventory
+        target = name if by_name else self.by_address.get(ip)
+        if target is None:
+            entry = {"ip": ip, "users": list(dict.fromkeys(users)), "color": record.get("color", self.color)}
+            if "port" in record:
+                entry["port"] = record["port"]
+            if record.get("tags"):
+                entry["tags"] = list(record["tags"])
+            if "identity_file" in record:
+                entry["identity_file"] = record["identity_file"]
+            self.added[name] = entry
+            self.by_address.setdefault(ip, name)
+            return
+
+        entry = self.added.get(target) or self.changed.get(target) or self.inventory[target].to_dict()
+        edited = False
+        for user in users:
+            if user not in entry["users"]:
+                entry["users"].append(user)
+                edited = True
+        for tag in record.get("tags", ()):
+            if tag not in entry.setdefault("tags", []):
+                entry["tags"].append(tag)
+                edited = True
+        if by_name and entry["ip"] != ip:
+            if self.update:
+                entry["ip"] = ip
+                edited = True
+            else:
+                self.conflicts.append((target, entry["ip"], ip))
+        if self.update and by_name and record.get("port", 22) != entry.get("port", 22):
+            entry["port"] = record["port"] if "port" in record else entry.pop("port")
+            edited = True
+        if edited and target not in self.added:
+            self.changed[target] = entry
+
+    def fill_default_user(self):
+        # Only after every record is in, a later record may still name the VM's user
+        if self.default_user:
+            for entry in self.added.values():
+                if not entry["users"]:
+                    entry["users"].append(self.default_user)
+
+    def diff(self):
+        """Diff lines: + new VM, ~ changed VM, ! address conflict left as it is"""
+        self.fill_default_user()
+        for name, entry in self.added.items():
+            port = f":{entry['port']}" if "port" in entry else ""
+            tags = f" {YELLOW}{','.join(entry['tags'])}{RESET}" if "tags" in entry else ""
+            yield f"{GREEN}+ {name}{RESET} {entry['ip']}{port} {GRAY}{','.join(entry['users'])}{RESET}{tags}"
+        for name, entry in self.changed.items():
+            current = self.inventory[name]
+            parts = []
+            new_users = [user for user in entry["users"] if user not in current.users]
+            if new_users:
+                parts.append(f"users +{','.join(new_users)}")
+            new_tags = [tag for tag in entry.get("tags", ()) if tag not in current.tags]
+            if new_tags:
+                parts.append(f"tags +{','.join(new_tags)}")
+            if entry["ip"] != current.ip:
+                parts.append(f"ip {current.ip} → {entry['ip']}")
+            if entry.get("port", 22) != current.port:
+                parts.append(f"port {current.port} → {entry.get('port', 22)}")
+            yield f"{YELLOW}~ {name}{RESET} {'; '.join(parts)}"
+        for name, current, imported in self.conflicts:
+            yield f"{RED}! {name}{RESET} keeps {current}, import says {imported} (use --update to replace)"
+
+    def summary(self):
+        return (f"{len(self.added)} new, {len(self.changed)} updated, {len(self.conflicts)} conflict(s), "
+                f"{self.skipped} skipped, from {self.records} record(s)")
+
+    def apply(self):
+        """Write every staged change at once, returns True when saved"""
+        self.fill_default_user()
+        items = [(vm_name, VM.from_dict(vm_name, entry))
+                 for vm_name, entry in itertools.chain(self.added.items(), self.changed.items())]
+        for vm_name, vm_info in items:
+            self.inventory[vm_name] = vm_info
+        return commit_vms(items) if items else True
+
+# Menu
+async def import_menu():
+    """Bulk import VMs from an ssh config, known_hosts, CSV or Ansible inventory"""
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              IMPORT VMS                     {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    
+    print(f"{GRAY}ℹ Reads OpenSSH config, known_hosts, CSV and Ansible INI files{RESET}")
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+    
+    path = (await ainput(f"{CYAN}Source file (default: ~/.ssh/config): {WHITE}")).strip() or "~/.ssh/config"
+    print(f"{RESET}", end="")
+    if path.lower() in ['cancel', 'exit', 'quit']:
+        return
+    
+    import_format = detect_import_format(path)
+    if import_format is None:
+        formats = list(IMPORT_PARSERS)
+        choice = await arrow_menu(["Cancel"] + formats, f"{CYAN}=== Format of {path} ==={RESET}")
+        if choice <= 0:
+            return
+        import_format = formats[choice - 1]
+        clear_screen()
+    
+    start = time.perf_counter()
+    try:
+        plan = ImportPlan(core.vms).add_all(read_import(path, import_format))
+    except (OSError, ValueError) as e:
+        print(f"\n{RED}✗ Cannot import {path}: {e}{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    
+    print(f"\n{CYAN}Dry run ({import_format}, {(time.perf_counter() - start) * 1000:.0f} ms):{RESET} {plan.summary()}\n")
+    total = len(plan.added) + len(plan.changed) + len(plan.conflicts)
+    for line in itertools.islice(plan.diff(), IMPORT_PREVIEW_LINES):
+        print(f"  {line}")
+    if total > IMPORT_PREVIEW_LINES:
+        print(f"  {GRAY}... and {total - IMPORT_PREVIEW_LINES} more{RESET}")
+    
+    if not plan.added and not plan.changed:
+        print(f"\n{YELLOW}ℹ Nothing new to import.{RESET}")
+    else:
+        confirm = (await ainput(f"\n{CYAN}Apply these changes? (y/n): {WHITE}")).strip().lower()
+        print(f"{RESET}", end="")
+        if confirm in ['y', 'yes']:
+            if plan.apply():
+                print(f"\n{GREEN}✓ Imported {len(plan.added)} new and updated {len(plan.changed)} VM(s)!{RESET}")
+        else:
+            print(f"\n{YELLOW}ℹ Import cancelled.{RESET}")
+    
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+# Command line
+def cli_import(args):
+    plan = ImportPlan(core.vms, update=args.update, default_user=args.user, color=args.color)
+    for path in args.paths:
+        try:
+            plan.add_all(read_import(path, args.format))
+        except OSError as e:
+            raise LookupError(f"Cannot read '{path}': {e.strerror}")
+        except ValueError as e:
+            raise LookupError(f"Cannot import '{path}': {e}")
+    out = sys.stdout if sys.stdout.isatty() else PlainWriter(sys.stdout)
+    if args.dry_run:
+        for line in plan.diff():
+            out.write(line + "\n")
+    out.write(plan.summary() + ("" if args.dry_run else ", saving") + "\n")
+    out.flush()
+    if args.dry_run:
+        return 0
+    return 0 if plan.apply() else 1
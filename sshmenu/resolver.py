@@ -0,0 +1,280 @@
+"""Cached background resolution of VM host names"""
+import os
+import json
+import re
+import time
+import atexit
+import threading
+from . import core
+from .core import GRAY, RED, RESET, YELLOW, menu_loop, select_vms
+
+# Host name resolution
+RESOLVE_CACHE_FILE = "vms_dns.json"
+RESOLVE_TTL = 300.0            # Seconds a resolved address counts as fresh
+RESOLVE_NEGATIVE_TTL = 60.0    # Seconds before a failed lookup is tried again
+RESOLVE_CONCURRENCY = 16       # Lookups in flight at once
+HOSTS_FILE = os.environ.get("SSH_MENU_HOSTS")   # hosts(5) style file used instead of DNS (testing, air-gapped setups)
+IPV4_LITERAL = re.compile(r"\d{1,3}(?:\.\d{1,3}){3}$")
+HOSTNAME_LABEL = re.compile(r"(?!-)[a-z0-9-]{1,63}(?<!-)$", re.IGNORECASE)
+
+def is_address(host):
+    """Cheap literal check for the hot paths, addresses are validated when they are entered"""
+    return ":" in host or IPV4_LITERAL.match(host) is not None
+
+def address_literal(host):
+    """The canonical form of an IPv4/IPv6 literal, None for anything else"""
+    import ipaddress
+    try:
+        return str(ipaddress.ip_address(host))
+    except ValueError:
+        return None
+
+def normalize_host(value):
+    """Validate a VM address (IPv4, IPv6 or DNS name) and return it in canonical form
+
+    Raises ValueError with a message meant for the prompt.
+    """
+    host = value.strip()
+    if host.startswith("[") and host.endswith("]"):
+        host = host[1:-1]   # [2001:db8::1] as written in URLs and ssh_config
+    literal = address_literal(host)
+    if literal is not None:
+        return literal
+    if ":" in host:
+        raise ValueError("Invalid IPv6 address")
+    if host.replace(".", "").isdigit():
+        raise ValueError("Invalid IPv4 address, use four parts of 0-255 (e.g. 192.168.1.100)")
+    name = host[:-1] if host.endswith(".") else host
+    if not name or len(name) > 253 or not all(HOSTNAME_LABEL.match(label) for label in name.split(".")):
+        raise ValueError("Not an IP address or host name (letters, digits, '-' and '.', e.g. db1.example.com)")
+    return name.lower()
+
+class HostResolver:
+    """Resolve VM host names in a background thread pool with a TTL cache
+
+    The cache is kept in RESOLVE_CACHE_FILE between runs, so the menu can
+    show last known addresses straight away. Expired entries keep being
+    shown, flagged as stale, while they are looked up again, and failed
+    lookups are remembered for RESOLVE_NEGATIVE_TTL so a dead name is not
+    retried on every tick. Literal addresses never go through the cache.
+    """
+
+    def __init__(self, path=RESOLVE_CACHE_FILE, ttl=RESOLVE_TTL, negative_ttl=RESOLVE_NEGATIVE_TTL,
+                 concurrency=RESOLVE_CONCURRENCY, hosts_file=HOSTS_FILE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.concurrency = concurrency
+        self.hosts_file = hosts_file
+        self.entries = {}     # name -> {"addresses", "resolved_at", "error", "failed_at"}, wall clock times
+        self.pending = set()
+        self.hosts = set()    # Names refresh() keeps resolved
+        self.lock = threading.Lock()
+        self.version = 0      # Bumped whenever a lookup finishes
+        self.dirty = False
+        self.queue = None
+        self.hosts_table = None    # (mtime, {name: [addresses]}) parsed from hosts_file
+        self.next_refresh = 0.0
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                entries = json.load(f).get("entries")
+        except (OSError, ValueError, AttributeError):
+            return
+        if isinstance(entries, dict):
+            self.entries = {
+                name: entry for name, entry in entries.items()
+                if isinstance(entry, dict) and isinstance(entry.get("addresses"), list)
+            }
+        atexit.register(self.save)
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            entries = dict(self.entries)
+        tmp_path = f"{self.path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def expired(self, entry, now):
+        if entry is None:
+            return True
+        if entry.get("error"):
+            return now - entry["failed_at"] >= self.negative_ttl
+        return now - entry["resolved_at"] >= self.ttl
+
+    def status(self, host):
+        """(address, state) where state is literal, fresh, stale, failed, pending or unknown
+
+        address is the last known one, also for stale and failed entries.
+        """
+        if is_address(host):
+            return host, "literal"
+        entry = self.entries.get(host)
+        if entry is None:
+            return None, "pending" if host in self.pending else "unknown"
+        address = entry["addresses"][0] if entry["addresses"] else None
+        if entry.get("error"):
+            return address, "failed"
+        if time.time() - entry["resolved_at"] >= self.ttl:
+            return address, "stale"
+        return address, "fresh"
+
+    def address(self, host):
+        """Best known address for host, the name itself until it has resolved"""
+        # Called for every VM on each probe refresh, literals simply have no entry
+        entry = self.entries.get(host)
+        return entry["addresses"][0] if entry is not None and entry["addresses"] else host
+
+    def refresh(self, hosts=None):
+        """Start looking up every tracked name whose entry is missing or expired"""
+        now = time.time()
+        with self.lock:
+            if hosts is not None:
+                self.hosts = {host for host in hosts if not is_address(host)}
+            due = [host for host in self.hosts
+                   if host not in self.pending and self.expired(self.entries.get(host), now)]
+            self.pending.update(due)
+            self.next_refresh = time.monotonic() + min(self.ttl, self.negative_ttl)
+        self.submit(due)
+        return len(due)
+
+    def request(self, hosts, force=False):
+        """Look up the given names now (on demand), skipping fresh ones unless forced"""
+        now = time.time()
+        with self.lock:
+            due = [host for host in dict.fromkeys(hosts)
+                   if not is_address(host) and host not in self.pending
+                   and (force or self.expired(self.entries.get(host), now))]
+            self.hosts.update(due)
+            self.pending.update(due)
+        self.submit(due)
+        return len(due)
+
+    def tick(self):
+        """Re-resolve expired names, called from the menu loop while idle"""
+        if time.monotonic() >= self.next_refresh:
+            self.refresh()
+
+    def wait(self, timeout=None):
+        """Block until no lookup is in flight, False when the timeout ran out first"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.pending:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def submit(self, hosts):
+        if not hosts:
+            return
+        if self.queue is None:
+            # Daemon workers: a slow lookup must never hold up exiting the menu
+            import queue
+            self.queue = queue.Queue()
+            for _ in range(self.concurrency):
+                threading.Thread(target=self.worker, name="resolver", daemon=True).start()
+        for host in hosts:
+            self.queue.put(host)
+
+    def worker(self):
+        while True:
+            self.resolve_one(self.queue.get())
+
+    def resolve_one(self, host):
+        try:
+            addresses, error = self.lookup(host), None
+        except (OSError, UnicodeError) as e:
+            addresses, error = [], getattr(e, "strerror", None) or str(e)
+        if not addresses and error is None:
+            error = "no addresses"
+        now = time.time()
+        with self.lock:
+            entry = dict(self.entries.get(host) or {"addresses": [], "resolved_at": None})
+            if error is None:
+                entry.update(addresses=addresses, resolved_at=now, error=None, failed_at=None)
+            else:
+                entry.update(error=error, failed_at=now)   # Last good addresses stay around, flagged
+            self.entries[host] = entry
+            self.pending.discard(host)
+            self.version += 1
+            self.dirty = True
+            idle = not self.pending
+        if idle:
+            self.save()
+        menu_loop.wake()
+
+    def lookup(self, host):
+        if self.hosts_file:
+            addresses = self.hosts_entries().get(host)
+            if not addresses:
+                raise OSError(f"not found in {self.hosts_file}")
+            return addresses
+        import socket
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(info[4][0] for info in infos))
+
+    def hosts_entries(self):
+        """name -> addresses from hosts_file, parsed again whenever it changes"""
+        try:
+            mtime = os.stat(self.hosts_file).st_mtime_ns
+        except OSError as e:
+            raise OSError(f"cannot read {self.hosts_file}: {e.strerror}")
+        table = self.hosts_table
+        if table is None or table[0] != mtime:
+            names = {}
+            with open(self.hosts_file, encoding="utf-8") as f:
+                for line in f:
+                    fields = line.split("#", 1)[0].split()
+                    address = address_literal(fields[0]) if len(fields) >= 2 else None
+                    if address is not None:
+                        for name in fields[1:]:
+                            names.setdefault(name.lower(), []).append(address)
+            table = self.hosts_table = (mtime, names)
+        return table[1]
+
+resolver = HostResolver()
+
+def resolution_note(host):
+    """Resolved address for host names in menu lines, empty for literal addresses"""
+    address, state = resolver.status(host)
+    if state == "literal":
+        return ""
+    if state == "fresh":
+        return f" {GRAY}→ {address}{RESET}"
+    if state == "stale":
+        return f" {GRAY}→ {YELLOW}{address} (stale){RESET}"
+    if state == "failed":
+        if address:
+            return f" {GRAY}→ {YELLOW}{address} {RED}(lookup failed){RESET}"
+        return f" {RED}✗ unresolved{RESET}"
+    return f" {GRAY}→ ...{RESET}"
+
+# Command line
+def cli_resolve(args):
+    vm_names = select_vms(args.targets) if args.targets else list(core.vms)
+    resolver.load()
+    resolver.request((core.vms[vm_name].ip for vm_name in vm_names), force=args.refresh)
+    resolver.wait()
+    resolver.save()
+    failed = False
+    for vm_name in vm_names:
+        host = core.vms[vm_name].ip
+        address, state = resolver.status(host)
+        entry = resolver.entries.get(host)
+        detail = entry["error"] if state == "failed" else ""
+        if state not in ("literal", "fresh") and entry is not None and entry.get("resolved_at"):
+            detail = f"{detail + ', ' if detail else ''}resolved {time.time() - entry['resolved_at']:.0f}s ago"
+        failed = failed or address is None
+        print(f"{vm_name}\t{host}\t{address or '-'}\t{state}" + (f"\t{detail}" if detail else ""))
+    return 1 if failed else 0
@@ -0,0 +1,255 @@
+"""SQLite inventory backend, imported only when SSH_MENU_BACKEND=sqlite selects it"""
+import os
+import json
+import time
+import contextlib
+import collections.abc
+from .core import CYAN, GRAY, RED, RESET, VM, get_default_config, load_stats, timed
+
+SQLITE_FILE = "vms.db"
+ROW_CACHE_SIZE = 4096   # Decoded VM rows kept in memory by the SQLite backend
+PAGE_SIZE = 512         # Rows per query when walking the whole SQLite inventory
+
+class SqliteBackend:
+    """vms.db: indexed SQLite store, rows are read on demand and each edit is one transaction"""
+
+    name = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS vms (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            ip TEXT NOT NULL,
+            color TEXT NOT NULL DEFAULT 'CYAN',
+            extra TEXT NOT NULL DEFAULT '{}'
+        );
+        CREATE INDEX IF NOT EXISTS vms_ip ON vms (ip);
+        CREATE TABLE IF NOT EXISTS users (
+            vm_id INTEGER NOT NULL REFERENCES vms (id) ON DELETE CASCADE,
+            position INTEGER NOT NULL,
+            name TEXT NOT NULL,
+            PRIMARY KEY (vm_id, position)
+        );
+        CREATE INDEX IF NOT EXISTS users_name ON users (name);
+    """
+
+    def __init__(self, path=SQLITE_FILE):
+        self.path = path
+        self.conn = None
+        self.inventory = None
+        self.commits = 0
+        self.last_commit_ms = None
+        self.last_error = None
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self):
+        if self.conn is None:
+            import sqlite3  # Only the SQLite backend needs it
+            # Autocommit mode, edits open their own short transactions
+            self.conn = sqlite3.connect(self.path, isolation_level=None)
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.execute("PRAGMA synchronous = NORMAL")
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn.executescript(self.SCHEMA)
+        return self.conn
+
+    @contextlib.contextmanager
+    def transaction(self):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    @timed("load_config")
+    def load(self):
+        start = time.perf_counter()
+        load_stats.update(source="defaults", ms=None, cold_ms=None, entries=0)
+        if not self.exists():
+            print(f"{CYAN}ℹ Inventory database '{self.path}' not found. Creating with default settings.{RESET}")
+            self.replace(get_default_config())
+        self.inventory = SqliteInventory(self)
+        load_stats.update(source="SQLite", ms=(time.perf_counter() - start) * 1000,
+                          entries=len(self.inventory))
+        return self.inventory
+
+    @staticmethod
+    def decode(name, ip, color, extra, users):
+        if extra == "{}":
+            return VM(name, ip, users, color)
+        # The blob may have been edited by hand, so it gets the same checks as vms.json
+        data = json.loads(extra)
+        data.update(ip=ip, color=color, users=users)
+        return VM.from_dict(name, data)
+
+    def names(self):
+        return [name for (name,) in self.connect().execute("SELECT name FROM vms ORDER BY id")]
+
+    def fetch(self, vm_name):
+        conn = self.connect()
+        row = conn.execute("SELECT id, ip, color, extra FROM vms WHERE name = ?", (vm_name,)).fetchone()
+        if row is None:
+            return None
+        users = [name for (name,) in conn.execute(
+            "SELECT name FROM users WHERE vm_id = ? ORDER BY position", (row[0],))]
+        return self.decode(vm_name, row[1], row[2], row[3], users)
+
+    def pages(self):
+        """Yield (name, vm_info) for every VM in insertion order, PAGE_SIZE rows per query"""
+        conn = self.connect()
+        last_id = 0
+        while True:
+            rows = conn.execute("SELECT id, name, ip, color, extra FROM vms WHERE id > ? ORDER BY id LIMIT ?",
+                                (last_id, PAGE_SIZE)).fetchall()
+            if not rows:
+                return
+            users = {}
+            for vm_id, name in conn.execute(
+                    "SELECT vm_id, name FROM users WHERE vm_id BETWEEN ? AND ? ORDER BY vm_id, position",
+                    (rows[0][0], rows[-1][0])):
+                users.setdefault(vm_id, []).append(name)
+            for vm_id, name, ip, color, extra in rows:
+                yield name, self.decode(name, ip, color, extra, users.get(vm_id, []))
+            last_id = rows[-1][0]
+
+    def write(self, conn, vm_name, vm_info, fresh=False):
+        extra = dict(vm_info.extra or {})
+        if vm_info.port != 22:
+            extra["port"] = vm_info.port
+        if vm_info.tags:
+            extra["tags"] = list(vm_info.tags)
+        if vm_info.identity_file:
+            extra["identity_file"] = vm_info.identity_file
+        if vm_info.ssh_args:
+            extra["ssh_args"] = list(vm_info.ssh_args)
+        if vm_info.forwards:
+            extra["forwards"] = list(vm_info.forwards)
+        values = (vm_name, vm_info.ip, vm_info.color,
+                  json.dumps(extra, ensure_ascii=False) if extra else "{}")
+        if fresh:
+            vm_id = conn.execute("INSERT INTO vms (name, ip, color, extra) VALUES (?, ?, ?, ?)", values).lastrowid
+        else:
+            # Upsert keeps the row id, so an edited VM keeps its place in the listing
+            conn.execute("INSERT INTO vms (name, ip, color, extra) VALUES (?, ?, ?, ?) "
+                         "ON CONFLICT (name) DO UPDATE SET ip = excluded.ip, color = excluded.color, "
+                         "extra = excluded.extra", values)
+            vm_id = conn.execute("SELECT id FROM vms WHERE name = ?", (vm_name,)).fetchone()[0]
+            conn.execute("DELETE FROM users WHERE vm_id = ?", (vm_id,))
+        conn.executemany("INSERT INTO users (vm_id, position, name) VALUES (?, ?, ?)",
+                         [(vm_id, position, user) for position, user in enumerate(vm_info.users)])
+
+    def commit(self, vm_name, vm_info):
+        """Write (or delete, when vm_info is None) a single VM in its own transaction"""
+        # Menus must keep running, a failure is shown in the admin menu
+        self.commit_batch([(vm_name, vm_info)], verbose=False)
+
+    @timed("save_config")
+    def commit_batch(self, items, verbose=True):
+        """Write many VMs in one transaction, returns True when saved"""
+        import sqlite3
+        start = time.perf_counter()
+        try:
+            with self.transaction() as conn:
+                for vm_name, vm_info in items:
+                    if vm_info is None:
+                        conn.execute("DELETE FROM vms WHERE name = ?", (vm_name,))
+                    else:
+                        self.write(conn, vm_name, vm_info)
+        except sqlite3.Error as e:
+            self.last_error = str(e)
+            if verbose:
+                print(f"{RED}✗ Error: Cannot write to {self.path}. {e}{RESET}")
+            return False
+        self.last_error = None
+        self.commits += 1
+        self.last_commit_ms = (time.perf_counter() - start) * 1000
+        return True
+
+    def vms_at(self, ip):
+        return [name for (name,) in self.connect().execute(
+            "SELECT name FROM vms WHERE ip = ? ORDER BY id", (ip,))]
+
+    def vms_for_user(self, username):
+        return [name for (name,) in self.connect().execute(
+            "SELECT vms.name FROM users JOIN vms ON vms.id = users.vm_id "
+            "WHERE users.name = ? GROUP BY vms.id ORDER BY vms.id", (username,))]
+
+    def replace(self, inventory):
+        """Overwrite the whole store in one transaction, used as a migration target"""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM users")
+            conn.execute("DELETE FROM vms")
+            for vm_name, vm_info in inventory.items():
+                self.write(conn, vm_name, vm_info, fresh=True)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def summary(self):
+        if self.last_error:
+            return f"{RED}✗ last edit not saved: {self.last_error}{RESET}"
+        if self.last_commit_ms is not None:
+            return f"{GRAY}last commit {self.last_commit_ms:.1f} ms{RESET}"
+        return ""
+
+class SqliteInventory(collections.abc.MutableMapping):
+    """Dict-like view of the SQLite inventory
+
+    Names are listed once up front; VM rows are decoded on first access and
+    kept in a bounded LRU cache, so menus only read the rows they display.
+    As with the JSON inventory, assignments and in-place edits reach the
+    store through commit_vm().
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.order = dict.fromkeys(store.names())
+        self.rows = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.order)
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def __contains__(self, vm_name):
+        return vm_name in self.order
+
+    def __getitem__(self, vm_name):
+        vm_info = self.rows.get(vm_name)
+        if vm_info is not None:
+            self.rows.move_to_end(vm_name)
+            return vm_info
+        vm_info = self.store.fetch(vm_name) if vm_name in self.order else None
+        if vm_info is None:
+            raise KeyError(vm_name)
+        self.remember(vm_name, vm_info)
+        return vm_info
+
+    def __setitem__(self, vm_name, vm_info):
+        self.order.setdefault(vm_name)
+        self.remember(vm_name, vm_info)
+
+    def __delitem__(self, vm_name):
+        del self.order[vm_name]
+        self.rows.pop(vm_name, None)
+
+    def remember(self, vm_name, vm_info):
+        self.rows[vm_name] = vm_info
+        self.rows.move_to_end(vm_name)
+        if len(self.rows) > ROW_CACHE_SIZE:
+            self.rows.popitem(last=False)
+
+    def items(self):
+        """Walk every VM a page at a time instead of one query per row"""
+        for vm_name, vm_info in self.store.pages():
+            yield vm_name, self.rows.get(vm_name, vm_info)
+
+    def values(self):
+        return (vm_info for _, vm_info in self.items())
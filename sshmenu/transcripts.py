@@ -0,0 +1,455 @@
+"""Session transcripts written by the record launcher"""
+import os
+import sys
+import json
+import re
+import time
+import signal
+import fnmatch
+import itertools
+import subprocess
+import bisect
+from .core import (BLUE, CYAN, GRAY, GREEN, RED, RESET, WHITE, YELLOW, LazyOptions, ainput,
+                   arrow_menu, clear_screen, menu_loop, screen)
+from .transfer import format_size
+
+# Session transcripts
+TRANSCRIPT_DIR = os.environ.get("SSH_MENU_TRANSCRIPTS", "vms_transcripts")
+TRANSCRIPT_INDEX = "index.jsonl"
+TRANSCRIPT_CHUNK = 64 * 1024                  # Raw bytes per compressed chunk, the memory bound while recording
+TRANSCRIPT_FLUSH_INTERVAL = 5.0               # Seconds before a partial chunk is written anyway
+TRANSCRIPT_SEGMENT_SIZE = 32 * 1024 * 1024    # Compressed bytes per segment file before rotating
+TRANSCRIPT_MAX_BYTES = 1024 ** 3              # Oldest segments are deleted beyond this
+TRANSCRIPT_GREP_LIMIT = 200                   # Matches shown by a transcript search
+TERMINAL_CONTROL = re.compile(rb"\x1b(?:\[[0-?]*[ -/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[()][0-9A-Za-z]|[@-Z\\-_=>])")
+
+def timing_name(segment):
+    return segment[:-len(".gz")] + ".timing.gz"
+
+def transcript_text(line):
+    """Readable text of one recorded line: control sequences dropped, carriage-return overwrites applied"""
+    line = TERMINAL_CONTROL.sub(b"", line).rstrip(b"\r")
+    return line.rsplit(b"\r", 1)[-1].decode("utf-8", errors="replace")
+
+class TranscriptWriter:
+    """Output of one recorded session, written as compressed chunks of at most ~TRANSCRIPT_CHUNK bytes
+
+    Timing is kept in scriptreplay's 'delay bytes' form, one line per
+    read, so a viewer can seek to a point in time inside a chunk.
+    Recording problems (a full disk) stop the recording, never the session.
+    """
+
+    def __init__(self, store, session_id):
+        self.store = store
+        self.id = session_id
+        self.buffer = bytearray()
+        self.timing = []
+        self.last = self.chunk_start = time.time()
+        self.bytes = 0
+        self.error = None
+
+    def write(self, data):
+        if self.error is not None:
+            return
+        now = time.time()
+        self.timing.append(f"{now - self.last:.6f} {len(data)}\n")
+        self.last = now
+        self.buffer += data
+        self.bytes += len(data)
+        if len(self.buffer) >= TRANSCRIPT_CHUNK:
+            self.flush()
+
+    def tick(self):
+        if self.buffer and time.time() - self.chunk_start >= TRANSCRIPT_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer or self.error is not None:
+            return
+        try:
+            self.store.write_chunk(self.id, bytes(self.buffer), "".join(self.timing).encode("ascii"),
+                                   self.chunk_start, self.last)
+        except OSError as e:
+            self.error = str(e)
+        self.buffer.clear()
+        self.timing.clear()
+        self.chunk_start = self.last
+
+    def close(self, returncode):
+        self.flush()
+        try:
+            self.store.append_index({"type": "end", "session": self.id, "end": round(time.time(), 3),
+                                     "returncode": returncode, "bytes": self.bytes})
+        except OSError as e:
+            self.error = self.error or str(e)
+
+class TranscriptStore:
+    """Rotating, compressed session transcripts with a sidecar index
+
+    Output goes to seg-*.gz segment files as independent gzip members, so
+    a segment is also readable with zcat, and timing to a .timing.gz
+    sibling. index.jsonl gets one line per session start and end and per
+    chunk (segment, byte offsets, raw size, time span); viewers read the
+    index and decompress only the chunks they need. Each process writes
+    its own segments and index lines are single O_APPEND writes, so
+    several menus can record at once. Segments rotate at
+    TRANSCRIPT_SEGMENT_SIZE and the oldest are deleted once all of them
+    together exceed TRANSCRIPT_MAX_BYTES.
+    """
+
+    def __init__(self, directory=TRANSCRIPT_DIR):
+        self.directory = directory
+        self.segment = None
+        self.segment_size = 0
+        self.counter = 0
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open_session(self, vm_name, username, host):
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)   # Transcripts can hold secrets
+        self.counter += 1
+        session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.counter}"
+        self.append_index({"type": "start", "session": session_id, "vm": vm_name, "user": username,
+                           "host": host, "start": round(time.time(), 3)})
+        return TranscriptWriter(self, session_id)
+
+    def append(self, name, data):
+        """Append to a file in the transcript directory, returns the offset the data starts at"""
+        fd = os.open(self.path(name), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            offset = os.lseek(fd, 0, os.SEEK_END)
+            os.write(fd, data)
+        finally:
+            os.close(fd)
+        return offset
+
+    def append_index(self, record):
+        self.append(TRANSCRIPT_INDEX, (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    def write_chunk(self, session_id, data, timing, start, end):
+        import gzip
+        if self.segment is None or self.segment_size >= TRANSCRIPT_SEGMENT_SIZE:
+            self.rotate()
+        compressed = gzip.compress(data, compresslevel=6)
+        compressed_timing = gzip.compress(timing, compresslevel=6)
+        offset = self.append(self.segment, compressed)
+        timing_offset = self.append(timing_name(self.segment), compressed_timing)
+        self.segment_size = offset + len(compressed)
+        self.append_index({"type": "chunk", "session": session_id, "segment": self.segment,
+                           "offset": offset, "length": len(compressed), "raw": len(data),
+                           "timing_offset": timing_offset, "timing_length": len(compressed_timing),
+                           "start": round(start, 6), "end": round(end, 6)})
+
+    def rotate(self):
+        self.counter += 1
+        self.segment = f"seg-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{self.counter:05d}.gz"   # Name order is age order
+        self.segment_size = 0
+        self.prune()
+
+    def segments(self):
+        """Segment file names, oldest first"""
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(name for name in names
+                      if name.startswith("seg-") and name.endswith(".gz") and not name.endswith(".timing.gz"))
+
+    def size(self, names=None):
+        total = 0
+        for name in self.segments() if names is None else names:
+            for path in (self.path(name), self.path(timing_name(name))):
+                try:
+                    total += os.path.getsize(path)
+                except OSError:
+                    pass
+        return total
+
+    def prune(self):
+        """Delete the oldest segments until the transcripts fit in TRANSCRIPT_MAX_BYTES"""
+        names = self.segments()
+        total = self.size(names)
+        for name in names:
+            if total <= TRANSCRIPT_MAX_BYTES:
+                break
+            if name == self.segment:
+                continue
+            total -= self.size([name])
+            for path in (self.path(name), self.path(timing_name(name))):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+
+    def sessions(self):
+        """Recorded sessions from the index, newest first, each with the chunks still on disk"""
+        try:
+            f = open(self.path(TRANSCRIPT_INDEX), "rb")
+        except OSError:
+            return []
+        present = set(self.segments())
+        sessions = {}
+        with f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    kind, session_id = record["type"], record["session"]
+                except (ValueError, KeyError, TypeError):
+                    continue  # Torn last line after a crash
+                if kind == "start":
+                    sessions[session_id] = dict(record, chunks=[], end=None, returncode=None, raw=0, pruned=False)
+                    continue
+                session = sessions.get(session_id)
+                if session is None:
+                    continue
+                if kind == "chunk":
+                    if record["segment"] in present:
+                        session["chunks"].append(record)
+                        session["raw"] += record["raw"]
+                    else:
+                        session["pruned"] = True
+                elif kind == "end":
+                    session["end"] = record.get("end")
+                    session["returncode"] = record.get("returncode")
+        kept = [session for session in sessions.values() if session["chunks"] or not session["pruned"]]
+        return sorted(kept, key=lambda session: session["start"], reverse=True)
+
+    def read(self, chunk, timing=False):
+        """Decompress one chunk (or its timing lines) without touching the rest of the segment"""
+        import gzip
+        name = timing_name(chunk["segment"]) if timing else chunk["segment"]
+        offset, length = (chunk["timing_offset"], chunk["timing_length"]) if timing else (chunk["offset"], chunk["length"])
+        with open(self.path(name), "rb") as f:
+            f.seek(offset)
+            return gzip.decompress(f.read(length))
+
+    def clock(self, chunk):
+        """(end offsets, times) of every read in a chunk, from its timing lines"""
+        ends, times = [], []
+        position, when = 0, chunk["start"]
+        for line in self.read(chunk, timing=True).split(b"\n"):
+            if line:
+                delay, size = line.split()
+                position += int(size)
+                when += float(delay)
+                ends.append(position)
+                times.append(when)
+        return ends, times
+
+    def output(self, session, at=0.0):
+        """Yield the session output chunk by chunk, starting at `at` seconds into the session"""
+        when = session["start"] + at
+        first = True
+        for chunk in session["chunks"]:
+            if chunk["end"] < when:
+                continue  # Skipped without decompressing
+            data = self.read(chunk)
+            if first and at > 0:
+                ends, times = self.clock(chunk)
+                index = bisect.bisect_left(times, when)
+                data = data[ends[index - 1] if index else 0:]
+            first = False
+            yield data
+
+    def grep(self, sessions, pattern):
+        """Yield (session, time, text) for every output line matching the compiled pattern
+
+        Chunks are decompressed one at a time, so memory stays flat however
+        large the transcripts are.
+        """
+        for session in sessions:
+            carry = b""
+            for chunk in session["chunks"]:
+                data = self.read(chunk)
+                clock = None
+                position = -len(carry)   # Offsets are counted in this chunk's bytes
+                lines = (carry + data).split(b"\n")
+                carry = lines.pop()
+                if len(carry) > TRANSCRIPT_CHUNK:
+                    lines.append(carry)  # Output without newlines, searched as it is
+                    carry = b""
+                for line in lines:
+                    position += len(line) + 1
+                    text = transcript_text(line)
+                    if pattern.search(text):
+                        if clock is None:
+                            clock = self.clock(chunk)
+                        ends, times = clock
+                        index = min(bisect.bisect_left(ends, max(position, 1)), len(times) - 1)
+                        yield session, times[index] if times else chunk["start"], text
+            if carry and pattern.search(transcript_text(carry)):
+                yield session, session["chunks"][-1]["end"], transcript_text(carry)
+
+transcripts = TranscriptStore()
+
+# Menus
+def format_duration(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h{seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m{seconds % 60:02d}s"
+    return f"{seconds}s"
+
+def parse_offset(text):
+    """'90', '1:30' or '1:02:30' -> seconds into a session"""
+    seconds = 0.0
+    for part in text.split(":"):
+        seconds = seconds * 60 + float(part)
+    if seconds < 0:
+        raise ValueError(text)
+    return seconds
+
+def transcript_row(session):
+    when = time.strftime("%Y-%m-%d %H:%M", time.localtime(session["start"]))
+    if session["end"] is not None:
+        code = session["returncode"]
+        status = f"{GREEN}exit 0{RESET}" if code == 0 else f"{RED}exit {code}{RESET}"
+        length = format_duration(session["end"] - session["start"])
+    else:
+        status = f"{YELLOW}running or cut off{RESET}"
+        length = "-"
+    return (f"{WHITE}{when}{RESET}  {CYAN}{session['vm']}{RESET} {GRAY}{session['user']}@{session['host']}{RESET}"
+            f"  {length}  {format_size(session['raw'])}  {status}")
+
+def transcript_matches(sessions, query):
+    """Sessions whose VM, user or host contain the query, for the viewer's '/' filter"""
+    query = query.lower()
+    return [i for i, session in enumerate(sessions)
+            if query in f"{session['vm']} {session['user']}@{session['host']}".lower()]
+
+def page_output(chunks):
+    """Stream output through $PAGER (less -R by default) a chunk at a time"""
+    import shlex
+    command = os.environ.get("PAGER") or ("more" if os.name == 'nt' else "less -R")
+    try:
+        proc = subprocess.Popen(shlex.split(command), stdin=subprocess.PIPE)
+    except (OSError, ValueError):
+        for data in chunks:
+            sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+        input(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    try:
+        for data in chunks:
+            proc.stdin.write(data)
+        proc.stdin.close()
+    except (BrokenPipeError, OSError):
+        pass  # The pager was closed before the end
+    proc.wait()
+
+async def view_transcript(session, at=0.0):
+    # Ctrl-C belongs to the pager while it runs
+    previous = signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        clear_screen()
+        await menu_loop.run_blocking(page_output, transcripts.output(session, at))
+    finally:
+        signal.signal(signal.SIGINT, previous)
+        screen.invalidate()
+
+async def grep_transcripts(sessions, title):
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              SEARCH TRANSCRIPTS             {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    print(f"{CYAN}Searching:{RESET} {WHITE}{title}{RESET}")
+    print(f"{GRAY}ℹ Regular expression, matched against each output line without colors{RESET}\n")
+    pattern = (await ainput(f"{CYAN}Pattern: {WHITE}")).strip()
+    print(f"{RESET}", end="")
+    if not pattern:
+        return
+    try:
+        compiled = re.compile(pattern)
+    except re.error as e:
+        print(f"{RED}✗ Invalid pattern: {e}{RESET}")
+        await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+        return
+    start = time.perf_counter()
+    matches = itertools.islice(transcripts.grep(sessions, compiled), TRANSCRIPT_GREP_LIMIT + 1)
+    found = await menu_loop.run_blocking(list, matches)
+    print()
+    for session, when, text in found[:TRANSCRIPT_GREP_LIMIT]:
+        stamp = time.strftime("%m-%d %H:%M:%S", time.localtime(when))
+        print(f"{GRAY}{stamp} +{format_duration(when - session['start'])}{RESET} {CYAN}{session['vm']}{RESET} {text}")
+    if not found:
+        print(f"{YELLOW}ℹ No matches.{RESET}")
+    elif len(found) > TRANSCRIPT_GREP_LIMIT:
+        print(f"{GRAY}... stopped after {TRANSCRIPT_GREP_LIMIT} matches, narrow the pattern or the sessions{RESET}")
+    print(f"{GRAY}({(time.perf_counter() - start) * 1000:.0f} ms){RESET}")
+    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+
+async def transcripts_menu():
+    """Recorded sessions, newest first: view from any point in time and search their output"""
+    while True:
+        sessions = await menu_loop.run_blocking(transcripts.sessions)
+        options = LazyOptions(sessions, transcript_row, head=["Back", "Search all transcripts"])
+        title = (f"{YELLOW}=== SESSION TRANSCRIPTS ({len(sessions)}, "
+                 f"{format_size(transcripts.size())} on disk) ==={RESET}")
+        selection = await arrow_menu(options, title, search=lambda query: [i + 2 for i in transcript_matches(sessions, query)])
+        if selection == -1 or selection == 0:
+            return
+        if selection == 1:
+            await grep_transcripts(sessions, f"{len(sessions)} session(s)")
+            continue
+        session = sessions[selection - 2]
+        while True:
+            choice = await arrow_menu(["Back", "View from the start", "View from a point in time", "Search this session"],
+                                      f"{CYAN}=== {session['vm']} {session['user']}@{session['host']} "
+                                      f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(session['start']))} ==={RESET}")
+            if choice <= 0:
+                break
+            elif choice == 1:
+                await view_transcript(session)
+            elif choice == 2:
+                answer = (await ainput(f"{CYAN}Start at (seconds, mm:ss or hh:mm:ss into the session): {WHITE}")).strip()
+                print(f"{RESET}", end="")
+                try:
+                    await view_transcript(session, parse_offset(answer) if answer else 0.0)
+                except ValueError:
+                    print(f"{RED}✗ Use seconds, mm:ss or hh:mm:ss{RESET}")
+                    await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            else:
+                await grep_transcripts([session], f"{session['vm']} {session['user']}@{session['host']}")
+
+# Command line
+def cli_transcripts(args):
+    sessions = transcripts.sessions()
+    if args.targets:
+        sessions = [session for session in sessions
+                    if any(fnmatch.fnmatch(session["vm"].lower(), pattern.lower()) for pattern in args.targets)]
+    if args.show:
+        matches = [session for session in sessions if session["session"].startswith(args.show)]
+        exact = [session for session in matches if session["session"] == args.show]
+        if len(exact or matches) != 1:
+            raise LookupError(f"No single recorded session matches '{args.show}' ({len(matches)} found)")
+        try:
+            at = parse_offset(args.at) if args.at else 0.0
+        except ValueError:
+            raise LookupError(f"Invalid --at '{args.at}', use seconds, mm:ss or hh:mm:ss")
+        try:
+            for data in transcripts.output((exact or matches)[0], at):
+                sys.stdout.buffer.write(data)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            pass
+        return 0
+    if args.grep:
+        try:
+            pattern = re.compile(args.grep)
+        except re.error as e:
+            raise LookupError(f"Invalid pattern: {e}")
+        found = False
+        for session, when, text in transcripts.grep(sessions, pattern):
+            found = True
+            stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(when))
+            print(f"{session['session']}\t{stamp}\t{session['vm']}\t{text}")
+        return 0 if found else 1
+    for session in sessions:
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session["start"]))
+        length = "-" if session["end"] is None else format_duration(session["end"] - session["start"])
+        code = "-" if session["returncode"] is None else session["returncode"]
+        print(f"{session['session']}\t{started}\t{length}\t{session['vm']}\t"
+              f"{session['user']}@{session['host']}\t{session['raw']}\t{code}")
+    return 0
@@ -0,0 +1,443 @@
+"""Push a file to many VMs, or pull one from each, in parallel"""
+import os
+import sys
+import time
+import contextlib
+import collections
+import hashlib
+import subprocess
+import threading
+from . import core
+from .core import (BLUE, CYAN, ERASE_LINE, GRAY, GREEN, RED, RESET, TRANSFER_CONCURRENCY,
+                   TRANSFER_RETRIES, WHITE, YELLOW, LazyOptions, PlainWriter, ainput, arrow_menu,
+                   clear_screen, menu_loop, select_vms, ssh_command_args, vm_label, vm_search)
+from .fanout import fanout_targets
+
+# Parallel file transfer
+# Files are streamed through the same ssh command line sessions use (pooled
+# master, port, identity, extra args), so each host costs one handshake and
+# every byte passes through our hands, which gives exact progress.
+TRANSFER_RETRY_DELAY = 2.0    # Seconds before the first retry, doubled after each
+TRANSFER_CHUNK = 256 * 1024
+TRANSFER_QUERY_TIMEOUT = 30.0
+SSH_CONNECTION_FAILED = 255   # ssh's own exit status when the remote command never ran
+
+class TransferFailed(Exception):
+    """One transfer attempt failed; transient failures are retried"""
+
+    def __init__(self, message, transient=False):
+        super().__init__(message)
+        self.transient = transient
+
+def format_size(count):
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(count) < 1024 or unit == "GB":
+            return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+        count /= 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(TRANSFER_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def remote_path_arg(path):
+    """Quote a remote path for the remote shell, keeping a leading ~/ expandable"""
+    import shlex
+    if path == "~":
+        return '"$HOME"'
+    if path.startswith("~/"):
+        return '"$HOME"/' + shlex.quote(path[2:])
+    return shlex.quote(path)
+
+def remote_stat_command(path):
+    """Remote size and sha256 of a file, or 'missing' (sha256sum on Linux, shasum on BSD/macOS)"""
+    quoted = remote_path_arg(path)
+    return (f"if [ -f {quoted} ]; then wc -c < {quoted}; "
+            f"{{ sha256sum || shasum -a 256; }} < {quoted} 2>/dev/null; else echo missing; fi")
+
+def remote_push_command(path, mode):
+    """Write stdin next to the target and rename it into place, then print the new checksum"""
+    import posixpath
+    quoted = remote_path_arg(path)
+    part = remote_path_arg(path + ".ssh-menu-part")
+    directory = remote_path_arg(posixpath.dirname(path) or ".")
+    return (f"mkdir -p {directory} && cat > {part} && chmod {mode:o} {part} && mv -f {part} {quoted} && "
+            f"{{ sha256sum || shasum -a 256; }} < {quoted} 2>/dev/null")
+
+def ssh_transfer_args(username, vm_info, command):
+    # Batch mode: a password prompt would block the whole transfer
+    args = ssh_command_args(username, vm_info)
+    args[1:1] = ["-T", "-o", "BatchMode=yes", "-o", "ConnectTimeout=10",
+                 "-o", "ServerAliveInterval=15", "-o", "ServerAliveCountMax=3"]
+    args.append(command)
+    return args
+
+def ssh_failure(returncode, stderr):
+    lines = stderr.decode("utf-8", errors="replace").strip().splitlines()
+    message = lines[-1][:200] if lines else f"ssh exited with {returncode}"
+    return TransferFailed(message, transient=returncode == SSH_CONNECTION_FAILED)
+
+def path_component(name):
+    """name made safe as a single directory entry: no separators, never '.' or '..'"""
+    for sep in {"/", os.sep, os.altsep} - {None}:
+        name = name.replace(sep, "_")
+    return "_" + name if name in ("", ".", "..") else name
+
+class TransferJob:
+    """What to copy: one local file pushed to every host, or one remote file pulled from each"""
+
+    def __init__(self, direction, source, dest, skip_unchanged=True):
+        self.direction = direction
+        self.source = source
+        self.dest = dest
+        self.skip_unchanged = skip_unchanged
+        self.size = 0
+        self.digest = None
+        self.mode = 0o644
+
+    @classmethod
+    def push(cls, local_path, remote_path, skip_unchanged=True):
+        """Hash the local file once up front, raises OSError when it cannot be read"""
+        local_path = os.path.expanduser(local_path)
+        if not remote_path or remote_path.endswith("/"):
+            remote_path = (remote_path or "~/") + os.path.basename(local_path)
+        job = cls("push", local_path, remote_path, skip_unchanged)
+        stat = os.stat(local_path)
+        if not os.path.isfile(local_path):
+            raise IsADirectoryError(f"'{local_path}' is not a regular file")
+        job.size = stat.st_size
+        job.mode = stat.st_mode & 0o777
+        job.digest = file_sha256(local_path)
+        return job
+
+    @classmethod
+    def pull(cls, remote_path, local_dir=".", skip_unchanged=True):
+        return cls("pull", remote_path, os.path.expanduser(local_dir or "."), skip_unchanged)
+
+    def local_copy(self, vm_name):
+        """Pulled files land in <dest>/<vm>/<name>, so hosts never overwrite each other"""
+        import posixpath
+        name = posixpath.basename(self.source)
+        if name in ("", ".", ".."):
+            raise TransferFailed(f"{self.source}: not a file name")
+        directory = os.path.join(self.dest, path_component(vm_name))
+        if os.path.dirname(os.path.realpath(directory)) != os.path.realpath(self.dest):
+            raise TransferFailed(f"{vm_name}: pulled file would land outside {self.dest}")
+        return os.path.join(directory, name)
+
+class TransferProgress:
+    """Aggregate byte and host counters shared by the transfer workers"""
+
+    def __init__(self, hosts, total=0):
+        self.lock = threading.Lock()
+        self.hosts = hosts
+        self.finished = 0
+        self.total = total
+        self.done = 0
+        self.start = time.monotonic()
+
+    def expect(self, count):
+        with self.lock:
+            self.total += count
+
+    def add(self, count):
+        with self.lock:
+            self.done += count
+
+    def host_done(self):
+        with self.lock:
+            self.finished += 1
+
+    def line(self):
+        elapsed = max(time.monotonic() - self.start, 1e-6)
+        percent = self.done * 100 / self.total if self.total else 100
+        return (f"{CYAN}⇅ {self.finished}/{self.hosts} hosts  {format_size(self.done)} of "
+                f"{format_size(self.total)} ({percent:.0f}%)  {format_size(self.done / elapsed)}/s{RESET}")
+
+def remote_query(username, vm_info, path):
+    """(size, sha256) of a remote file, None when it does not exist"""
+    try:
+        done = subprocess.run(ssh_transfer_args(username, vm_info, remote_stat_command(path)),
+                              stdin=subprocess.DEVNULL, capture_output=True, timeout=TRANSFER_QUERY_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        raise TransferFailed("timed out reading the remote checksum", transient=True)
+    if done.returncode != 0:
+        raise ssh_failure(done.returncode, done.stderr)
+    fields = done.stdout.decode("utf-8", errors="replace").split()
+    if fields[:1] == ["missing"]:
+        return None
+    try:
+        size = int(fields[0])
+    except (IndexError, ValueError):
+        raise TransferFailed("unexpected answer from the remote shell")
+    # Without sha256sum or shasum there is no checksum, the file is always transferred
+    return size, (fields[1] if len(fields) > 1 else None)
+
+def push_once(username, vm_info, job, progress, result):
+    if job.skip_unchanged:
+        current = remote_query(username, vm_info, job.dest)
+        if current is not None and current[1] == job.digest:
+            result["status"] = "unchanged"
+            return
+    proc = subprocess.Popen(ssh_transfer_args(username, vm_info, remote_push_command(job.dest, job.mode)),
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            start_new_session=(os.name != 'nt'))
+    sent = 0
+    try:
+        with open(job.source, "rb") as f:
+            for chunk in iter(lambda: f.read(TRANSFER_CHUNK), b""):
+                proc.stdin.write(chunk)
+                sent += len(chunk)
+                progress.add(len(chunk))
+        proc.stdin.close()
+    except BrokenPipeError:
+        pass  # The remote side gave up, its exit status says why
+    except OSError:
+        proc.kill()
+        proc.wait()
+        progress.add(-sent)
+        raise
+    # The remote side only prints a checksum or an error, reading one pipe after the other is safe
+    with proc.stdout, proc.stderr:
+        out, err = proc.stdout.read(), proc.stderr.read()
+    proc.wait()
+    if proc.returncode != 0:
+        progress.add(-sent)
+        raise ssh_failure(proc.returncode, err)
+    if job.digest not in out.decode("utf-8", errors="replace"):
+        progress.add(-sent)
+        raise TransferFailed("checksum mismatch after upload", transient=True)
+    result.update(status="sent", bytes=sent)
+
+def pull_once(username, vm_info, job, progress, result):
+    current = remote_query(username, vm_info, job.source)
+    if current is None:
+        raise TransferFailed(f"{job.source}: no such file")
+    size, digest = current
+    local_path = job.local_copy(result["vm"])
+    if job.skip_unchanged and digest and os.path.isfile(local_path) and file_sha256(local_path) == digest:
+        result["status"] = "unchanged"
+        return
+    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+    progress.expect(size)
+    part = local_path + ".part"
+    received = 0
+    hasher = hashlib.sha256()
+    proc = subprocess.Popen(ssh_transfer_args(username, vm_info, f"cat {remote_path_arg(job.source)}"),
+                            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            start_new_session=(os.name != 'nt'))
+    try:
+        with open(part, "wb") as f:
+            for chunk in iter(lambda: proc.stdout.read(TRANSFER_CHUNK), b""):
+                f.write(chunk)
+                hasher.update(chunk)
+                received += len(chunk)
+                progress.add(len(chunk))
+        err = proc.stderr.read()
+        proc.wait()
+        if proc.returncode != 0:
+            raise ssh_failure(proc.returncode, err)
+        if digest and hasher.hexdigest() != digest:
+            raise TransferFailed("checksum mismatch after download", transient=True)
+    except BaseException:
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        progress.add(-received)
+        progress.expect(-size)
+        with contextlib.suppress(OSError):
+            os.remove(part)
+        raise
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+    os.replace(part, local_path)
+    result.update(status="received", bytes=received)
+
+def transfer_host(vm_name, username, vm_info, job, progress, retries, emit):
+    """Copy one file to or from one host, retrying connection failures with backoff"""
+    result = {"vm": vm_name, "user": username, "status": "failed", "bytes": 0,
+              "duration": 0.0, "attempts": 0, "error": None}
+    start = time.monotonic()
+    delay = TRANSFER_RETRY_DELAY
+    if username is None:
+        result.update(status="skipped", error="no users configured")
+    while username is not None:
+        result["attempts"] += 1
+        try:
+            (push_once if job.direction == "push" else pull_once)(username, vm_info, job, progress, result)
+            result["error"] = None
+            break
+        except TransferFailed as e:
+            result["error"] = str(e)
+            if not e.transient or result["attempts"] > retries:
+                break
+            emit(vm_name, f"{YELLOW}⚠ {e}, retrying in {delay:.0f}s{RESET}")
+            time.sleep(delay)
+            delay *= 2
+        except OSError as e:
+            result["error"] = str(e)   # Local file trouble, retrying will not help
+            break
+    if job.direction == "push" and result["status"] != "sent":
+        progress.expect(-job.size)   # Bytes that will never be sent
+    result["duration"] = time.monotonic() - start
+    progress.host_done()
+    emit(vm_name, transfer_outcome(result))
+    return result
+
+def transfer_outcome(result):
+    status = result["status"]
+    if status in ("sent", "received"):
+        return f"{GREEN}✓ {status} {format_size(result['bytes'])} in {result['duration']:.1f}s{RESET}"
+    if status == "unchanged":
+        return f"{GRAY}= unchanged (checksum matches){RESET}"
+    if status == "skipped":
+        return f"{YELLOW}skipped: {result['error']}{RESET}"
+    return f"{RED}✗ {result['error']}{RESET}"
+
+def run_transfer(targets, job, concurrency=TRANSFER_CONCURRENCY, retries=TRANSFER_RETRIES, out=None):
+    """Push or pull one file on many VMs at once, with a live aggregate progress line on terminals"""
+    from concurrent.futures import ThreadPoolExecutor, wait
+    out = out or sys.stdout
+    live = getattr(out, "isatty", lambda: False)()
+    wipe = f"\r{ERASE_LINE}" if live else ""   # Host lines replace the progress line
+    width = max((len(vm_name) for vm_name, _, _ in targets), default=0)
+    lock = threading.Lock()
+    # Resolved up front, worker threads must not touch the inventory backend
+    colors = {vm_name: vm_info.color_code for vm_name, _, vm_info in targets}
+    hosts = sum(1 for _, user, _ in targets if user is not None)
+    progress = TransferProgress(len(targets), job.size * hosts if job.direction == "push" else 0)
+
+    def emit(vm_name, line):
+        color = colors.get(vm_name, RESET)
+        with lock:
+            out.write(f"{wipe}{color}{vm_name:<{width}}{RESET} {GRAY}│{RESET} {line}\n")
+            if live:
+                out.write(progress.line())
+            out.flush()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [pool.submit(transfer_host, vm_name, user, vm_info, job, progress, retries, emit)
+                   for vm_name, user, vm_info in targets]
+        pending = futures
+        while pending:
+            pending = wait(pending, timeout=0.2)[1]
+            if live:
+                with lock:
+                    out.write(f"{wipe}{progress.line()}")
+                    out.flush()
+        if live:
+            out.write("\n")
+        return [future.result() for future in futures]
+
+def transfer_summary(results, wall_time):
+    """Final table with the outcome, size, time and attempts per host"""
+    width = max([len(result["vm"]) for result in results] + [4])
+    lines = [f"\n{CYAN}{'Host':<{width}}  {'User':<12} {'Result':<10} {'Size':>9} {'Time':>8} {'Tries':>5}{RESET}"]
+    counts = collections.Counter(result["status"] for result in results)
+    total = 0
+    for result in results:
+        status = result["status"]
+        color = {"sent": GREEN, "received": GREEN, "unchanged": GRAY, "skipped": YELLOW}.get(status, RED)
+        total += result["bytes"]
+        error = f"  {GRAY}{result['error']}{RESET}" if result["error"] else ""
+        lines.append(f"{result['vm']:<{width}}  {str(result['user'] or '-'):<12} {color}{status:<10}{RESET} "
+                     f"{format_size(result['bytes']):>9} {result['duration']:>7.2f}s {result['attempts']:>5}{error}")
+    transferred = counts["sent"] + counts["received"]
+    failed = counts["failed"] + counts["skipped"]
+    lines.append(f"\n{GREEN}{transferred} transferred{RESET}, {GRAY}{counts['unchanged']} unchanged{RESET}, "
+                 f"{RED if failed else GRAY}{failed} failed{RESET} {GRAY}({format_size(total)} in {wall_time:.2f}s, "
+                 f"{format_size(total / max(wall_time, 1e-6))}/s){RESET}")
+    return "\n".join(lines)
+
+# Menu
+async def transfer_menu():
+    """Pick several VMs and push a file to all of them, or pull one from each"""
+    vm_names = list(core.vms.keys())
+    options = LazyOptions(vm_names, vm_label)
+    picked = await arrow_menu(options, f"{CYAN}=== TRANSFER FILES: select VMs ==={RESET}",
+                        search=vm_search(vm_names, 0), multi=True)
+    if picked == -1:
+        return
+    targets = fanout_targets([vm_names[i] for i in picked])
+    direction = await arrow_menu(["Cancel", "Push a local file to the VMs", "Pull a file from each VM"],
+                                 f"{CYAN}=== TRANSFER FILES: {len(targets)} VM(s) ==={RESET}")
+    if direction <= 0:
+        return
+
+    clear_screen()
+    print(f"{BLUE}╔══════════════════════════════════════════════╗{RESET}")
+    print(f"{BLUE}║{WHITE}              TRANSFER FILES                 {BLUE}║{RESET}")
+    print(f"{BLUE}╚══════════════════════════════════════════════╝{RESET}\n")
+    print(f"{CYAN}Targets:{RESET} {WHITE}{len(targets)} VM(s){RESET} {GRAY}({', '.join(name for name, _, _ in targets[:5])}{', ...' if len(targets) > 5 else ''}){RESET}")
+    print(f"{GRAY}ℹ Hosts whose copy already has the same checksum are skipped{RESET}")
+    print(f"{GRAY}ℹ Type 'cancel' or 'exit' to abort{RESET}\n")
+
+    job = None
+    while job is None:
+        if direction == 1:
+            source = (await ainput(f"{CYAN}Local file: {WHITE}")).strip()
+        else:
+            source = (await ainput(f"{CYAN}Remote file (e.g. /etc/hosts): {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not source or source.lower() in ['cancel', 'exit', 'quit']:
+            print(f"\n{YELLOW}ℹ Transfer cancelled.{RESET}")
+            await ainput(f"\n{GRAY}Press Enter to return...{RESET}")
+            return
+        if direction == 1:
+            if not os.path.isfile(os.path.expanduser(source)):
+                print(f"{RED}✗ '{source}' is not a readable file!{RESET}")
+                continue
+            dest = (await ainput(f"{CYAN}Remote path (blank: ~/{os.path.basename(source)}, a trailing / keeps the name): {WHITE}")).strip()
+            print(f"{RESET}", end="")
+            try:
+                # Hashing a large artifact takes a while, keep the loop running meanwhile
+                job = await menu_loop.run_blocking(TransferJob.push, source, dest)
+            except OSError as e:
+                print(f"{RED}✗ Cannot read '{source}': {e.strerror or e}{RESET}")
+        else:
+            dest = (await ainput(f"{CYAN}Local directory (blank: current directory, one subdirectory per VM): {WHITE}")).strip()
+            print(f"{RESET}", end="")
+            job = TransferJob.pull(source, dest or ".")
+
+    concurrency = TRANSFER_CONCURRENCY
+    while True:
+        answer = (await ainput(f"{CYAN}Parallel hosts [{TRANSFER_CONCURRENCY}]: {WHITE}")).strip()
+        print(f"{RESET}", end="")
+        if not answer:
+            break
+        if answer.isdigit() and int(answer) > 0:
+            concurrency = int(answer)
+            break
+        print(f"{RED}✗ Enter a positive number!{RESET}")
+
+    if job.direction == "push":
+        what = f"Pushing {job.source} ({format_size(job.size)}) to {job.dest} on"
+    else:
+        what = f"Pulling {job.source} into {job.dest} from"
+    print(f"\n{CYAN}➤ {what} {len(targets)} VM(s), {concurrency} at a time...{RESET}\n")
+    start = time.monotonic()
+    results = await menu_loop.run_blocking(run_transfer, targets, job, concurrency)
+    print(transfer_summary(results, time.monotonic() - start))
+    await ainput(f"\n{GRAY}Press Enter to return to menu...{RESET}")
+
+# Command line
+def cli_transfer(args):
+    vm_names = list(core.vms) if args.all else select_vms(args.targets)
+    if not vm_names:
+        raise LookupError("No target VMs, name some or pass --all")
+    if args.direction == "push":
+        try:
+            job = TransferJob.push(args.source, args.dest, skip_unchanged=not args.force)
+        except OSError as e:
+            raise LookupError(f"Cannot read '{args.source}': {e.strerror or e}")
+    else:
+        job = TransferJob.pull(args.source, args.dest, skip_unchanged=not args.force)
+    out = sys.stdout if sys.stdout.isatty() else PlainWriter(sys.stdout)
+    start = time.monotonic()
+    results = run_transfer(fanout_targets(vm_names, args.user), job, args.jobs, args.retries, out=out)
+    out.write(transfer_summary(results, time.monotonic() - start) + "\n")
+    out.flush()
+    return 0 if all(result["status"] in ("sent", "received", "unchanged") for result in results) else 1